@@ -1,19 +1,21 @@
 import os
+from typing import Tuple
 
 from common import constants
+from dictionary import positional_postings
 
 
 def read_positions_in_file(
         file_id: str, token: str,
-        file_path: str = constants.PATH_TO_RESULT_DIR) -> list:
-    with open(os.path.join(file_path, file_id)) as file:
-        line = file.readline().strip()
-        while line and line.split(constants.SPLIT) != token:
-            line = file.readline().strip()
-        if not line:
-            return list()
-        positions = line.split(constants.SPLIT)[1]
-        return [int(pos) for pos in positions]
+        file_path: str = constants.PATH_TO_POSITIONS) -> list:
+    """
+    :param file_id: id of the document
+    :param token: token to find
+    :param file_path: path to the positions file
+    :return: sorted positions of the token in the document
+    """
+    with positional_postings.PositionalPostingsFile(file_path) as file:
+        return file.get_positions(token, int(file_id)).tolist()
 
 
 def read_file_dictionary(
@@ -27,3 +29,15 @@ def read_file_dictionary(
             result[token] = [int(pos) for pos in positions.split(',')]
             line = file.readline().strip()
     return result
+
+
+def get_shard_paths(shard: int, path: str = constants.PATH_TO_SHARDS_DIR
+                    ) -> Tuple[str, str]:
+    """
+    :param shard: number of a document-partitioned shard
+    :param path: directory with shards
+    :return: <path to the inverted index, path to the list of documents>
+    of the shard
+    """
+    return os.path.join(path, f'dict{shard}'), \
+        os.path.join(path, f'files{shard}')
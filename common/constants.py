@@ -6,5 +6,10 @@ PATH_TO_DATA_DIR = join(PROJECT_PATH, 'files')
 PATH_TO_RESULT_DIR = join(PROJECT_PATH, 'data')
 PATH_TO_LIST_OF_FILES = join(PROJECT_PATH, 'data', 'files')
 PATH_TO_DICT = join(PATH_TO_RESULT_DIR, 'dict')
+PATH_TO_DISK_TERMS = join(PATH_TO_RESULT_DIR, 'dict.terms')
+PATH_TO_DISK_POSTINGS = join(PATH_TO_RESULT_DIR, 'dict.postings')
+PATH_TO_SHARDS_DIR = join(PATH_TO_RESULT_DIR, 'shards')
+PATH_TO_POSITIONS = join(PATH_TO_RESULT_DIR, 'positions')
+PATH_TO_OFFSETS = join(PATH_TO_RESULT_DIR, 'offsets')
 BYTE = 1024
 SPLIT = '\t'
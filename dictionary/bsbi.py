@@ -41,7 +41,7 @@ def parse_next_block(doc_id, file_name) -> list:
             i = 0
             while i < len(tokens):
                 for _ in range(min(MAX_BLOCK_SIZE - len(block), len(tokens))):
-                    block.append(f'{tokens[i][1]}{SPLIT}{doc_id}')
+                    block.append(f'{tokens[i][-1]}{SPLIT}{doc_id}')
                     i += 1
                 if len(block) >= MAX_BLOCK_SIZE:
                     yield block
@@ -0,0 +1,300 @@
+"""
+Positional postings of all documents in a single memory mapped file:
+    header: <magic, version, amount of terms, amount of documents
+             records, size of the terms strip, size of the positions>
+    terms directory: sorted records <offset of the term in the strip,
+                     index of the first document record of the term,
+                     amount of documents of the term>
+    documents directory: records <document id, offset of positions,
+                         amount of positions> sorted by document id
+                         within a term
+    strip: utf-8 encoded terms written one after another
+    positions: sorted positions of a term in a document encoded as
+               variable byte gaps
+
+Positions of a term in a document are found with binary searches over
+the directories, so the lookup reads only the positions themselves.
+"""
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping
+from typing import Optional
+
+from common.constants import PATH_TO_POSITIONS
+from dictionary.variable_byte import encode_gaps, decode_gaps
+
+MAGIC = b'SEPP'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIIQ')
+TERM_RECORD = struct.Struct('<III')
+DOCUMENT_RECORD = struct.Struct('<IQI')
+
+
+class IncorrectPositionsFile(ValueError):
+    def __init__(self, path):
+        super().__init__(f'File "{path}" is not a positions file of version '
+                         f'{VERSION}')
+
+
+def encode_positional_postings(lexicon: dict) -> bytes:
+    """
+    :param lexicon: dictionary <doc_id, dictionary <token, positions of
+    the token in the document>>. Positions are sorted here, as workers
+    of the index builder add positions of chunks of a document in the
+    order the chunks are tokenized.
+    :return: contents of the positions file
+    """
+    postings = dict()
+    for doc_id in sorted(lexicon):
+        for token, positions in lexicon[doc_id].items():
+            postings.setdefault(token, list()).append(
+                (doc_id, sorted(positions)))
+    terms = bytearray()
+    documents = bytearray()
+    strip = bytearray()
+    data = bytearray()
+    amount_of_documents = 0
+    for token in sorted(postings, key=str.encode):
+        terms += TERM_RECORD.pack(len(strip), amount_of_documents,
+                                  len(postings[token]))
+        strip += token.encode()
+        for doc_id, positions in postings[token]:
+            documents += DOCUMENT_RECORD.pack(doc_id, len(data),
+                                              len(positions))
+            data += encode_gaps(positions)
+        amount_of_documents += len(postings[token])
+    header = HEADER.pack(MAGIC, VERSION, len(postings), amount_of_documents,
+                         len(strip), len(data))
+    return header + terms + documents + strip + data
+
+
+def write_positional_postings(lexicon: dict,
+                              path: str = PATH_TO_POSITIONS) -> None:
+    """
+    :param lexicon: dictionary <doc_id, dictionary <token, positions of
+    the token in the document>>
+    :param path: path to the positions file to write
+    """
+    print(f'Writing positions of {len(lexicon)} documents to {path}')
+    with open(path, 'wb') as file:
+        file.write(encode_positional_postings(lexicon))
+
+
+class DocumentPositions(Mapping):
+    """
+    Lazy dictionary <doc_id, sorted positions> of a single term. Document
+    ids are read from the documents directory, positions are decoded only
+    for the requested documents.
+    """
+
+    def __init__(self, postings_file: 'PositionalPostingsFile',
+                 documents: range):
+        self._file = postings_file
+        self._documents = documents
+
+    def __getitem__(self, doc_id):
+        i = self._file._find_document(self._documents, doc_id)
+        if i is None:
+            raise KeyError(doc_id)
+        return self._file._decode_positions(i)
+
+    def __contains__(self, doc_id):
+        return self._file._find_document(self._documents, doc_id) \
+            is not None
+
+    def __iter__(self):
+        return (self._file._get_document_record(i)[0]
+                for i in self._documents)
+
+    def __len__(self):
+        return len(self._documents)
+
+
+class PositionalPostingsFile(Mapping):
+    """
+    Read-only positional postings over the memory mapped file: dictionary
+    <token, lazy dictionary <doc_id, sorted positions>>
+    """
+
+    def __init__(self, path: str = PATH_TO_POSITIONS):
+        with open(path, 'rb') as file:
+            try:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                buffer = b''
+        self._open(buffer, path)
+
+    @classmethod
+    def from_buffer(cls, buffer, source: str = 'buffer'):
+        """
+        :param buffer: contents of the positions file
+        :param source: name of the buffer for error messages
+        """
+        positions_file = cls.__new__(cls)
+        positions_file._open(buffer, source)
+        return positions_file
+
+    def _open(self, buffer, source: str) -> None:
+        self._buffer = buffer
+        self._source = source
+        self._document_index = None
+        if len(buffer) < HEADER.size:
+            raise IncorrectPositionsFile(source)
+        magic, version, self._size, self._documents_size, strip_size, \
+            positions_size = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise IncorrectPositionsFile(source)
+        self._documents_start = HEADER.size + self._size * TERM_RECORD.size
+        self._strip_start = self._documents_start + \
+            self._documents_size * DOCUMENT_RECORD.size
+        self._strip_end = self._strip_start + strip_size
+        self._positions_end = self._strip_end + positions_size
+        if len(buffer) < self._positions_end:
+            raise IncorrectPositionsFile(source)
+
+    def _get_term_record(self, i: int) -> tuple:
+        return TERM_RECORD.unpack_from(self._buffer,
+                                       HEADER.size + i * TERM_RECORD.size)
+
+    def _get_term(self, i: int) -> bytes:
+        start = self._strip_start + self._get_term_record(i)[0]
+        end = self._strip_start + self._get_term_record(i + 1)[0] \
+            if i + 1 < self._size else self._strip_end
+        return bytes(self._buffer[start:end])
+
+    def _get_document_record(self, i: int) -> tuple:
+        return DOCUMENT_RECORD.unpack_from(
+            self._buffer, self._documents_start + i * DOCUMENT_RECORD.size)
+
+    def _find_term(self, token: str) -> Optional[int]:
+        key = token.encode()
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._size and self._get_term(low) == key:
+            return low
+        return None
+
+    def _decode_positions(self, i: int) -> array:
+        _, offset, _ = self._get_document_record(i)
+        end = self._get_document_record(i + 1)[1] \
+            if i + 1 < self._documents_size \
+            else self._positions_end - self._strip_end
+        return array('I', decode_gaps(
+            self._buffer[self._strip_end + offset:self._strip_end + end]))
+
+    def _get_document_range(self, token: str) -> range:
+        i = self._find_term(token)
+        if i is None:
+            return range(0)
+        _, first, amount = self._get_term_record(i)
+        return range(first, first + amount)
+
+    def _find_document(self, documents: range, doc_id: int
+                       ) -> Optional[int]:
+        """:return: index of the record of the document in the range"""
+        low, high = documents.start, documents.stop
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_document_record(middle)[0] < doc_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < documents.stop and \
+                self._get_document_record(low)[0] == doc_id:
+            return low
+        return None
+
+    def get_positions(self, token: str, doc_id: int) -> array:
+        """
+        :return: sorted positions of the token in the document, empty if
+        the document does not contain the token
+        """
+        i = self._find_document(self._get_document_range(token), doc_id)
+        return array('I') if i is None else self._decode_positions(i)
+
+    def get_documents(self, token: str) -> list:
+        """:return: sorted ids of documents which contain the token"""
+        return [self._get_document_record(i)[0]
+                for i in self._get_document_range(token)]
+
+    def get_postings(self, token: str) -> dict:
+        """:return: dictionary <doc_id, sorted positions of the token>"""
+        return {self._get_document_record(i)[0]: self._decode_positions(i)
+                for i in self._get_document_range(token)}
+
+    def index_documents(self) -> None:
+        """
+        Groups records of the documents directory by documents once, so
+        get_document reads only the records of the requested document
+        instead of looking it up in the documents of every term
+        """
+        term_starts = array('I')
+        records = dict()
+        for i in range(self._size):
+            _, first, amount = self._get_term_record(i)
+            term_starts.append(first)
+            for j in range(first, first + amount):
+                doc_id = self._get_document_record(j)[0]
+                records.setdefault(doc_id, array('I')).append(j)
+        self._document_index = term_starts, records
+
+    def get_document(self, doc_id: int) -> dict:
+        """
+        Looks the document up in the documents of every term, or in the
+        index of documents if it is built by index_documents
+        :return: dictionary <token, sorted positions in the document>
+        """
+        result = dict()
+        if self._document_index is not None:
+            term_starts, records = self._document_index
+            for j in records.get(doc_id, ()):
+                term = self._get_term(bisect_right(term_starts, j) - 1)
+                result[term.decode()] = self._decode_positions(j)
+            return result
+        for i in range(self._size):
+            _, first, amount = self._get_term_record(i)
+            j = self._find_document(range(first, first + amount), doc_id)
+            if j is not None:
+                result[self._get_term(i).decode()] = \
+                    self._decode_positions(j)
+        return result
+
+    def __getitem__(self, token):
+        documents = self._get_document_range(token) \
+            if isinstance(token, str) else range(0)
+        if not documents:
+            raise KeyError(token)
+        return DocumentPositions(self, documents)
+
+    def __iter__(self):
+        return (self._get_term(i).decode() for i in range(self._size))
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, token):
+        return isinstance(token, str) and self._find_term(token) is not None
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+    def __reduce__(self):
+        # a memory mapped file is mapped again by the receiving process
+        if isinstance(self._buffer, mmap.mmap):
+            return PositionalPostingsFile, (self._source,)
+        return PositionalPostingsFile.from_buffer, \
+            (bytes(self._buffer), self._source)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
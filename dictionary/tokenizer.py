@@ -224,9 +224,17 @@ class Tokenizer:
                  remove_stopwords: bool = True,
                  remove_special_characters: bool = True,
                  do_lemmatization: bool = True,
-                 do_stemming: bool = True) -> list:
+                 do_stemming: bool = True,
+                 with_ordinals: bool = False) -> list:
+        """
+        :return: list of <character offset, token> or, if
+        [with_ordinals] is True, <word ordinal, character offset, token>
+        where the ordinal is the number of the word in the text counting
+        removed words
+        """
         normalized_tokens = list()
-        for index, token in self._get_token_with_index(text):
+        for ordinal, (index, token) in enumerate(
+                self._get_token_with_index(text)):
             if remove_accented_charactes:
                 token = self._remove_accented_chars(token)
             if expand_contractions:
@@ -241,5 +249,7 @@ class Tokenizer:
                 token = self._stemming(token)
             if token:
                 token = token.strip()
-                normalized_tokens.append((index, re.sub(' +', ' ', token)))
+                token = re.sub(' +', ' ', token)
+                normalized_tokens.append((ordinal, index, token)
+                                         if with_ordinals else (index, token))
         return normalized_tokens
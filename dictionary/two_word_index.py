@@ -5,13 +5,15 @@ from threading import Thread
 
 from sortedcontainers import SortedDict
 
-from common.constants import PATH_TO_DICT, PATH_TO_RESULT_DIR, \
+from common.constants import PATH_TO_DICT, PATH_TO_POSITIONS, \
     PATH_TO_LIST_OF_FILES, BYTE, PATH_TO_DATA_DIR
 from common.exceptions import NotSupportedExtensionException
 from dictionary.decoder import get_file_reader_by_extension
+from dictionary.positional_postings import write_positional_postings
 from dictionary.utils import get_list_of_files, write_doc_ids_to_file, \
-    write_dictionary_to_file, write_token_list_to_file, \
-    add_unfinished_part_from_prev_chunk, get_tokens_from_chunk
+    write_dictionary_to_file, \
+    add_unfinished_part_from_prev_chunk, get_tokens_from_chunk, count_words, \
+    read_doc_ids_from_file, write_document_shards
 
 CHUNK_SIZE = 4 * BYTE
 
@@ -20,6 +22,9 @@ QUEUE_MIN_SIZE = 10000
 
 CHUNK_WORKERS_NUM = 6
 TOKEN_WORKERS_NUM = 3
+# amount of document-partitioned shards written besides the full index,
+# shards are not written if it is 1
+SHARDS_NUM = 1
 
 chunk_queue = Queue()
 token_queue = Queue()
@@ -31,14 +36,15 @@ inverted_index = SortedDict()
 lexicon = dict()
 
 
-def retrieve_tokens(chunk_start, chunk) -> list:
+def retrieve_tokens(chunk_start, word_start, chunk) -> list:
     """
     Receives chunk from the queue. Than replace punctuation with
     spaces and retrieve tokens with their positions in text
     return: file_id - docID of the material of origin,
-    tokens - list of tokens with positions in text
+    tokens - list of tokens with word ordinals and character offsets
+    in text
     """
-    tokens = get_tokens_from_chunk(chunk, chunk_start)
+    tokens = get_tokens_from_chunk(chunk, chunk_start, word_start)
     return tokens
 
 
@@ -55,8 +61,9 @@ def get_chunk_from_queue_and_process() -> bool:
     :return: True - waiting foe the next chunk, False - queue is closed
     """
     try:
-        file_id, chunk_start, chunk = chunk_queue.get(block=True, timeout=1)
-        tokens = retrieve_tokens(chunk_start, chunk)
+        file_id, chunk_start, word_start, chunk = \
+            chunk_queue.get(block=True, timeout=1)
+        tokens = retrieve_tokens(chunk_start, word_start, chunk)
         token_queue.put((file_id, tokens))
     except Empty:
         if file_job_done.is_set():
@@ -108,7 +115,7 @@ def reduce_tokens_to_lexicon() -> None:
             curr_word_position_list = \
                 get_list_or_add_to_lists(file_id)
 
-            for position, token in tokens:
+            for position, _, token in tokens:
                 if last_token is not None:
                     two_word_token = f'{last_token} {token}'
                     append_token_to_dict()
@@ -129,18 +136,21 @@ def read_document_and_put_into_queue(file_path: str, file_id: int) -> None:
     :param file_id: generated docID of the document
     """
     chunk_start = 0
+    word_start = 0
     unfinished_part = ''
     with get_file_reader_by_extension(file_path) as file:
         chunk = file.read_chunk()
         while chunk:
             actual_chunk, unfinished_part = \
                 add_unfinished_part_from_prev_chunk(chunk, unfinished_part)
-            chunk_queue.put((file_id, chunk_start, actual_chunk))
+            chunk_queue.put((file_id, chunk_start, word_start, actual_chunk))
 
             chunk = file.read_chunk()
             chunk_start += len(actual_chunk) + 1
+            word_start += count_words(actual_chunk)
         if unfinished_part:
-            chunk_queue.put((file_id, chunk_start, unfinished_part))
+            chunk_queue.put(
+                (file_id, chunk_start, word_start, unfinished_part))
 
 
 def read_document_and_put_tokens_to_queue(file_path, file_id) -> bool:
@@ -209,7 +219,10 @@ def main() -> None:
                 kwargs=dict(is_lexicon=True, lexicon=lexicon))
     write_lexicon_process.start()
 
-    for file_id, word_position_list in lexicon.items():
-        path_to_result_file = \
-            os.path.join(PATH_TO_RESULT_DIR, str(file_id))
-        write_token_list_to_file(word_position_list, path_to_result_file)
+    if SHARDS_NUM > 1:
+        producer.join()
+        write_document_shards(inverted_index,
+                              read_doc_ids_from_file(PATH_TO_LIST_OF_FILES),
+                              SHARDS_NUM, is_lexicon=True, lexicon=lexicon)
+
+    write_positional_postings(lexicon, PATH_TO_POSITIONS)
@@ -5,7 +5,9 @@ from typing import Tuple
 
 from sortedcontainers import SortedDict
 
-from common.constants import DIVIDER, SPLIT, PATH_TO_DATA_DIR
+from common import get_shard_paths
+from common.constants import DIVIDER, SPLIT, PATH_TO_DATA_DIR, \
+    PATH_TO_SHARDS_DIR
 from dictionary.tokenizer import Tokenizer
 
 REGEXPS = {
@@ -43,9 +45,22 @@ def split_chunk_by_last_line(chunk) -> Tuple[str, str]:
     return chunk[:position], chunk[position + 1:]
 
 
-def get_tokens_from_chunk(chunk: str, chunk_start: int) -> list:
-    return [(chunk_start + start, token)
-            for start, token in tokenizer.tokenize(chunk)]
+def count_words(chunk: str) -> int:
+    return len(chunk.split())
+
+
+def get_tokens_from_chunk(chunk: str, chunk_start: int,
+                          word_start: int = 0) -> list:
+    """
+    :param chunk: part of a document split by whitespace
+    :param chunk_start: character offset of the chunk in the document
+    :param word_start: amount of words in the document before the chunk
+    :return: list of <word ordinal, character offset, token> in the
+    document
+    """
+    return [(word_start + ordinal, chunk_start + start, token)
+            for ordinal, start, token
+            in tokenizer.tokenize(chunk, with_ordinals=True)]
 
 
 def iterable_to_str(iterable) -> str:
@@ -85,3 +100,37 @@ def write_doc_ids_to_file(file_doc_id: dict, path: str):
     with open(path, 'w') as file:
         for key in file_doc_id:
             file.write(f'{key}{SPLIT}{file_doc_id[key]}\n')
+
+
+def read_doc_ids_from_file(path: str) -> dict:
+    with open(path) as file:
+        return {key: int(doc_id) for key, doc_id in
+                (line.rstrip('\n').split(SPLIT) for line in file)}
+
+
+def write_document_shards(dictionary: SortedDict, file_doc_id: dict,
+                          shards_number: int,
+                          path: str = PATH_TO_SHARDS_DIR, **kwargs):
+    """
+    Splits the inverted index by documents: document d goes to the shard
+    d % shards_number. Every shard is written as a complete inverted
+    index with its own list of documents, see common.get_shard_paths.
+    :param dictionary: inverted index <token, document ids>
+    :param file_doc_id: dictionary <file name, document id>
+    :param shards_number: amount of shards
+    :param path: directory to write shards to
+    :param kwargs: parameters of write_dictionary_to_file
+    """
+    os.makedirs(path, exist_ok=True)
+    for shard in range(shards_number):
+        shard_dictionary = SortedDict()
+        for key, values in dictionary.items():
+            doc_ids = sorted(doc_id for doc_id in values
+                             if int(doc_id) % shards_number == shard)
+            if doc_ids:
+                shard_dictionary[key] = doc_ids
+        path_to_dict, path_to_files = get_shard_paths(shard, path)
+        write_dictionary_to_file(shard_dictionary, path_to_dict, **kwargs)
+        write_doc_ids_to_file(
+            {key: doc_id for key, doc_id in file_doc_id.items()
+             if int(doc_id) % shards_number == shard}, path_to_files)
@@ -0,0 +1,70 @@
+"""
+Variable byte encoding of integers: a number is split into 7-bit
+groups, the most significant group goes first. The high bit of the
+last byte of a number is set to 1, it is 0 in all other bytes.
+Sorted lists are encoded as gaps between neighbour items, so small
+numbers and short byte sequences are stored.
+"""
+
+
+def encode_number(n: int) -> bytes:
+    if n < 0:
+        raise ValueError(f'Negative number {n} can not be encoded')
+    result = bytearray()
+    while True:
+        result.insert(0, n & 0x7F)
+        if n < 0x80:
+            break
+        n >>= 7
+    result[-1] |= 0x80
+    return bytes(result)
+
+
+def encode_list(numbers) -> bytes:
+    """
+    :param numbers: list of not negative numbers
+    :return: variable byte encoded numbers
+    """
+    return b''.join(encode_number(n) for n in numbers)
+
+
+def decode_list(data) -> list:
+    """
+    :param data: variable byte encoded numbers
+    :return: list of numbers
+    """
+    result = list()
+    n = 0
+    for byte in data:
+        if byte < 0x80:
+            n = (n << 7) | byte
+        else:
+            result.append((n << 7) | (byte & 0x7F))
+            n = 0
+    return result
+
+
+def encode_gaps(numbers) -> bytes:
+    """
+    :param numbers: sorted list of not negative numbers
+    :return: variable byte encoded gaps between the numbers
+    """
+    gaps = list()
+    last = 0
+    for n in numbers:
+        if n < last:
+            raise ValueError(f'Numbers are not sorted: {n} follows {last}')
+        gaps.append(n - last)
+        last = n
+    return encode_list(gaps)
+
+
+def decode_gaps(data) -> list:
+    """
+    :param data: variable byte encoded gaps between numbers
+    :return: sorted list of numbers
+    """
+    result = decode_list(data)
+    for i in range(1, len(result)):
+        result[i] += result[i - 1]
+    return result
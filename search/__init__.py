@@ -1,7 +1,14 @@
+from .biword_index import BiwordIndex, load_biword_index
 from .btree import SearchBTree
+from .disk_index import load_disk_index, write_disk_index
 from .query_parser import load_inverted_list, load_inverted_skip_index, \
-    build_notation
-from .skip_list_search import SearchDictionary
+    build_notation, compile_query
+from .shared_index import SharedIndexPublisher, attach_shared_index
+from .sharded_search import ShardedSearch, load_sharded_search
+from .skip_list_search import SearchDictionary, PostingsList
+from .snapshot import save_snapshot, load_snapshot
+from .term_partitioned_search import TermPartitionedSearch, \
+    RemoteInvertedIndex
 from .two_token_search import PhraseSearchDictionary, \
-    SearchCoordinatedDictionary
+    HybridPhraseSearchDictionary, SearchCoordinatedDictionary
 from .wildcard_search import WildcardSearch
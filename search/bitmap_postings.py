@@ -0,0 +1,189 @@
+from array import array
+from bisect import bisect_right
+from typing import Optional
+
+# document id space is split into chunks of 2^16 ids, every chunk is
+# stored as a bitmap in a python int, so AND, OR and AND-NOT of two
+# chunks are single C-level operations over machine words
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_BYTES = CHUNK_SIZE // 8
+# an array posting takes 32 bits, a bitmap of a chunk takes one bit per
+# document id from the start of the chunk up to its last document, so
+# the bitmap is smaller when at least one of 32 of those ids is set
+BITS_PER_POSTING = 32
+# positions of set bits for every byte value
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1)
+             for value in range(256)]
+
+
+def is_dense(doc_ids) -> bool:
+    """
+    Checks if a sorted list of document ids takes less memory as a
+    bitmap than as an array. The bitmap of every chunk is estimated
+    separately: a python int covers the bits from the start of the chunk
+    to the last document of the chunk.
+    :param doc_ids: sorted list of document ids
+    """
+    if len(doc_ids) == 0:
+        return False
+    last_ids = dict()
+    for doc_id in doc_ids:
+        last_ids[doc_id >> CHUNK_BITS] = doc_id & CHUNK_MASK
+    # bit length of a chunk bitmap is the position of its last bit + 1
+    bitmap_bits = sum(last_id + 1 for last_id in last_ids.values())
+    return bitmap_bits <= len(doc_ids) * BITS_PER_POSTING
+
+
+def make_postings_list(doc_ids, postings_type):
+    """
+    Chooses a container for the postings of a single token: sorted
+    array for sparse tokens, bitmap chunks for dense ones.
+    :param doc_ids: sorted list of document ids
+    :param postings_type: class of a sparse postings list
+    :return: postings list of the most compact type
+    """
+    if is_dense(doc_ids):
+        return BitmapPostingsList(doc_ids)
+    return postings_type(doc_ids)
+
+
+class BitmapPostingsList:
+    """
+    Roaring-style postings list for tokens which are met in a large
+    fraction of documents:
+    token -> {chunk_0: 0b0110...1, chunk_3: 0b1...01}
+    where chunk_k is a bitmap of documents [k * 2^16, (k + 1) * 2^16).
+    Empty chunks are not stored.
+    """
+
+    def __init__(self, doc_ids=None):
+        self.chunks = dict()
+        # sorted keys of the chunks for binary searches
+        self.highs = list()
+        self.size = 0
+        if doc_ids is not None:
+            self._set_bits(doc_ids)
+
+    @classmethod
+    def from_chunks(cls, chunks: dict) -> 'BitmapPostingsList':
+        postings = cls()
+        postings.chunks = {high: bitmap for high, bitmap in chunks.items()
+                           if bitmap}
+        postings.highs = sorted(postings.chunks)
+        postings.size = sum(bin(bitmap).count('1')
+                            for bitmap in postings.chunks.values())
+        return postings
+
+    def _set_bits(self, doc_ids) -> None:
+        buffers = dict()
+        for doc_id in doc_ids:
+            doc_id = int(doc_id)
+            high = doc_id >> CHUNK_BITS
+            if high not in buffers:
+                buffers[high] = bytearray(CHUNK_BYTES)
+            low = doc_id & CHUNK_MASK
+            buffers[high][low >> 3] |= 1 << (low & 7)
+        chunks = {high: int.from_bytes(buffer, 'little')
+                  for high, buffer in buffers.items()}
+        chunks.update({high: bitmap | chunks.get(high, 0)
+                       for high, bitmap in self.chunks.items()})
+        self.chunks = chunks
+        self.highs = sorted(chunks)
+        self.size = sum(bin(bitmap).count('1') for bitmap in chunks.values())
+
+    def add_list(self, doc_ids) -> None:
+        if doc_ids is not None:
+            self._set_bits(doc_ids)
+
+    def add(self, doc_id: int) -> None:
+        self._set_bits([doc_id])
+
+    def intersect(self, other):
+        """
+        AND operation. The result of intersection with a sparse list is
+        a sparse list filtered by bitmap lookups.
+        """
+        if isinstance(other, BitmapPostingsList):
+            return BitmapPostingsList.from_chunks({
+                high: bitmap & other.chunks[high]
+                for high, bitmap in self.chunks.items()
+                if high in other.chunks})
+        return other.from_array(array(
+            other.typecode, (doc_id for doc_id in other if doc_id in self)))
+
+    def union(self, other) -> 'BitmapPostingsList':
+        """OR operation"""
+        if not isinstance(other, BitmapPostingsList):
+            other = BitmapPostingsList(other)
+        chunks = dict(self.chunks)
+        for high, bitmap in other.chunks.items():
+            chunks[high] = chunks.get(high, 0) | bitmap
+        return BitmapPostingsList.from_chunks(chunks)
+
+    def difference(self, other) -> 'BitmapPostingsList':
+        """AND-NOT operation: documents of this list without [other]"""
+        if not isinstance(other, BitmapPostingsList):
+            other = BitmapPostingsList(other)
+        return BitmapPostingsList.from_chunks({
+            high: bitmap & ~other.chunks.get(high, 0)
+            for high, bitmap in self.chunks.items()})
+
+    def subtract_from(self, other):
+        """AND-NOT operation: documents of [other] without this list"""
+        if isinstance(other, BitmapPostingsList):
+            return other.difference(self)
+        return other.from_array(array(
+            other.typecode,
+            (doc_id for doc_id in other if doc_id not in self)))
+
+    def next_ge(self, doc_id: int) -> Optional[int]:
+        """
+        :param doc_id: document id to compare with
+        :return: the least document id in the list which is greater
+        then or equal to the provided one, None if there is no such
+        """
+        high = doc_id >> CHUNK_BITS
+        bitmap = self.chunks.get(high, 0) >> (doc_id & CHUNK_MASK)
+        if bitmap:
+            return doc_id + (bitmap & -bitmap).bit_length() - 1
+        i = bisect_right(self.highs, high)
+        if i == len(self.highs):
+            return None
+        high = self.highs[i]
+        bitmap = self.chunks[high]
+        return (high << CHUNK_BITS) + (bitmap & -bitmap).bit_length() - 1
+
+    def to_str(self) -> str:
+        return ','.join(str(doc_id) for doc_id in self)
+
+    def to_list(self) -> list:
+        return list(self)
+
+    @property
+    def nbytes(self) -> int:
+        """size of bitmaps in bytes"""
+        return sum((bitmap.bit_length() + 7) // 8
+                   for bitmap in self.chunks.values())
+
+    def __contains__(self, doc_id) -> bool:
+        bitmap = self.chunks.get(doc_id >> CHUNK_BITS, 0)
+        return bool(bitmap >> (doc_id & CHUNK_MASK) & 1)
+
+    def __iter__(self):
+        for high in self.highs:
+            base = high << CHUNK_BITS
+            bitmap = self.chunks[high]
+            for byte_index, value in enumerate(bitmap.to_bytes(
+                    (bitmap.bit_length() + 7) // 8, 'little')):
+                if value:
+                    offset = base + (byte_index << 3)
+                    for bit in BYTE_BITS[value]:
+                        yield offset + bit
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        return str(self.to_list())
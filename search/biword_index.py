@@ -0,0 +1,101 @@
+"""
+Biword index without a vocabulary of biword strings. Every term of the
+biwords gets an id which is its rank in the sorted list of terms, a
+biword is keyed by the pair of ids packed into a 64-bit number:
+
+    key = (id of the first term << 32) | id of the second term
+
+Keys are kept in a sorted typed array and postings lists in a list of
+the same order, so a biword is found with a binary search over the keys.
+"""
+from array import array
+from bisect import bisect_left
+from typing import Optional
+
+from search.bitmap_postings import make_postings_list
+from search.query_parser import read_inverted_list
+from search.skip_list_search import PostingsList
+
+TERM_ID_BITS = 32
+
+
+def pack_biword(first_id: int, second_id: int) -> int:
+    return (first_id << TERM_ID_BITS) | second_id
+
+
+class BiwordIndex:
+    def __init__(self, terms: list, keys: array, postings: list):
+        """
+        :param terms: sorted list of terms of the biwords
+        :param keys: sorted array('Q') of packed biwords
+        :param postings: postings lists of the biwords in order of keys
+        """
+        self.terms = terms
+        self.keys = keys
+        self.postings = postings
+
+    def get_term_id(self, token: str) -> Optional[int]:
+        i = bisect_left(self.terms, token)
+        if i < len(self.terms) and self.terms[i] == token:
+            return i
+        return None
+
+    def get_term_ids(self, tokens: list) -> list:
+        """:return: ids of the tokens, None for unknown tokens"""
+        return [self.get_term_id(token) for token in tokens]
+
+    def get_postings(self, first_id: int, second_id: int
+                     ) -> Optional[PostingsList]:
+        """
+        :return: postings list of the biword of two terms, None if the
+        biword is not in the index
+        """
+        key = pack_biword(first_id, second_id)
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.postings[i]
+        return None
+
+    def get(self, biword: str) -> Optional[PostingsList]:
+        """
+        :param biword: two terms separated with a space
+        :return: postings list of the biword, None if it is not found
+        """
+        first_id, second_id = self.get_term_ids(biword.split(' ', 1))
+        if first_id is None or second_id is None:
+            return None
+        return self.get_postings(first_id, second_id)
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def build_biword_index(records) -> BiwordIndex:
+    """
+    :param records: <biword, sorted list of document ids> records, where
+    a biword is two terms separated with a space
+    :return: biword index
+    """
+    pairs = list()
+    for biword, doc_ids in records:
+        first, second = biword.split(' ', 1)
+        pairs.append((first, second,
+                      make_postings_list(doc_ids, PostingsList)))
+    terms = sorted({term for first, second, _ in pairs
+                    for term in (first, second)})
+    term_ids = {term: i for i, term in enumerate(terms)}
+    entries = sorted(
+        ((pack_biword(term_ids[first], term_ids[second]), postings)
+         for first, second, postings in pairs), key=lambda entry: entry[0])
+    return BiwordIndex(terms, array('Q', (key for key, _ in entries)),
+                       [postings for _, postings in entries])
+
+
+def load_biword_index(path: str) -> BiwordIndex:
+    """
+    :param path: path to the text inverted index of biwords written by
+    the two word index builder
+    :return: biword index
+    """
+    return build_biword_index((biword, doc_ids) for biword, _, doc_ids
+                              in read_inverted_list(path))
@@ -46,23 +46,25 @@ def create_new_node(parent: Optional[Node],
 
 
 def get_tokens_in_children(query: str, start_node: Node) -> list:
-    def is_current_node_satisfies_token() -> bool:
-        last_key = current_node.keys[i]
-        return len(last_key) >= len(query) and last_key.startswith(query)
-
+    """
+    :param query: start of tokens to search for
+    :param start_node: root of a subtree
+    :return: sorted list of keys of the subtree which start with the
+    query. Only children which may contain such keys are visited.
+    """
     result = list()
-    current_node = start_node
-    i = 0
-    while i < len(current_node.keys) and not is_current_node_satisfies_token():
-        i += 1
-    while i < len(current_node.keys) and is_current_node_satisfies_token():
-        result.append(current_node.keys[i])
-        if not current_node.is_leaf():
-            result.extend(
-                get_tokens_in_children(query, current_node.children[i]))
-        i += 1
-    if i == len(current_node.keys) and not current_node.is_leaf():
-        result.extend(get_tokens_in_children(query, current_node.children[i]))
+
+    def collect(node: Node) -> None:
+        i = node.keys.bisect_left(query)
+        while True:
+            if not node.is_leaf():
+                collect(node.children[i])
+            if i == len(node.keys) or not node.keys[i].startswith(query):
+                return
+            result.append(node.keys[i])
+            i += 1
+
+    collect(start_node)
     return result
 
 
@@ -117,11 +119,9 @@ class SearchBTree:
         :param token: character sequence of a token to compare with
         :return:
         """
-        search_node = self.get_node(token)
-        if search_node is None:
+        if len(self.root.keys) == 0:
             return list()
-        # search tokens by pattern in children
-        return get_tokens_in_children(token, search_node)
+        return get_tokens_in_children(token, self.root)
 
     def _put(self, node: Node, value: str, children: Optional[list] = None):
         node.keys.add(value)
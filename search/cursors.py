@@ -0,0 +1,230 @@
+"""
+Document-at-a-time evaluation of query trees. Every node of a query is
+represented by a cursor which points to the current document of its
+result. Cursors only move forward:
+    next() - moves to the next document of the result
+    advance_to(doc_id) - moves to the first document >= doc_id
+Both return the new current document or None if the result is
+exhausted. Documents are pulled from the children on demand, so the
+first documents of a result are found without evaluating the whole
+query.
+"""
+import base64
+import binascii
+import heapq
+
+from search.bitmap_postings import BitmapPostingsList
+from search.query_tree import OPERATION_CODES
+
+
+class EmptyCursor:
+    doc_id = None
+    cost = 0
+
+    def next(self):
+        return None
+
+    def advance_to(self, doc_id: int):
+        return None
+
+
+class PostingsCursor:
+    """Cursor over a sorted array of document ids"""
+
+    def __init__(self, postings):
+        self.postings = postings
+        self.index = 0
+        self.cost = len(postings)
+        self.doc_id = postings[0] if len(postings) else None
+
+    def _set_index(self, index: int):
+        self.index = index
+        self.doc_id = self.postings[index] \
+            if index < len(self.postings) else None
+        return self.doc_id
+
+    def next(self):
+        return self._set_index(self.index + 1)
+
+    def advance_to(self, doc_id: int):
+        return self._set_index(self.postings.skip_until_ge(self.index, doc_id))
+
+
+class BitmapCursor:
+    """Cursor over bitmap chunks of document ids"""
+
+    def __init__(self, postings: BitmapPostingsList):
+        self.postings = postings
+        self.cost = len(postings)
+        self.doc_id = postings.next_ge(0)
+
+    def next(self):
+        if self.doc_id is not None:
+            self.doc_id = self.postings.next_ge(self.doc_id + 1)
+        return self.doc_id
+
+    def advance_to(self, doc_id: int):
+        if self.doc_id is not None and self.doc_id < doc_id:
+            self.doc_id = self.postings.next_ge(doc_id)
+        return self.doc_id
+
+
+class AndCursor:
+    """
+    Intersection of cursors. The cursor with the smallest result leads,
+    the others are advanced to its documents.
+    """
+
+    def __init__(self, cursors: list):
+        self.cursors = sorted(cursors, key=lambda cursor: cursor.cost)
+        self.cost = self.cursors[0].cost
+        self.doc_id = self._align(self.cursors[0].doc_id)
+
+    def _align(self, target):
+        while target is not None:
+            for cursor in self.cursors:
+                doc_id = cursor.advance_to(target)
+                if doc_id != target:
+                    target = doc_id
+                    break
+            else:
+                return target
+        return None
+
+    def next(self):
+        if self.doc_id is not None:
+            self.doc_id = self._align(self.cursors[0].next())
+        return self.doc_id
+
+    def advance_to(self, doc_id: int):
+        if self.doc_id is not None and self.doc_id < doc_id:
+            self.doc_id = self._align(doc_id)
+        return self.doc_id
+
+
+class OrCursor:
+    """Union of cursors merged through a heap"""
+
+    def __init__(self, cursors: list):
+        self.cursors = cursors
+        self.cost = sum(cursor.cost for cursor in cursors)
+        self.heap = [(cursor.doc_id, i) for i, cursor in enumerate(cursors)
+                     if cursor.doc_id is not None]
+        heapq.heapify(self.heap)
+        self.doc_id = self.heap[0][0] if self.heap else None
+
+    def _move(self, move_cursor, target):
+        while self.heap and self.heap[0][0] < target:
+            _, i = heapq.heappop(self.heap)
+            doc_id = move_cursor(self.cursors[i])
+            if doc_id is not None:
+                heapq.heappush(self.heap, (doc_id, i))
+        self.doc_id = self.heap[0][0] if self.heap else None
+        return self.doc_id
+
+    def next(self):
+        if self.doc_id is None:
+            return None
+        return self._move(lambda cursor: cursor.next(), self.doc_id + 1)
+
+    def advance_to(self, doc_id: int):
+        return self._move(lambda cursor: cursor.advance_to(doc_id), doc_id)
+
+
+class AndNotCursor:
+    """Documents of the positive cursor which no negative cursor has"""
+
+    def __init__(self, positive, negatives: list):
+        self.positive = positive
+        self.negatives = negatives
+        self.cost = positive.cost
+        self.doc_id = self._skip_excluded(positive.doc_id)
+
+    def _skip_excluded(self, doc_id):
+        while doc_id is not None and any(
+                cursor.advance_to(doc_id) == doc_id
+                for cursor in self.negatives):
+            doc_id = self.positive.next()
+        return doc_id
+
+    def next(self):
+        if self.doc_id is not None:
+            self.doc_id = self._skip_excluded(self.positive.next())
+        return self.doc_id
+
+    def advance_to(self, doc_id: int):
+        if self.doc_id is not None and self.doc_id < doc_id:
+            self.doc_id = self._skip_excluded(
+                self.positive.advance_to(doc_id))
+        return self.doc_id
+
+
+def create_postings_cursor(postings):
+    if postings is None or len(postings) == 0:
+        return EmptyCursor()
+    if isinstance(postings, BitmapPostingsList):
+        return BitmapCursor(postings)
+    return PostingsCursor(postings)
+
+
+def build_cursor(query, get_ids, all_documents):
+    """
+    :param query: query tree or a single token
+    :param get_ids: function which returns postings list of a token or
+    None if the token is not in the dictionary
+    :param all_documents: postings list of all documents
+    :return: cursor over documents which satisfy the query
+    """
+    if isinstance(query, str):
+        return create_postings_cursor(get_ids(query))
+    children = [build_cursor(child, get_ids, all_documents)
+                for child in query.children]
+    if query.operator == OPERATION_CODES.NOT:
+        return AndNotCursor(create_postings_cursor(all_documents), children)
+    if query.operator == OPERATION_CODES.AND_NOT:
+        return AndNotCursor(children[0], children[1:])
+    if query.operator == OPERATION_CODES.AND:
+        return AndCursor(children) if children \
+            else create_postings_cursor(all_documents)
+    if query.operator == OPERATION_CODES.OR:
+        return OrCursor(children) if children else EmptyCursor()
+    raise NotImplementedError(f'Operator "{query.operator}" is not supported')
+
+
+def take(cursor, limit: int, start: int = 0) -> list:
+    """
+    :param cursor: cursor over documents
+    :param limit: maximum amount of documents to return
+    :param start: the least document id to return
+    :return: the first [limit] documents of the cursor >= start
+    """
+    result = list()
+    doc_id = cursor.advance_to(start)
+    while doc_id is not None and len(result) < limit:
+        result.append(doc_id)
+        if len(result) < limit:
+            doc_id = cursor.next()
+    return result
+
+
+def encode_resume_cursor(doc_id: int) -> str:
+    """
+    :param doc_id: the last returned document
+    :return: opaque string to resume the search after the document
+    """
+    return base64.urlsafe_b64encode(f'doc:{doc_id}'.encode()).decode()
+
+
+def decode_resume_cursor(cursor: str) -> int:
+    """
+    :param cursor: string returned by the previous search
+    :return: the least document id which has not been returned yet
+    """
+    try:
+        prefix, doc_id = base64.urlsafe_b64decode(
+            cursor.encode()).decode().split(':')
+        if prefix != 'doc':
+            raise ValueError(prefix)
+        return int(doc_id) + 1
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Cursor "{cursor}" is incorrect')
@@ -0,0 +1,291 @@
+"""
+Disk-resident inverted index. The index is stored in two files:
+
+terms file (memory mapped):
+    header: <magic, version, amount of terms, size of the terms strip,
+             size of the postings file>
+    directory: sorted records <offset of the term in the strip,
+               offset of postings in the postings file,
+               document frequency, collection frequency>
+    strip: utf-8 encoded terms written one after another
+postings file (memory mapped):
+    document ids of every term encoded as variable byte gaps
+
+A term is found with a binary search over the directory, its postings
+are decoded only when a query touches the term, so the index is opened
+instantly and only the used parts of the files are paged in.
+"""
+import mmap
+import struct
+from collections.abc import Mapping
+from typing import Optional, Tuple
+
+from common.constants import PATH_TO_DICT, PATH_TO_DISK_TERMS, \
+    PATH_TO_DISK_POSTINGS, PATH_TO_LIST_OF_FILES
+from dictionary.variable_byte import encode_gaps, decode_gaps
+from search.bitmap_postings import make_postings_list
+from search.postings_cache import PostingsCache, DEFAULT_MAX_BYTES
+from search.query_parser import read_inverted_list
+from search.query_planner import TermStatistics
+from search.skip_list_search import PostingsList, SearchDictionary
+
+MAGIC = b'SEDI'
+VERSION = 1
+HEADER = struct.Struct('<4sIIIQ')
+RECORD = struct.Struct('<IQII')
+
+
+class IncorrectIndexFile(ValueError):
+    def __init__(self, path):
+        super().__init__(f'File "{path}" is not an index of version '
+                         f'{VERSION}')
+
+
+def write_disk_index(path_to_dict: str = PATH_TO_DICT,
+                     terms_path: str = PATH_TO_DISK_TERMS,
+                     postings_path: str = PATH_TO_DISK_POSTINGS) -> None:
+    """
+    Converts a text inverted index to the disk-resident binary format
+    :param path_to_dict: path to the text inverted index
+    :param terms_path: path to the terms file to write
+    :param postings_path: path to the postings file to write
+    """
+    records = sorted(read_inverted_list(path_to_dict),
+                     key=lambda record: record[0].encode())
+    write_disk_records(records, terms_path, postings_path)
+
+
+def encode_disk_records(records) -> Tuple[bytes, bytes]:
+    """
+    :param records: <token, frequency, sorted list of document ids>
+    records sorted by utf-8 encoded tokens
+    :return: contents of the terms file and the postings file
+    """
+    directory = bytearray()
+    strip = bytearray()
+    postings = bytearray()
+    for token, frequency, doc_ids in records:
+        directory += RECORD.pack(len(strip), len(postings), len(doc_ids),
+                                 frequency)
+        strip += token.encode()
+        postings += encode_gaps(doc_ids)
+    header = HEADER.pack(MAGIC, VERSION, len(directory) // RECORD.size,
+                         len(strip), len(postings))
+    return header + directory + strip, bytes(postings)
+
+
+def write_disk_records(records, terms_path: str, postings_path: str) -> None:
+    """
+    :param records: <token, frequency, sorted list of document ids>
+    records sorted by utf-8 encoded tokens
+    :param terms_path: path to the terms file to write
+    :param postings_path: path to the postings file to write
+    """
+    terms, postings = encode_disk_records(records)
+    with open(postings_path, 'wb') as postings_file:
+        postings_file.write(postings)
+    with open(terms_path, 'wb') as terms_file:
+        terms_file.write(terms)
+
+
+def map_file(path: str):
+    """
+    :return: read-only memory map of the file, empty bytes for an
+    empty file which can not be mapped
+    """
+    with open(path, 'rb') as file:
+        try:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b''
+
+
+def split_buffer(buffer, source: str = 'buffer') -> tuple:
+    """
+    :param buffer: contents of the terms file followed by contents of
+    the postings file
+    :param source: name of the buffer for error messages
+    :return: views of the terms and the postings parts of the buffer
+    """
+    buffer = memoryview(buffer)
+    if len(buffer) < HEADER.size:
+        raise IncorrectIndexFile(source)
+    _, _, size, strip_size, postings_size = HEADER.unpack_from(buffer, 0)
+    terms_size = HEADER.size + size * RECORD.size + strip_size
+    return buffer[:terms_size], \
+        buffer[terms_size:terms_size + postings_size]
+
+
+class DiskInvertedIndex(Mapping):
+    """
+    Read-only dictionary <token, postings list> over the memory mapped
+    index files. Decoded postings are kept in [postings_cache] if it is
+    provided, otherwise they are decoded on every access.
+    """
+
+    def __init__(self, terms_path: str = PATH_TO_DISK_TERMS,
+                 postings_path: str = PATH_TO_DISK_POSTINGS,
+                 postings_cache: PostingsCache = None):
+        self._open(map_file(terms_path), map_file(postings_path), terms_path,
+                   postings_cache)
+
+    @classmethod
+    def from_buffer(cls, buffer, postings_cache: PostingsCache = None,
+                    source: str = 'buffer') -> 'DiskInvertedIndex':
+        """
+        Opens the index stored in a single buffer, see split_buffer.
+        The buffer is read in place, it is not copied.
+        :param buffer: object which supports the buffer protocol
+        :param postings_cache: cache of decoded postings
+        :param source: name of the buffer for error messages
+        """
+        index = cls.__new__(cls)
+        index._open(*split_buffer(buffer, source), source, postings_cache)
+        return index
+
+    def _open(self, terms, postings, source: str,
+              postings_cache: PostingsCache) -> None:
+        self.postings_cache = postings_cache
+        self.terms = terms
+        self.postings = postings
+        if len(self.terms) < HEADER.size:
+            raise IncorrectIndexFile(source)
+        magic, version, self.size, strip_size, self.postings_size = \
+            HEADER.unpack_from(self.terms, 0)
+        if magic != MAGIC or version != VERSION:
+            raise IncorrectIndexFile(source)
+        self.strip_start = HEADER.size + self.size * RECORD.size
+        self.strip_size = strip_size
+        self.statistics = DiskTermStatistics(self)
+
+    def _get_record(self, i: int) -> tuple:
+        return RECORD.unpack_from(self.terms, HEADER.size + i * RECORD.size)
+
+    def _get_term(self, i: int) -> bytes:
+        start = self._get_record(i)[0]
+        end = self._get_record(i + 1)[0] if i + 1 < self.size \
+            else self.strip_size
+        return bytes(
+            self.terms[self.strip_start + start:self.strip_start + end])
+
+    def find(self, token: str) -> Optional[int]:
+        """
+        Binary search of the token in the directory
+        :return: index of the token record, None if it is not found
+        """
+        key = token.encode()
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_term(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.size and self._get_term(low) == key:
+            return low
+        return None
+
+    def get_encoded_postings(self, i: int) -> bytes:
+        """:return: variable byte encoded postings of the i-th term"""
+        start = self._get_record(i)[1]
+        end = self._get_record(i + 1)[1] if i + 1 < self.size \
+            else self.postings_size
+        return self.postings[start:end]
+
+    def decode_postings(self, i: int):
+        return make_postings_list(
+            decode_gaps(self.get_encoded_postings(i)), PostingsList)
+
+    def get_term_statistics(self, token: str) -> Optional[TermStatistics]:
+        i = self.find(token)
+        if i is None:
+            return None
+        _, _, document_frequency, collection_frequency = self._get_record(i)
+        return TermStatistics(document_frequency, collection_frequency)
+
+    def _load(self, token: str):
+        i = self.find(token)
+        if i is None:
+            raise KeyError(token)
+        return self.decode_postings(i)
+
+    def warm(self, tokens) -> None:
+        """
+        Puts postings of hot tokens into the postings cache
+        :param tokens: frequently queried tokens, unknown ones are skipped
+        """
+        if self.postings_cache is None:
+            return
+
+        def load(token):
+            i = self.find(token)
+            return None if i is None else self.decode_postings(i)
+
+        self.postings_cache.warm(tokens, load)
+
+    def __getitem__(self, token: str):
+        if self.postings_cache is None:
+            return self._load(token)
+        return self.postings_cache.get(token, lambda: self._load(token))
+
+    def __contains__(self, token) -> bool:
+        return isinstance(token, str) and self.find(token) is not None
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self._get_term(i).decode()
+
+    def __len__(self):
+        return self.size
+
+    def close(self) -> None:
+        for mapped_file in (self.terms, self.postings):
+            if isinstance(mapped_file, mmap.mmap):
+                mapped_file.close()
+            elif isinstance(mapped_file, memoryview):
+                mapped_file.release()
+
+
+class DiskTermStatistics(Mapping):
+    """Dictionary <token, TermStatistics> read from the terms directory"""
+
+    def __init__(self, index: DiskInvertedIndex):
+        self.index = index
+
+    def __getitem__(self, token: str) -> TermStatistics:
+        statistics = self.index.get_term_statistics(token)
+        if statistics is None:
+            raise KeyError(token)
+        return statistics
+
+    def __contains__(self, token) -> bool:
+        return token in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+
+def load_disk_index(terms_path: str = PATH_TO_DISK_TERMS,
+                    postings_path: str = PATH_TO_DISK_POSTINGS,
+                    file_dictionary: str = PATH_TO_LIST_OF_FILES,
+                    cache_bytes: int = DEFAULT_MAX_BYTES,
+                    hot_terms=None) -> SearchDictionary:
+    """
+    Opens the disk-resident index without reading postings
+    :param terms_path: path to the terms file
+    :param postings_path: path to the postings file
+    :param file_dictionary: path to the list of documents
+    :param cache_bytes: size limit of decoded postings kept in memory,
+    postings are decoded on every access if it is 0
+    :param hot_terms: tokens which postings are decoded in advance
+    :return: search dictionary over the disk-resident index
+    """
+    postings_cache = PostingsCache(cache_bytes) if cache_bytes else None
+    index = DiskInvertedIndex(terms_path, postings_path, postings_cache)
+    if hot_terms is not None:
+        index.warm(hot_terms)
+    return SearchDictionary(index, file_dictionary,
+                            statistics=index.statistics)
@@ -1,21 +1,161 @@
-from sortedcontainers import SortedDict
+"""
+Indexes of terms for wildcard queries.
+
+Permuterm index: every rotation of every term followed by the end of
+word mark is kept in a sorted list, so 'yon' is stored as 'yon$',
+'on$y', 'n$yo', '$yon'. A query 'a*b*c' is rotated to 'c$a*b*' and the
+terms are found with a single prefix lookup of 'c$a', the parts between
+wildcards are checked with the compiled pattern of the query.
+
+K-gram index: every term is padded with the end of word marks and split
+into k-grams, '$yon$' gives '$yo', 'yon', 'on$' for k = 3. A gram keeps
+the sorted ids of terms where it is met. A query is split into the
+grams of its parts between wildcards, postings lists of the grams are
+intersected from the shortest one and false positives are removed with
+the compiled pattern of the query, so '*ation*' touches the lists of
+'ati', 'tio', 'ion' only.
+"""
+import re
+from array import array
+from bisect import bisect_left
+
+from search.skip_list_search import PostingsList, SearchDictionary
+from search.term_index import get_prefix_end
+
+WILDCARD = '*'
+DEFAULT_K = 3
+
+
+def find_term(terms: list, term: str) -> list:
+    """:return: [term] if it is in the sorted list of terms, else []"""
+    i = bisect_left(terms, term)
+    return terms[i:i + 1] if i < len(terms) and terms[i] == term else list()
+
+
+def compile_wildcard_pattern(pattern: str) -> re.Pattern:
+    """:return: regular expression which matches terms of the pattern"""
+    return re.compile('.*'.join(re.escape(part)
+                                for part in pattern.split(WILDCARD)),
+                      re.DOTALL)
 
 
 class PermutationIndex:
     EOW = '$'
 
-    def __init__(self, k: int = 3):
-        self.permutation_index = SortedDict()
+    def __init__(self, tokens=()):
+        """
+        :param tokens: terms of the index in any order
+        """
+        self.terms = sorted(set(tokens))
+        rotations = sorted(
+            (rotation, term_id) for term_id, term in enumerate(self.terms)
+            for rotation in self.get_permutations(term))
+        self.rotations = [rotation for rotation, _ in rotations]
+        self.term_ids = array('I', (term_id for _, term_id in rotations))
+
+    def get_permutations(self, token: str) -> list:
+        """:return: all rotations of the token with the end of word mark"""
+        token = token + self.EOW
+        return [token[i:] + token[:i] for i in range(len(token))]
+
+    def get_lookup_key(self, pattern: str) -> str:
+        """
+        :param pattern: query term where [WILDCARD] matches any
+        characters
+        :return: the longest prefix of rotations which all terms of the
+        pattern with wildcards have: the end of the pattern, the end of
+        word mark and the start of the pattern, or a part between two
+        wildcards
+        """
+        parts = pattern.split(WILDCARD)
+        key = parts[-1] + self.EOW + parts[0]
+        return max([key] + parts[1:-1], key=len)
+
+    def get_range(self, prefix: str) -> range:
+        """:return: indexes of rotations which start with the prefix"""
+        start = bisect_left(self.rotations, prefix)
+        prefix_end = get_prefix_end(prefix)
+        end = len(self.rotations) if prefix_end is None \
+            else bisect_left(self.rotations, prefix_end, start)
+        return range(start, end)
+
+    def search(self, pattern: str) -> list:
+        """
+        :param pattern: query term where [WILDCARD] matches any
+        characters
+        :return: sorted list of terms which match the pattern
+        """
+        if WILDCARD not in pattern:
+            return find_term(self.terms, pattern)
+        term_ids = {self.term_ids[i]
+                    for i in self.get_range(self.get_lookup_key(pattern))}
+        terms = [self.terms[term_id] for term_id in sorted(term_ids)]
+        if pattern.count(WILDCARD) < 2:
+            return terms
+        compiled_pattern = compile_wildcard_pattern(pattern)
+        return [term for term in terms if compiled_pattern.fullmatch(term)]
+
+
+class KGramIndex:
+    EOW = '$'
+
+    def __init__(self, tokens=(), k: int = DEFAULT_K):
+        """
+        :param tokens: terms of the index in any order
+        :param k: length of grams
+        """
         self.k = k
+        self.terms = sorted(set(tokens))
+        grams = dict()
+        for term_id, term in enumerate(self.terms):
+            for gram in set(self.get_grams(self.EOW + term + self.EOW)):
+                grams.setdefault(gram, array(PostingsList.typecode)) \
+                    .append(term_id)
+        self.postings = {gram: PostingsList.from_array(term_ids)
+                         for gram, term_ids in grams.items()}
+
+    def get_grams(self, part: str) -> list:
+        """:return: k-grams of the part, empty if it is shorter than k"""
+        return [part[i:i + self.k] for i in range(len(part) - self.k + 1)]
+
+    def get_query_grams(self, pattern: str) -> set:
+        """
+        :param pattern: query term where [WILDCARD] matches any
+        characters
+        :return: grams which every matching term contains
+        """
+        parts = (self.EOW + pattern + self.EOW).split(WILDCARD)
+        return {gram for part in parts for gram in self.get_grams(part)}
+
+    def get_candidates(self, pattern: str) -> list:
+        """
+        :return: sorted ids of terms which contain all grams of the
+        pattern, all terms if the pattern has no grams
+        """
+        grams = self.get_query_grams(pattern)
+        if not grams:
+            # parts of the pattern are shorter than k, such as 'a*' or
+            # 'y*r', so every term is a candidate and the whole
+            # vocabulary is checked with the pattern
+            return list(range(len(self.terms)))
+        postings = sorted((self.postings.get(gram, PostingsList())
+                           for gram in grams), key=len)
+        result = postings[0]
+        for gram_postings in postings[1:]:
+            if not result:
+                break
+            result = SearchDictionary._intersect(result, gram_postings)
+        return result.to_list()
 
-    def get_permutations(self, tokens: list):
-        for token in tokens:
-            token = token + self.EOW
-            shifts = list()
-            while token[0] != self.EOW:
-                shifts.append(token)
-                token = token[1:] + token[0]
-            self.permutation_index[token[1:]] = shifts
-
-    def search(self, token_part):
-        pass
+    def search(self, pattern: str) -> list:
+        """
+        :param pattern: query term where [WILDCARD] matches any
+        characters
+        :return: sorted list of terms which match the pattern
+        """
+        if WILDCARD not in pattern:
+            return find_term(self.terms, pattern)
+        compiled_pattern = compile_wildcard_pattern(pattern)
+        terms = (self.terms[term_id]
+                 for term_id in self.get_candidates(pattern))
+        return [term for term in terms if compiled_pattern.fullmatch(term)]
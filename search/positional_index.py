@@ -0,0 +1,233 @@
+"""
+Positional index: token -> {doc_id: sorted array of word positions}.
+Positions are word ordinals in the document, so two words are adjacent
+when their positions differ by one. Phrase and proximity queries are
+evaluated with the positional intersect: documents of two tokens are
+intersected, then their position arrays are merged in a single pass.
+
+Query for PositionalIndex.search is a list of tokens, where a token
+may be followed by '/k' to find the next token within k words before
+or after it, otherwise the next token must follow it immediately:
+    ['new', 'york']             - phrase "new york"
+    ['salary', '/3', 'rise']    - "salary" and "rise" within 3 words
+    ['out', '*', 'york']        - a word which is removed from the query
+                                  (a stopword) is skipped as any word
+"""
+import os
+import re
+from array import array
+from bisect import bisect_right
+from typing import Tuple
+
+from common.constants import PATH_TO_POSITIONS, PATH_TO_OFFSETS
+from dictionary.positional_postings import PositionalPostingsFile
+from search.query_tree import ALL
+
+PROXIMITY_PATTERN = re.compile(r'/(\d+)')
+
+
+def intersect_positions(left, right, min_distance: int,
+                        max_distance: int) -> array:
+    """
+    Merges two sorted position arrays
+    :param left: positions of the first token
+    :param right: positions of the second token
+    :param min_distance: minimum of <right position - left position>
+    :param max_distance: maximum of <right position - left position>
+    :return: positions of [right] which have a position of [left]
+    at the required distance
+    """
+    result = array('I')
+    i = 0
+    for position in right:
+        while i < len(left) and left[i] < position - max_distance:
+            i += 1
+        if i == len(left):
+            break
+        if left[i] <= position - min_distance:
+            result.append(position)
+    return result
+
+
+def parse_proximity_query(query: list) -> Tuple[list, list]:
+    """
+    :param query: tokens and '/k' operators, see the module docstring
+    :return: <tokens, <min distance, max distance> between every two
+    neighbour tokens>
+    """
+    tokens = list()
+    distances = list()
+    distance = (1, 1)
+    for item in query:
+        match = PROXIMITY_PATTERN.fullmatch(item)
+        if match is not None:
+            k = int(match.group(1))
+            distance = (-k, k)
+            continue
+        if item == ALL:
+            # the skipped word takes a position between the tokens
+            if tokens:
+                low, high = distance
+                distance = (low + 1, high + 1) if low > 0 \
+                    else (low - 1, high + 1)
+            continue
+        if tokens:
+            distances.append(distance)
+        tokens.append(item)
+        distance = (1, 1)
+    return tokens, distances
+
+
+class PositionalIndex:
+    def __init__(self, postings=None):
+        """
+        :param postings: dictionary <token, dictionary <doc_id, sorted
+        positions>>, for example PositionalPostingsFile. Empty if None
+        """
+        self.postings = dict() if postings is None else postings
+
+    def add_document(self, doc_id: int, token_positions: dict) -> None:
+        """
+        :param doc_id: id of the document
+        :param token_positions: dictionary <token, sorted word positions>
+        """
+        for token, positions in token_positions.items():
+            self.postings.setdefault(token, dict())[doc_id] = \
+                array('I', positions)
+
+    def get_positions(self, token: str, doc_id: int) -> array:
+        return self.postings.get(token, dict()).get(doc_id, array('I'))
+
+    def get_documents(self, token: str) -> list:
+        return sorted(self.postings.get(token, dict()))
+
+    def positional_intersect(self, matches: dict, token: str,
+                             min_distance: int, max_distance: int) -> dict:
+        """
+        :param matches: dictionary <doc_id, positions where the already
+        matched part of the query ends>
+        :param token: the next token of the query
+        :param min_distance: minimum distance to the previous token
+        :param max_distance: maximum distance to the previous token
+        :return: dictionary <doc_id, positions of the token which
+        continue the matched part of the query>
+        """
+        documents = self.postings.get(token, dict())
+        if len(documents) < len(matches):
+            doc_ids = [doc_id for doc_id in documents if doc_id in matches]
+        else:
+            doc_ids = [doc_id for doc_id in matches if doc_id in documents]
+        result = dict()
+        for doc_id in doc_ids:
+            positions = intersect_positions(matches[doc_id],
+                                            documents[doc_id],
+                                            min_distance, max_distance)
+            if positions:
+                result[doc_id] = positions
+        return result
+
+    def search(self, query: list, candidates: list = None) -> list:
+        """
+        :param query: tokens and '/k' operators, see the module docstring
+        :param candidates: if provided, only these documents are checked
+        :return: sorted list of documents which contain the phrase
+        """
+        tokens, distances = parse_proximity_query(query)
+        if not tokens:
+            return list()
+        matches = self.postings.get(tokens[0], dict())
+        if candidates is not None:
+            matches = {doc_id: matches[doc_id] for doc_id in candidates
+                       if doc_id in matches}
+        for token, (min_distance, max_distance) in zip(tokens[1:],
+                                                       distances):
+            if not matches:
+                break
+            matches = self.positional_intersect(matches, token,
+                                                min_distance, max_distance)
+        return sorted(matches)
+
+    def get_longest_match(self, tokens: list, doc_id: int,
+                          max_distance: int) -> Tuple[int, int]:
+        """
+        Finds the longest prefix of the tokens where every token follows
+        the previous one within [max_distance] words
+        :return: <start position, amount of matched tokens>
+        """
+        best_start, best_length = None, 0
+        for start in self.get_positions(tokens[0], doc_id):
+            position, length = start, 1
+            for token in tokens[1:]:
+                positions = self.get_positions(token, doc_id)
+                i = bisect_right(positions, position)
+                if i == len(positions) or \
+                        positions[i] > position + max_distance:
+                    break
+                position, length = positions[i], length + 1
+            if length > best_length:
+                best_start, best_length = start, length
+        return best_start, best_length
+
+
+def load_positional_index(path: str = PATH_TO_POSITIONS,
+                          in_memory: bool = False) -> PositionalIndex:
+    """
+    :param path: path to the positions file
+    :param in_memory: if True, positions of all tokens are read from the
+    file once. Otherwise the index reads the memory mapped file, and
+    positions are decoded only for documents which are checked by a
+    query.
+    :return: positional index
+    """
+    postings_file = PositionalPostingsFile(path)
+    if not in_memory:
+        return PositionalIndex(postings_file)
+    with postings_file:
+        return PositionalIndex({token: postings_file.get_postings(token)
+                                for token in postings_file})
+
+
+class DocumentOffsets:
+    """
+    Character offsets of tokens in documents to highlight matches. The
+    offsets file is indexed by documents once, so offsets of a document
+    are read without a scan of the vocabulary. The i-th offset of a
+    token belongs to its i-th position.
+    """
+
+    def __init__(self, path: str = PATH_TO_OFFSETS):
+        """
+        :param path: path to the offsets file, documents have no offsets
+        if it does not exist
+        """
+        self.offsets_file = None
+        if os.path.isfile(path):
+            self.offsets_file = PositionalPostingsFile(path)
+            self.offsets_file.index_documents()
+
+    def get(self, doc_id: int) -> dict:
+        """:return: dictionary <token, character offsets in the document>"""
+        if self.offsets_file is None:
+            return dict()
+        return self.offsets_file.get_document(doc_id)
+
+    def close(self) -> None:
+        if self.offsets_file is not None:
+            self.offsets_file.close()
+
+
+def load_document_offsets(doc_id: int, path: str = PATH_TO_OFFSETS
+                          ) -> dict:
+    """
+    Reads character offsets of tokens in a single document. The document
+    is looked up in the documents of every token, so this is meant for
+    offline use, DocumentOffsets serves highlighting of many documents.
+    :param doc_id: id of the document
+    :param path: path to the offsets file
+    :return: dictionary <token, character offsets>, empty if offsets
+    were not stored by the index builder
+    """
+    if not os.path.isfile(path):
+        return dict()
+    with PositionalPostingsFile(path) as offsets_file:
+        return offsets_file.get_document(doc_id)
@@ -0,0 +1,203 @@
+from array import array
+from collections import OrderedDict
+from threading import Lock
+
+from common.constants import BYTE
+
+DEFAULT_MAX_BYTES = 32 * BYTE * BYTE
+SKETCH_WIDTH = 4096
+SKETCH_DEPTH = 4
+
+
+class FrequencySketch:
+    """
+    Count-min sketch of access frequencies. Counters are halved after
+    every [sample_size] accesses, so the sketch forgets old popularity.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH,
+                 sample_size: int = None):
+        self.width = width
+        self.rows = [array('I', bytes(4 * width)) for _ in range(depth)]
+        self.sample_size = 10 * width if sample_size is None else sample_size
+        self.additions = 0
+
+    def _get_indexes(self, key):
+        return [hash((row, key)) % self.width
+                for row in range(len(self.rows))]
+
+    def increment(self, key) -> None:
+        for row, index in zip(self.rows, self._get_indexes(key)):
+            row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._reset()
+
+    def estimate(self, key) -> int:
+        return min(row[index]
+                   for row, index in zip(self.rows, self._get_indexes(key)))
+
+    def _reset(self) -> None:
+        for row in self.rows:
+            for i in range(len(row)):
+                row[i] >>= 1
+        self.additions //= 2
+
+
+class PostingsCache:
+    """
+    Cache of decoded postings lists limited by their total size in
+    bytes. Entries are kept in LRU order, but a new postings list is
+    admitted only if it is accessed more frequently than the entries
+    it would evict (TinyLFU admission), so a burst of rare tokens does
+    not wash hot tokens out of the cache. The cache may be used by
+    several threads at once, postings are decoded outside of the lock.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.sketch = FrequencySketch()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+        self.lock = Lock()
+
+    def get(self, token: str, load):
+        """
+        :param token: token to find
+        :param load: function which decodes postings of the token if
+        they are not cached
+        :return: postings list of the token
+        """
+        with self.lock:
+            self.sketch.increment(token)
+            postings = self.entries.get(token)
+            if postings is not None:
+                self.hits += 1
+                self.entries.move_to_end(token)
+                return postings
+            self.misses += 1
+        postings = load()
+        with self.lock:
+            if token not in self.entries:
+                self._admit(token, postings)
+        return postings
+
+    def get_many(self, tokens, load_many) -> dict:
+        """
+        Batch version of get: postings of the tokens which are not
+        cached are decoded with a single call, every one of them passes
+        the same admission as in get
+        :param tokens: tokens to find
+        :param load_many: function which takes a list of tokens which
+        are not cached and returns dictionary <token, postings list>
+        :return: dictionary <token, postings list> of the found tokens
+        """
+        result = dict()
+        missing = list()
+        with self.lock:
+            for token in tokens:
+                self.sketch.increment(token)
+                postings = self.entries.get(token)
+                if postings is None:
+                    self.misses += 1
+                    missing.append(token)
+                    continue
+                self.hits += 1
+                self.entries.move_to_end(token)
+                result[token] = postings
+        if missing:
+            loaded = load_many(missing)
+            with self.lock:
+                for token, postings in loaded.items():
+                    if token not in self.entries:
+                        self._admit(token, postings)
+            result.update(loaded)
+        return result
+
+    def warm(self, tokens, load) -> None:
+        """
+        Decodes postings of hot tokens in advance
+        :param tokens: tokens to put into the cache
+        :param load: function which decodes postings of a token or
+        returns None if the token is not in the index
+        """
+        for token in tokens:
+            with self.lock:
+                self.sketch.increment(token)
+                if token in self.entries:
+                    continue
+            postings = load(token)
+            if postings is None or postings.nbytes > self.max_bytes:
+                continue
+            with self.lock:
+                if token not in self.entries:
+                    self._evict(self.size + postings.nbytes - self.max_bytes)
+                    self._put(token, postings)
+
+    def _admit(self, token: str, postings) -> None:
+        if postings.nbytes > self.max_bytes:
+            self.rejections += 1
+            return
+        frequency = self.sketch.estimate(token)
+        excess = self.size + postings.nbytes - self.max_bytes
+        freed = 0
+        for victim, victim_postings in self.entries.items():
+            if freed >= excess:
+                break
+            if self.sketch.estimate(victim) >= frequency:
+                self.rejections += 1
+                return
+            freed += victim_postings.nbytes
+        self._evict(excess)
+        self._put(token, postings)
+
+    def _evict(self, excess: int) -> None:
+        while excess > 0 and self.entries:
+            _, postings = self.entries.popitem(last=False)
+            self.size -= postings.nbytes
+            excess -= postings.nbytes
+            self.evictions += 1
+
+    def _put(self, token: str, postings) -> None:
+        self.entries[token] = postings
+        self.size += postings.nbytes
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def get_statistics(self) -> dict:
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'rejections': self.rejections,
+            'hit_rate': self.hit_rate
+        }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+    def __contains__(self, token) -> bool:
+        return token in self.entries
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,96 @@
+from collections import OrderedDict
+from threading import Lock
+
+from common.constants import BYTE
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * BYTE * BYTE
+
+
+class QueryResultCache:
+    """
+    LRU cache of query results keyed by the canonical representation of
+    a query plan. The cache is bounded by the amount of entries and by
+    the total size of cached postings lists. The least recently used
+    results are evicted first. The cache may be used by several
+    threads at once.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        """
+        :param key: canonical key of a query plan
+        :return: cached result or None
+        """
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return result
+
+    def put(self, key, result) -> None:
+        """
+        Saves the result and evicts the least recently used results
+        while the cache exceeds its limits. Results which are larger than
+        the whole cache are not saved.
+        :param key: canonical key of a query plan
+        :param result: postings list
+        """
+        if result.nbytes > self.max_bytes or self.max_entries <= 0:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key).nbytes
+            self.entries[key] = result
+            self.size += result.nbytes
+            while len(self.entries) > self.max_entries or \
+                    self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.nbytes
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """invalidates all cached results"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def get_statistics(self) -> dict:
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate
+        }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
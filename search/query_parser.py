@@ -1,9 +1,15 @@
-from enum import Enum
+import re
+from functools import lru_cache
+from typing import Optional, Iterator, Tuple
 
-from common.constants import SPLIT, DIVIDER, PATH_TO_DICT
+from common.constants import SPLIT, DIVIDER, PATH_TO_DICT, \
+    PATH_TO_LIST_OF_FILES
 from common.exceptions import IncorrectQuery
 from dictionary.tokenizer import Tokenizer
-from search.skip_list_search import DocumentSkipList, SearchDictionary, \
+from search.bitmap_postings import make_postings_list
+from search.query_planner import TermStatistics
+from search.query_tree import build_query_tree
+from search.skip_list_search import PostingsList, SearchDictionary, \
     OPERATION_CODES, ALL
 
 
@@ -13,38 +19,67 @@ class OPERATIONS:
     NOT = ['-']
     AND_OR = AND + OR
     ALL = AND_OR + NOT
+    OPEN = '('
+    CLOSE = ')'
 
 
-def load_inverted_list(path: str = PATH_TO_DICT) -> dict:
+# parentheses or a sequence of characters without spaces and parentheses
+LEXEME_PATTERN = re.compile(r'[()]|[^\s()]+')
+COMPILED_QUERIES_CACHE_SIZE = 4096
+
+_tokenizer = None
+
+
+def read_inverted_list(path: str = PATH_TO_DICT
+                       ) -> Iterator[Tuple[str, int, list]]:
     """
-    Reads inverted index(dictionary) from file
-    :param path:
-    :return:
+    Reads inverted index(dictionary) from file line by line
+    :param path: path to file on disk with inverted index
+    :return: <token, frequency, sorted list of document ids> records
     """
-    result = dict()
     with open(path) as file:
         for line in file:
             key, values = line.strip().split(SPLIT)
-            # omit frequency in this case
-            token, _ = key.split(DIVIDER)
-            result[token] = DocumentSkipList(values.split(','))
+            token, frequency = key.split(DIVIDER)
+            doc_ids = sorted(int(doc_id) for doc_id in values.split(','))
+            yield token, int(frequency), doc_ids
+
+
+def load_inverted_list(path: str = PATH_TO_DICT,
+                       statistics: dict = None) -> dict:
+    """
+    Reads inverted index(dictionary) from file
+    :param path: path to file on disk with inverted index
+    :param statistics: if provided, the dictionary is filled with
+    <token, TermStatistics> records
+    :return: dictionary <token, postings list>
+    """
+    result = dict()
+    for token, frequency, doc_ids in read_inverted_list(path):
+        result[token] = make_postings_list(doc_ids, PostingsList)
+        if statistics is not None:
+            statistics[token] = TermStatistics(len(doc_ids), frequency)
     return result
 
 
-def load_inverted_skip_index(path: str = PATH_TO_DICT) -> SearchDictionary:
+def load_inverted_skip_index(path: str = PATH_TO_DICT,
+                             file_dictionary: str = PATH_TO_LIST_OF_FILES
+                             ) -> SearchDictionary:
     """
     Reads inverted index(dictionary) from file. The proposed data
-    structure to save dictionary:
-                 ___________________________________   _________________
-                |                                   | |                 |
-                |                                   V |                 V
-    token -> (doc_id1->doc_id2->doc_id3->doc_id4->doc_id5->doc_id6->doc_id6)
+    structure to save dictionary - sorted typed array of document ids
+    traversed with galloping search:
+    token -> array('I', [doc_id1, doc_id2, doc_id3, doc_id4, doc_id5])
+    or bitmap chunks for tokens which are met in most of documents:
+    token -> {chunk_0: 0b0110...1, chunk_3: 0b1...01}
     This data structure accelerate the search
     :param path: path to file on disk with inverted index
+    :param file_dictionary: path to the list of documents
     :return inverted index (dictionary)
     """
-    result = load_inverted_list(path)
-    return SearchDictionary(result)
+    statistics = dict()
+    result = load_inverted_list(path, statistics)
+    return SearchDictionary(result, file_dictionary, statistics=statistics)
 
 
 def get_operator_code(operator) -> OPERATION_CODES:
@@ -58,47 +93,115 @@ def get_operator_code(operator) -> OPERATION_CODES:
         f'Operator "{operator}" is not supported')
 
 
-def build_notation_from_normalized_query(query: str) -> list:
-    def tokenize(word: str) -> str:
-        word = tokenizer.tokenize(word)
-        return token[0][1] if word else ALL
-
-    def add_token_to_notation():
-        if token.startswith(OPERATIONS.NOT[0]) and len(token) > 1:
-            result_notation.append(tokenize(token[1:]))
-            result_notation.append(OPERATION_CODES.NOT)
-        else:
-            result_notation.append(tokenize(token))
-
-    states = Enum('states', 'START TOKEN OPERATOR')
-    result_notation = list()
-    stack = list()
-    tokenizer = Tokenizer()
-    state = states.START
-    for token in query.split(' '):
-        if state == states.START and token in OPERATIONS.AND_OR:
-            raise IncorrectQuery(query, query.index(token))
-        elif state == states.START:
-            state = states.TOKEN
-            add_token_to_notation()
-        elif state == states.TOKEN and token in OPERATIONS.AND_OR:
-            state = states.OPERATOR
-            stack.append(get_operator_code(token))
-        elif state == states.TOKEN:
-            stack.append(get_operator_code(OPERATIONS.AND[0]))
-            add_token_to_notation()
-        elif state == states.OPERATOR and token in OPERATIONS.AND_OR:
-            raise IncorrectQuery(query, query.index(token))
-        elif state == states.OPERATOR:
-            state = states.TOKEN
-            add_token_to_notation()
+def get_tokenizer() -> Tokenizer:
+    """
+    :return: tokenizer shared by all queries of the process, so the
+    stopwords list is loaded once
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = Tokenizer()
+    return _tokenizer
+
+
+def normalize_words(words: list) -> list:
+    """
+    Normalizes query words with a single call of the tokenizer. Words
+    which are removed by the tokenizer (stopwords, special characters)
+    are replaced with a token which is met in all documents.
+    :param words: words of a query without spaces
+    :return: list of tokens, one for each word
+    """
+    starts = list()
+    offset = 0
+    for word in words:
+        starts.append(offset)
+        offset += len(word) + 1
+    tokens = dict(get_tokenizer().tokenize(' '.join(words)))
+    return [tokens.get(start, ALL) for start in starts]
+
+
+def parse_query(query: str) -> list:
+    """
+    Convert query to an inverted notation without normalization of
+    words. Grammar, from the lowest precedence to the highest:
+        or_query = and_query (('OR' | '|') and_query)*
+        and_query = not_query (['AND'] not_query)*
+        not_query = '-' not_query | '-'word | '(' or_query ')' | word
+    :param query: search query string
+    :return: inverted notation where operands are raw query words
+    """
+    def current() -> Optional[str]:
+        return lexemes[position][1] if position < len(lexemes) else None
+
+    def raise_incorrect_query():
+        raise IncorrectQuery(query, lexemes[position][0]
+                             if position < len(lexemes) else len(query))
+
+    def parse_or_query():
+        nonlocal position
+        parse_and_query()
+        while current() in OPERATIONS.OR:
+            position += 1
+            parse_and_query()
+            notation.append(OPERATION_CODES.OR)
+
+    def parse_and_query():
+        nonlocal position
+        parse_not_query()
+        while current() is not None and current() not in OPERATIONS.OR \
+                and current() != OPERATIONS.CLOSE:
+            if current() in OPERATIONS.AND:
+                position += 1
+            parse_not_query()
+            notation.append(OPERATION_CODES.AND)
+
+    def parse_not_query():
+        nonlocal position
+        lexeme = current()
+        if lexeme is None or lexeme in OPERATIONS.AND_OR or \
+                lexeme == OPERATIONS.CLOSE:
+            raise_incorrect_query()
+        position += 1
+        if lexeme == OPERATIONS.OPEN:
+            parse_or_query()
+            if current() != OPERATIONS.CLOSE:
+                raise_incorrect_query()
+            position += 1
+        elif lexeme in OPERATIONS.NOT and current() is not None and \
+                current() not in OPERATIONS.AND_OR and \
+                current() != OPERATIONS.CLOSE:
+            parse_not_query()
+            notation.append(OPERATION_CODES.NOT)
+        elif lexeme[0] in OPERATIONS.NOT and len(lexeme) > 1:
+            notation.append(lexeme[1:])
+            notation.append(OPERATION_CODES.NOT)
         else:
-            raise IncorrectQuery(query, query.index(token))
-    if state == states.OPERATOR:
-        raise IncorrectQuery(query, len(query))
-    while len(stack) > 0:
-        result_notation.append(stack.pop())
-    return result_notation
+            notation.append(lexeme)
+
+    lexemes = [(match.start(), match.group())
+               for match in LEXEME_PATTERN.finditer(query)]
+    notation = list()
+    position = 0
+    parse_or_query()
+    if position < len(lexemes):
+        raise_incorrect_query()
+    return notation
+
+
+def build_notation_from_normalized_query(query: str) -> list:
+    notation = parse_query(query)
+    word_indexes = [i for i, token in enumerate(notation)
+                    if isinstance(token, str)]
+    tokens = normalize_words([notation[i] for i in word_indexes])
+    for i, token in zip(word_indexes, tokens):
+        notation[i] = token
+    return notation
+
+
+@lru_cache(maxsize=COMPILED_QUERIES_CACHE_SIZE)
+def compile_notation(normalized_command: str) -> tuple:
+    return tuple(build_notation_from_normalized_query(normalized_command))
 
 
 def remove_extra_spaces(line: str) -> str:
@@ -107,9 +210,10 @@ def remove_extra_spaces(line: str) -> str:
 
 def build_notation(command: str) -> list:
     """
-    Convert command to an inverted notation.
-    :param command: search query string. All operands must be separated
-    by spaces
+    Convert command to an inverted notation. Compiled queries are
+    cached by the query string.
+    :param command: search query string. Operands and operators must be
+    separated by spaces or parentheses
     :return: inverted notation
     """
     if command == '' or command is None:
@@ -118,4 +222,18 @@ def build_notation(command: str) -> list:
     if normalized_command == '':
         return list()
 
-    return build_notation_from_normalized_query(normalized_command)
+    return list(compile_notation(normalized_command))
+
+
+@lru_cache(maxsize=COMPILED_QUERIES_CACHE_SIZE)
+def compile_query(command: str):
+    """
+    Convert command to a query tree which can be passed to the search.
+    Compiled queries are cached by the query string.
+    :param command: search query string
+    :return: query tree or a single token
+    """
+    notation = build_notation(command)
+    if not notation:
+        return ALL
+    return build_query_tree(notation)
@@ -0,0 +1,205 @@
+from dataclasses import dataclass
+
+from search.query_tree import OPERATION_CODES, ALL, QueryNode, create_node, \
+    query_key
+
+# query which is not satisfied by any document
+EMPTY = QueryNode(OPERATION_CODES.OR, [])
+
+
+@dataclass
+class TermStatistics:
+    """
+    Collection statistics of a token:
+    document_frequency - amount of documents where the token is met,
+    collection_frequency - amount of the token occurrences in all
+    documents
+    """
+    document_frequency: int
+    collection_frequency: int
+
+
+def is_empty(query) -> bool:
+    return isinstance(query, QueryNode) and \
+        query.operator == OPERATION_CODES.OR and not query.children
+
+
+def is_negation(query) -> bool:
+    return isinstance(query, QueryNode) and \
+        query.operator == OPERATION_CODES.NOT
+
+
+def unique(queries: list) -> list:
+    """removes repeated subqueries keeping the order of the first ones"""
+    keys = set()
+    result = list()
+    for query in queries:
+        key = query_key(query)
+        if key not in keys:
+            keys.add(key)
+            result.append(query)
+    return result
+
+
+class QueryPlanner:
+    """
+    Rewrites boolean query trees before evaluation with the help of
+    collection statistics:
+    - tokens missing in the dictionary are replaced with an empty
+    result, which short-circuits AND and is removed from OR;
+    - repeated subqueries of AND/OR are removed;
+    - double negation is removed;
+    - operands of AND are ordered by estimated amount of documents;
+    - NOT under AND is pushed into AND_NOT, AND of negations only is
+    replaced with NOT (a OR b).
+    Amount of documents of a subquery is estimated with an assumption
+    that tokens are distributed independently.
+    """
+
+    def __init__(self, statistics: dict, documents_number: int):
+        """
+        :param statistics: dictionary <token, TermStatistics>
+        :param documents_number: amount of documents in the collection
+        """
+        self.statistics = statistics
+        self.documents_number = documents_number
+
+    def get_document_frequency(self, token: str) -> int:
+        if token == ALL:
+            return self.documents_number
+        statistics = self.statistics.get(token)
+        return 0 if statistics is None else statistics.document_frequency
+
+    def estimate(self, query) -> float:
+        """
+        :param query: query tree or a single token
+        :return: estimated amount of documents which satisfy the query
+        """
+        if isinstance(query, str):
+            return self.get_document_frequency(query)
+        n = max(self.documents_number, 1)
+        probabilities = [min(self.estimate(child) / n, 1)
+                         for child in query.children]
+        probability = 1
+        if query.operator == OPERATION_CODES.NOT:
+            probability = 1 - probabilities[0]
+        elif query.operator == OPERATION_CODES.AND:
+            for p in probabilities:
+                probability *= p
+        elif query.operator == OPERATION_CODES.OR:
+            for p in probabilities:
+                probability *= 1 - p
+            probability = 1 - probability
+        elif query.operator == OPERATION_CODES.AND_NOT:
+            probability = probabilities[0]
+            for p in probabilities[1:]:
+                probability *= 1 - p
+        return probability * n
+
+    def plan(self, query):
+        """
+        :param query: query tree or a single token
+        :return: rewritten query tree
+        """
+        if isinstance(query, str):
+            if query != ALL and self.get_document_frequency(query) == 0:
+                return EMPTY
+            return query
+        if query.operator == OPERATION_CODES.NOT:
+            return self._plan_negation(self.plan(query.children[0]))
+        if query.operator == OPERATION_CODES.AND_NOT:
+            query = QueryNode(OPERATION_CODES.AND, query.children[:1] + [
+                QueryNode(OPERATION_CODES.NOT, [child])
+                for child in query.children[1:]])
+        children = [self.plan(child) for child in query.children]
+        if query.operator == OPERATION_CODES.AND:
+            return self._plan_conjunction(children)
+        if query.operator == OPERATION_CODES.OR:
+            return self._plan_disjunction(children)
+        raise NotImplementedError(
+            f'Operator "{query.operator}" is not supported')
+
+    @staticmethod
+    def _plan_negation(child):
+        if is_empty(child):
+            return ALL
+        if child == ALL:
+            return EMPTY
+        if is_negation(child):
+            return child.children[0]
+        return QueryNode(OPERATION_CODES.NOT, [child])
+
+    def _plan_conjunction(self, children: list):
+        node = create_node(OPERATION_CODES.AND, children)
+        if any(is_empty(child) for child in node.children):
+            return EMPTY
+        children = unique([child for child in node.children if child != ALL])
+        positive = [child for child in children if not is_negation(child)]
+        negative = [child.children[0] for child in children
+                    if is_negation(child)]
+        positive_keys = {query_key(child) for child in positive}
+        if any(query_key(child) in positive_keys for child in negative):
+            return EMPTY
+        if not negative:
+            return self._order_conjuncts(positive)
+        if not positive:
+            return self._plan_negation(self._plan_disjunction(negative))
+        negative.sort(key=self.estimate, reverse=True)
+        return QueryNode(OPERATION_CODES.AND_NOT,
+                         [self._order_conjuncts(positive)] + negative)
+
+    def _order_conjuncts(self, children: list):
+        if not children:
+            return ALL
+        if len(children) == 1:
+            return children[0]
+        return QueryNode(OPERATION_CODES.AND,
+                         sorted(children, key=self.estimate))
+
+    def _plan_disjunction(self, children: list):
+        node = create_node(OPERATION_CODES.OR, children)
+        if any(child == ALL for child in node.children):
+            return ALL
+        children = unique(
+            [child for child in node.children if not is_empty(child)])
+        if not children:
+            return EMPTY
+        if len(children) == 1:
+            return children[0]
+        return QueryNode(OPERATION_CODES.OR,
+                         sorted(children, key=self.estimate))
+
+    def explain(self, query) -> str:
+        """
+        :param query: query tree or a single token
+        :return: the query tree, one subquery per line, with estimated
+        amounts of documents and statistics of tokens. Subqueries which
+        are met several times are evaluated once and marked as shared.
+        """
+        def explain_node(node, depth: int):
+            key = query_key(node)
+            line = f'{"  " * depth}'
+            if isinstance(node, str):
+                line += node
+                statistics = self.statistics.get(node)
+                if statistics is not None:
+                    line += f' (df={statistics.document_frequency}, ' \
+                            f'cf={statistics.collection_frequency})'
+            else:
+                line += str(node) if not node.children \
+                    else node.operator.name
+            line += f' ~{self.estimate(node):.1f}'
+            if isinstance(node, str):
+                lines.append(line)
+            elif key in seen:
+                lines.append(f'{line} [shared]')
+            else:
+                seen.add(key)
+                lines.append(line)
+                for child in node.children:
+                    explain_node(child, depth + 1)
+
+        lines = list()
+        seen = set()
+        explain_node(query, 0)
+        return '\n'.join(lines)
@@ -0,0 +1,94 @@
+from dataclasses import dataclass, field
+from enum import Enum
+
+OPERATION_CODES = Enum('OPERATION_CODES', 'AND OR NOT AND_NOT')
+N_ARY_OPERATIONS = (OPERATION_CODES.AND, OPERATION_CODES.OR)
+# token which is met in every document of the collection
+ALL = '*'
+
+
+@dataclass
+class QueryNode:
+    """
+    Node of a boolean query tree. Leaves of the tree are tokens (str).
+    AND and OR nodes are n-ary: chains of the same operator are
+    collapsed into a single node, so 'a b c d' is represented as
+    AND(a, b, c, d) instead of AND(a, AND(b, AND(c, d))).
+    """
+    operator: OPERATION_CODES
+    children: list = field(default_factory=list)
+
+    def __str__(self):
+        if not self.children:
+            return 'EMPTY' if self.operator == OPERATION_CODES.OR else ALL
+        if self.operator == OPERATION_CODES.NOT:
+            return f'NOT {self.children[0]}'
+        operator = f' {self.operator.name} '
+        return f'({operator.join(str(child) for child in self.children)})'
+
+
+def create_node(operator: OPERATION_CODES, children: list) -> QueryNode:
+    """
+    Creates a node and moves children of nested nodes with the same
+    n-ary operator to the created node
+    """
+    if operator not in N_ARY_OPERATIONS:
+        return QueryNode(operator, children)
+    flat_children = list()
+    for child in children:
+        if isinstance(child, QueryNode) and child.operator == operator:
+            flat_children.extend(child.children)
+        else:
+            flat_children.append(child)
+    return QueryNode(operator, flat_children)
+
+
+def query_key(query):
+    """
+    Canonical representation of a query tree which does not depend on
+    the order of operands of commutative operations, so 'a AND b' and
+    'b a' have the same key.
+    :param query: query tree or a single token
+    :return: hashable key
+    """
+    if isinstance(query, str):
+        return query
+    keys = [query_key(child) for child in query.children]
+    if query.operator in N_ARY_OPERATIONS:
+        keys = sorted(set(keys), key=repr)
+    elif query.operator == OPERATION_CODES.AND_NOT:
+        keys = keys[:1] + sorted(set(keys[1:]), key=repr)
+    return (query.operator.name, *keys)
+
+
+def get_tokens(query) -> set:
+    """
+    :param query: query tree or a single token
+    :return: tokens which are met in the query
+    """
+    if isinstance(query, str):
+        return {query}
+    return set().union(*(get_tokens(child) for child in query.children))
+
+
+def build_query_tree(notation: list):
+    """
+    Convert an inverted notation to a query tree
+    :param notation: inverted notation of a query
+    :return: root of the tree: QueryNode or a token if the query
+    consists of a single token
+    """
+    stack = list()
+    for token in notation:
+        if token == OPERATION_CODES.NOT:
+            stack.append(create_node(token, [stack.pop()]))
+        elif isinstance(token, OPERATION_CODES):
+            right, left = stack.pop(), stack.pop()
+            stack.append(create_node(token, [left, right]))
+        else:
+            stack.append(token)
+    if len(stack) != 1:
+        raise AttributeError(f'"{notation}" is incorrect or there is '
+                             f'a bug in the algorithm implementation.\n'
+                             f'Stack is not empty at the end: {stack}')
+    return stack[0]
@@ -0,0 +1,340 @@
+"""
+Asyncio HTTP server over resident search dictionaries. The index is
+loaded once, queries are evaluated in a pool of worker threads or
+processes, so the event loop only parses requests and writes responses:
+
+    GET /<endpoint>?q=<query>[&limit=<n>] -> {"documents": [...]}
+    GET /stats -> latency histograms and counters of every endpoint
+
+A request which does not fit into the limit of requests in flight is
+rejected with 503, a query which is not evaluated in time is answered
+with 504. A query keeps its place in flight until its worker finishes
+the evaluation, so slow queries which are out of time still hold back
+new requests.
+"""
+import asyncio
+import json
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from http import HTTPStatus
+from threading import Lock
+from urllib.parse import urlsplit, parse_qs
+
+from common.constants import PATH_TO_DICT
+from common.exceptions import IncorrectQuery
+from search.query_parser import compile_query, normalize_words, \
+    parse_query, load_inverted_list, load_inverted_skip_index
+from search.biword_index import load_biword_index
+from search.positional_index import load_positional_index
+from search.two_token_search import PhraseSearchDictionary, \
+    HybridPhraseSearchDictionary
+from search.wildcard_search import WildcardSearch
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_IN_FLIGHT = 64
+DEFAULT_TIMEOUT = 5.0
+MAX_REQUEST_SIZE = 16 * 1024
+STATISTICS_PATH = 'stats'
+# upper bounds of latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1,
+                   2, 5)
+
+_server_endpoints = None
+
+
+def parse_boolean_query(query: str):
+    return compile_query(query)
+
+
+def parse_phrase_query(query: str) -> list:
+    return normalize_words(query.split())
+
+
+def parse_wildcard_query(query: str) -> list:
+    return parse_query(query)
+
+
+@dataclass
+class Endpoint:
+    """
+    dictionary - search dictionary which evaluates queries,
+    parse - module level function which converts a query string to the
+    argument of the search method,
+    method - name of the method of the dictionary which returns
+    documents of the parsed query
+    """
+    dictionary: object
+    parse: object
+    method: str = 'search'
+
+
+def evaluate_query(endpoints: dict, name: str, query: str,
+                   limit: int = None) -> list:
+    endpoint = endpoints[name]
+    search = getattr(endpoint.dictionary, endpoint.method)
+    if limit is None:
+        return search(endpoint.parse(query))
+    return search(endpoint.parse(query), limit)
+
+
+def set_server_endpoints(endpoints: dict) -> None:
+    global _server_endpoints
+    _server_endpoints = endpoints
+
+
+def evaluate_worker_query(name: str, query: str, limit: int = None) -> list:
+    return evaluate_query(_server_endpoints, name, query, limit)
+
+
+class LatencyHistogram:
+    """Amounts of requests in latency buckets"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # the last counter is for requests slower than all buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def get_percentile(self, percentile: float):
+        """
+        :param percentile: percentile from 0 to 100
+        :return: upper bound of the bucket with the percentile, None if
+        the percentile is slower than all buckets
+        """
+        rank = self.count * percentile / 100
+        accumulated = 0
+        for bound, count in zip(self.buckets, self.counts):
+            accumulated += count
+            if accumulated >= rank:
+                return bound
+        return None
+
+    def get_statistics(self) -> dict:
+        labels = [f'<={bound}' for bound in self.buckets] + \
+            [f'>{self.buckets[-1]}']
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.get_percentile(50),
+            'p90': self.get_percentile(90),
+            'p99': self.get_percentile(99),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+def format_response(status: HTTPStatus, body: dict) -> bytes:
+    content = json.dumps(body).encode()
+    return (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+            f'Content-Type: application/json\r\n'
+            f'Content-Length: {len(content)}\r\n'
+            f'Connection: close\r\n\r\n').encode() + content
+
+
+class QueryServer:
+    def __init__(self, endpoints: dict, workers: int = DEFAULT_WORKERS,
+                 processes: bool = False,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 timeout: float = DEFAULT_TIMEOUT):
+        """
+        :param endpoints: dictionary <endpoint name, Endpoint>
+        :param workers: amount of workers which evaluate queries
+        :param processes: if True, queries are evaluated in worker
+        processes with their own copies of the dictionaries, otherwise
+        worker threads share the dictionaries of the server
+        :param max_in_flight: maximum amount of queries which are
+        evaluated or wait for a worker, other queries are rejected
+        :param timeout: maximum time in seconds to read a request and to
+        answer a query. A query which is out of time is answered with an
+        error, a query which waits for a worker is cancelled, but a query
+        which is being evaluated is finished by its worker.
+        """
+        self.endpoints = endpoints
+        self.processes = processes
+        if processes:
+            self.executor = ProcessPoolExecutor(
+                workers, initializer=set_server_endpoints,
+                initargs=(endpoints,))
+        else:
+            self.executor = ThreadPoolExecutor(workers)
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.in_flight = 0
+        # worker threads release places in flight
+        self.in_flight_lock = Lock()
+        self.rejected = 0
+        self.timeouts = 0
+        self.histograms = {name: LatencyHistogram() for name in endpoints}
+
+    async def search(self, name: str, query: str, limit: int = None
+                     ) -> tuple:
+        """
+        Evaluates a query in the worker pool
+        :param name: name of the endpoint
+        :param query: query string
+        :param limit: maximum amount of documents to return
+        :return: <HTTP status, response body>
+        """
+        with self.in_flight_lock:
+            if self.in_flight >= self.max_in_flight:
+                self.rejected += 1
+                return HTTPStatus.SERVICE_UNAVAILABLE, \
+                    {'error': 'Too many requests in flight'}
+            self.in_flight += 1
+        start = time.perf_counter()
+        if self.processes:
+            task = partial(evaluate_worker_query, name, query, limit)
+        else:
+            task = partial(evaluate_query, self.endpoints, name, query, limit)
+        try:
+            future = self.executor.submit(task)
+        except RuntimeError as e:
+            # the executor is shut down
+            self._release()
+            return HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)}
+        # the place is released when the worker finishes or the query
+        # is cancelled before a worker takes it
+        future.add_done_callback(self._release)
+        try:
+            documents = await asyncio.wait_for(asyncio.wrap_future(future),
+                                               self.timeout)
+            return HTTPStatus.OK, {'documents': documents}
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return HTTPStatus.GATEWAY_TIMEOUT, \
+                {'error': f'Query is not evaluated in {self.timeout} s'}
+        except IncorrectQuery as e:
+            return HTTPStatus.BAD_REQUEST, {'error': e.message}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+        finally:
+            self.histograms[name].record(time.perf_counter() - start)
+
+    def _release(self, future=None) -> None:
+        with self.in_flight_lock:
+            self.in_flight -= 1
+
+    def get_statistics(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'rejected': self.rejected,
+            'timeouts': self.timeouts,
+            'endpoints': {name: histogram.get_statistics()
+                          for name, histogram in self.histograms.items()}
+        }
+
+    async def handle_request(self, request: bytes) -> tuple:
+        """
+        :param request: request line and headers of an HTTP request
+        :return: <HTTP status, response body>
+        """
+        try:
+            method, target, _ = request.split(b'\r\n', 1)[0] \
+                .decode('latin-1').split(' ')
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {'error': 'Incorrect request'}
+        if method != 'GET':
+            return HTTPStatus.METHOD_NOT_ALLOWED, \
+                {'error': f'Method {method} is not supported'}
+        url = urlsplit(target)
+        name = url.path.strip('/')
+        if name == STATISTICS_PATH:
+            return HTTPStatus.OK, self.get_statistics()
+        if name not in self.endpoints:
+            return HTTPStatus.NOT_FOUND, \
+                {'error': f'Endpoint "{name}" is not found'}
+        parameters = parse_qs(url.query)
+        query = parameters.get('q', [''])[0]
+        if not query.strip():
+            return HTTPStatus.BAD_REQUEST, {'error': 'Query is empty'}
+        try:
+            limit = int(parameters['limit'][0]) \
+                if 'limit' in parameters else None
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {'error': 'Incorrect limit'}
+        if limit is not None and limit < 1:
+            return HTTPStatus.BAD_REQUEST, \
+                {'error': 'Limit must be a positive number'}
+        return await self.search(name, query, limit)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await asyncio.wait_for(
+                reader.readuntil(b'\r\n\r\n'), self.timeout)
+            status, body = await self.handle_request(request)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                asyncio.TimeoutError):
+            status, body = HTTPStatus.BAD_REQUEST, \
+                {'error': 'Incorrect request'}
+        writer.write(format_response(status, body))
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST,
+                    port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self.handle_connection, host, port,
+                                          limit=MAX_REQUEST_SIZE)
+
+    def serve(self, host: str = DEFAULT_HOST,
+              port: int = DEFAULT_PORT) -> None:
+        """Serves requests until the process is stopped"""
+        async def serve_forever():
+            server = await self.start(host, port)
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(serve_forever())
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+
+def create_endpoints(path_to_dict: str = PATH_TO_DICT,
+                     path_to_biword_dict: str = None,
+                     path_to_positions: str = None) -> dict:
+    """
+    :param path_to_dict: path to the inverted index
+    :param path_to_biword_dict: path to the inverted index of biwords,
+    phrase queries are not served if it is None
+    :param path_to_positions: path to the positions file. If provided,
+    phrases found with biwords are verified with positions of tokens
+    :return: boolean and wildcard search endpoints and the phrase search
+    endpoint if the biword index is provided
+    """
+    endpoints = {
+        'search': Endpoint(load_inverted_skip_index(path_to_dict),
+                           parse_boolean_query),
+        'wildcard': Endpoint(WildcardSearch(load_inverted_list(path_to_dict)),
+                             parse_wildcard_query, 'search_documents')
+    }
+    if path_to_biword_dict is not None and path_to_positions is not None:
+        endpoints['phrase'] = Endpoint(
+            HybridPhraseSearchDictionary(
+                load_biword_index(path_to_biword_dict),
+                load_positional_index(path_to_positions)),
+            parse_phrase_query)
+    elif path_to_biword_dict is not None:
+        endpoints['phrase'] = Endpoint(
+            PhraseSearchDictionary(load_biword_index(path_to_biword_dict)),
+            parse_phrase_query)
+    return endpoints
+
+
+def main() -> None:
+    QueryServer(create_endpoints()).serve()
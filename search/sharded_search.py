@@ -0,0 +1,74 @@
+"""
+Scatter-gather search over document-partitioned shards. Every shard is
+a complete inverted index of a part of documents (see
+dictionary.utils.write_document_shards), so a query is evaluated by
+all shards independently and the sorted results are merged. Each shard
+is loaded by its own worker process, so a query uses a core per shard
+and a process keeps only its part of the index in memory.
+"""
+import heapq
+from multiprocessing import Pool
+
+from common import get_shard_paths
+from common.constants import PATH_TO_SHARDS_DIR
+from search.query_parser import load_inverted_skip_index
+
+_shard_dictionary = None
+
+
+def load_shard(path_to_dict: str, file_dictionary: str) -> None:
+    global _shard_dictionary
+    _shard_dictionary = load_inverted_skip_index(path_to_dict,
+                                                 file_dictionary)
+
+
+def search_shard(notation, limit: int = None) -> list:
+    return _shard_dictionary.search(notation, limit)
+
+
+class ShardedSearch:
+    def __init__(self, shards: list):
+        """
+        :param shards: <path to the inverted index, path to the list of
+        documents> of every shard
+        """
+        self.workers = [Pool(1, initializer=load_shard, initargs=paths)
+                        for paths in shards]
+
+    def search(self, notation, limit: int = None) -> list:
+        """
+        :param notation: inverted notation of a query or a compiled
+        query tree, the same as for SearchDictionary.search
+        :param limit: if provided, only the first [limit] documents are
+        found by every shard and returned
+        :return: sorted list of documents of all shards which satisfy
+        the query
+        """
+        results = [worker.apply_async(search_shard, (notation, limit))
+                   for worker in self.workers]
+        merged = heapq.merge(*(result.get() for result in results))
+        if limit is not None:
+            return [doc_id for doc_id, _ in zip(merged, range(limit))]
+        return list(merged)
+
+    def close(self) -> None:
+        for worker in self.workers:
+            worker.terminate()
+            worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def load_sharded_search(shards_number: int,
+                        path: str = PATH_TO_SHARDS_DIR) -> ShardedSearch:
+    """
+    :param shards_number: amount of shards written by the builder
+    :param path: directory with shards
+    :return: coordinator of the shards
+    """
+    return ShardedSearch([get_shard_paths(shard, path)
+                          for shard in range(shards_number)])
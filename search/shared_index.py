@@ -0,0 +1,127 @@
+"""
+Read-only inverted index shared by query worker processes. The index
+is encoded in the disk-resident format (see search.disk_index) and
+published once into a block of shared memory:
+    <terms file contents><postings file contents>
+Worker processes attach to the block by its name and read postings
+from it in place, so every worker adds only its own caches to the
+memory used by the index.
+
+Before python 3.13 a process which attaches to a block registers it
+with its resource tracker, and the tracker unlinks the block when the
+process exits. Workers unregister the block after attaching, so only
+the publisher owns it.
+"""
+import sys
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from common.constants import PATH_TO_DICT, PATH_TO_LIST_OF_FILES
+from search.disk_index import DiskInvertedIndex, encode_disk_records, \
+    split_buffer
+from search.postings_cache import PostingsCache, DEFAULT_MAX_BYTES
+from search.query_parser import read_inverted_list
+from search.skip_list_search import SearchDictionary
+
+# SharedMemory accepts track=False since python 3.13
+TRACK_ARGUMENT = sys.version_info >= (3, 13)
+RESOURCE_TYPE = 'shared_memory'
+
+
+def attach_shared_memory(name: str) -> SharedMemory:
+    """
+    :param name: name of an existing shared memory block
+    :return: the block which is not unlinked when this process exits
+    """
+    if TRACK_ARGUMENT:
+        return SharedMemory(name=name, track=False)
+    shared_memory = SharedMemory(name=name)
+    resource_tracker.unregister(shared_memory._name, RESOURCE_TYPE)
+    return shared_memory
+
+
+class SharedInvertedIndex(DiskInvertedIndex):
+    """
+    Disk-resident index over a block of shared memory. The index is
+    pickled as the name of the block, so a search dictionary sent to
+    another process attaches to the same memory instead of copying it.
+    """
+
+    def __init__(self, name: str, cache_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param name: name of the shared memory block
+        :param cache_bytes: size limit of decoded postings kept by this
+        process, postings are decoded on every access if it is 0
+        """
+        self.shared_memory = attach_shared_memory(name)
+        self.cache_bytes = cache_bytes
+        postings_cache = PostingsCache(cache_bytes) if cache_bytes else None
+        self._open(*split_buffer(self.shared_memory.buf, name), name,
+                   postings_cache)
+
+    def __reduce__(self):
+        return SharedInvertedIndex, (self.shared_memory.name,
+                                     self.cache_bytes)
+
+    def close(self) -> None:
+        super().close()
+        self.shared_memory.close()
+
+
+class SharedIndexPublisher:
+    """
+    Owner of the shared memory block with the index. The block exists
+    until the publisher is closed, all processes which use the index
+    should be finished by then.
+    """
+
+    def __init__(self, path_to_dict: str = PATH_TO_DICT, name: str = None):
+        """
+        :param path_to_dict: path to the text inverted index
+        :param name: name of the shared memory block, a unique name is
+        generated if None
+        """
+        records = sorted(read_inverted_list(path_to_dict),
+                         key=lambda record: record[0].encode())
+        terms, postings = encode_disk_records(records)
+        size = len(terms) + len(postings)
+        self.shared_memory = SharedMemory(name=name, create=True, size=size)
+        self.shared_memory.buf[:len(terms)] = terms
+        self.shared_memory.buf[len(terms):size] = postings
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def close(self) -> None:
+        self.shared_memory.close()
+        if not TRACK_ARGUMENT:
+            # worker processes started by multiprocessing share the
+            # resource tracker of the publisher, so they have removed
+            # the block from it when they attached
+            resource_tracker.register(self.shared_memory._name,
+                                      RESOURCE_TYPE)
+        self.shared_memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def attach_shared_index(name: str,
+                        file_dictionary: str = PATH_TO_LIST_OF_FILES,
+                        cache_bytes: int = DEFAULT_MAX_BYTES
+                        ) -> SearchDictionary:
+    """
+    Opens the index published by SharedIndexPublisher
+    :param name: name of the shared memory block
+    :param file_dictionary: path to the list of documents
+    :param cache_bytes: size limit of decoded postings kept by this
+    process
+    :return: search dictionary over the shared index
+    """
+    index = SharedInvertedIndex(name, cache_bytes)
+    return SearchDictionary(index, file_dictionary,
+                            statistics=index.statistics)
@@ -1,116 +1,110 @@
-from dataclasses import dataclass
-from enum import Enum
-from typing import Optional
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import ChainMap, Counter
+from multiprocessing import Pool
+from typing import Optional, Tuple
 
 from common.constants import PATH_TO_LIST_OF_FILES, SPLIT
+from search.bitmap_postings import BitmapPostingsList, make_postings_list
+from search.cursors import build_cursor, take, encode_resume_cursor, \
+    decode_resume_cursor
+from search.query_cache import QueryResultCache
+from search.query_planner import QueryPlanner, TermStatistics
+from search.query_tree import OPERATION_CODES, ALL, QueryNode, \
+    build_query_tree, query_key
 
-OPERATION_CODES = Enum('OPERATION_CODES', 'AND OR NOT')
-ALL = '*'
+DEFAULT_PAGE_SIZE = 20
 
+# dictionary which evaluates a chunk of a batch in a worker process
+_batch_search_dictionary = None
 
-@dataclass
-class DocumentNode:
-    """
-    Data structure used to implement skip list. Contains a reference
-    to next node. If the next None is None - the next node is the
-    following in the list.
-    Structure: <document_id, reference_to_next_node>
-    """
-    id: int
-    # For memory optimisation None is used.
-    # if field is None the next index is considered to be the
-    # following item in the list
-    next_id_index: Optional[int]
-
-    def __eq__(self, other):
-        return self.id == other.id
-
-    def __lt__(self, other):
-        return self.id < other.id
-
-    def __le__(self, other):
-        return self.id <= other.id
-
-    def __gt__(self, other):
-        return self.id > other.id
-
-    def __ge__(self, other):
-        return self.id >= other.id
 
-    def __str__(self):
-        return f'<{self.id, self.next_id_index}>'
-
-
-class DocumentSkipList:
+class PostingsList:
     """
-    Proposed structure of skip list:
-                            4                          7
-               ___________________________   _____________________
-              |                           | |                     |
-              |                           V |                     V
-    token->(doc_id1->doc_id2->doc_id3->doc_id4->doc_id5->doc_id6->doc_id7->doc_id8)
+    Sorted list of document ids stored in a typed array('I') buffer, so
+    every posting takes 4 bytes instead of a Python object per node.
+    Explicit skip pointers are not stored: the list is traversed with
+    galloping (exponential) search, which probes positions
+    index + 1, index + 2, index + 4, ... and then finishes with a binary
+    search inside the last probed range:
+
+    token->(doc_id1 doc_id2 doc_id3 doc_id4 doc_id5 ... doc_id9 ...)
+              |_____|_______|_______________|___________|
+              +1    +2      +4              +8
     This data structure accelerates the search of common documents
     in the dictionary.
     """
+    typecode = 'I'
 
     def __init__(self, doc_ids=None):
-        self.doc_ids = list()
-        # every 4 of 5 items in list are skipped
-        self.skip_number = 5
-        self.last_not_skipped_node = 0
+        self.doc_ids = array(self.typecode)
         self.add_list(doc_ids)
 
-    def add_list(self, doc_ids: list) -> None:
+    @classmethod
+    def from_array(cls, doc_ids: array) -> 'PostingsList':
+        """
+        Wraps an already sorted array of document ids without copying it
+        """
+        postings = cls()
+        postings.doc_ids = doc_ids
+        return postings
+
+    def add_list(self, doc_ids) -> None:
         """
-        Append a list of items to the skip list
-        :param doc_ids: array of document ids
+        Append a list of items to the postings list
+        :param doc_ids: sorted array of document ids
         """
         if doc_ids is None:
             return
-        for doc_id in doc_ids:
-            self.add(int(doc_id))
+        self.doc_ids.extend(int(doc_id) for doc_id in doc_ids)
 
     def add(self, doc_id: int) -> None:
         """
-        Appends the document id to the list of documents. if a new node
-        is N-th skipped one, then the last node which has been marked
-        as not skipped is assigned with a reference to the new node.
-        The new node is marked as last not skipped.
-
+        Appends the document id to the list of documents
         :param doc_id: id of the document
         """
-        next_index = len(self.doc_ids)
-        if self.last_not_skipped_node + self.skip_number == next_index:
-            self.doc_ids[self.last_not_skipped_node].next_id_index = next_index
-            self.last_not_skipped_node = next_index
-        self.doc_ids.append(DocumentNode(doc_id, None))
+        self.doc_ids.append(doc_id)
 
-    def skip_until_ge(self, index: int, other_value) -> int:
+    def skip_until_ge(self, index: int, other_value: int) -> int:
         """
-        Skips nodes in skip list until the value of node is greater then
-        or equal to the provided value [other_value]
+        Skips items in the list until the value is greater then or equal
+        to the provided value [other_value]. Galloping search is used, so
+        the cost is logarithmic in the number of skipped items.
         :param index: current index of list
         :param other_value: value to compare with
-        :return: index of node in list which value is greater then of
+        :return: index of item in list which value is greater then of
         equal to the provided value [other_value]
         """
-        while index < len(self) and self[index] < other_value:
-            next_index = self[index].next_id_index \
-                if self[index].next_id_index else index + 1
-            while next_index < len(self) and self[next_index] < other_value:
-                next_index = self[next_index].next_id_index \
-                    if self[next_index].next_id_index else next_index + 1
-            index = next_index
-        return index
+        doc_ids = self.doc_ids
+        size = len(doc_ids)
+        if index >= size or doc_ids[index] >= other_value:
+            return index
+        low, step = index, 1
+        high = index + step
+        while high < size and doc_ids[high] < other_value:
+            low = high
+            step <<= 1
+            high = index + step
+        return bisect_left(doc_ids, other_value, low + 1, min(high, size))
 
     def to_str(self) -> str:
         """
         returns string representation of list with documents ids only
         """
-        return ','.join([str(node.id) for node in self.doc_ids])
+        return ','.join(str(doc_id) for doc_id in self.doc_ids)
 
     def to_list(self) -> list:
-        return [node.id for node in self.doc_ids]
+        return self.doc_ids.tolist()
+
+    @property
+    def nbytes(self) -> int:
+        """size of the buffer with document ids in bytes"""
+        return len(self.doc_ids) * self.doc_ids.itemsize
+
+    def __contains__(self, doc_id) -> bool:
+        index = bisect_left(self.doc_ids, doc_id)
+        return index < len(self.doc_ids) and self.doc_ids[index] == doc_id
 
     def __iter__(self):
         return iter(self.doc_ids)
@@ -121,127 +115,292 @@ class DocumentSkipList:
     def __getitem__(self, item):
         return self.doc_ids[item]
 
-    def __setitem__(self, key, value):
-        self.doc_ids[key] = value
+    def __str__(self):
+        return str(self.to_list())
+
+
+class ComplementList:
+    """
+    Lazy result of a NOT operation: documents of the [universe] which
+    are not present in the [excluded] list. Nothing is materialized
+    until the list is iterated or converted with to_list(), so NOT
+    under AND is evaluated as a single AND-NOT merge instead of
+    building the whole complement first.
+    """
+
+    def __init__(self, universe: PostingsList, excluded: PostingsList):
+        self.universe = universe
+        self.excluded = excluded
+        self._size = None
+
+    def to_list(self) -> list:
+        return SearchDictionary._difference(
+            self.universe, self.excluded).to_list()
+
+    def __contains__(self, doc_id) -> bool:
+        return doc_id in self.universe and doc_id not in self.excluded
+
+    def __iter__(self):
+        excluded = self.excluded
+        for doc_id in self.universe:
+            if doc_id not in excluded:
+                yield doc_id
+
+    def __len__(self):
+        # a stale index may exclude documents which are not in the
+        # universe, so only the excluded members of it are counted
+        if self._size is None:
+            self._size = len(self.universe) - len(
+                SearchDictionary._intersect(self.universe, self.excluded))
+        return self._size
 
     def __str__(self):
-        return str(self.doc_ids)
+        return f'NOT {self.excluded}'
+
+
+class SharedResults(dict):
+    """
+    Results of subqueries which are shared between queries of a batch.
+    Results of subqueries which are met only once are not kept.
+    """
+
+    def __init__(self, shared_keys: set):
+        super().__init__()
+        self.shared_keys = shared_keys
+
+    def __setitem__(self, key, value):
+        if key in self.shared_keys:
+            super().__setitem__(key, value)
+
+
+def set_batch_search_dictionary(search_dictionary) -> None:
+    global _batch_search_dictionary
+    _batch_search_dictionary = search_dictionary
+
+
+def search_batch_chunk(queries: list) -> list:
+    return _batch_search_dictionary.search_many(queries)
 
 
 class SearchDictionary:
     def __init__(self, inverted_index: dict,
-                 file_dictionary: str = PATH_TO_LIST_OF_FILES):
-        def get_all_file_ids() -> DocumentSkipList:
+                 file_dictionary: str = PATH_TO_LIST_OF_FILES,
+                 statistics: dict = None,
+                 result_cache: QueryResultCache = None,
+                 documents: list = None):
+        """
+        :param inverted_index: dictionary <token, postings list>. The
+        dictionary is not modified: the list of all documents and
+        updated tokens are kept in a separate layer above it
+        :param file_dictionary: path to the list of documents
+        :param statistics: dictionary <token, TermStatistics>. If None,
+        document frequencies are taken from the inverted index
+        :param result_cache: cache of query results. By default an LRU
+        cache with default limits is created
+        :param documents: sorted ids of all documents. If None, they are
+        read from [file_dictionary]
+        """
+        def get_all_file_ids() -> list:
             with open(file_dictionary) as file:
                 result = [int(line.split(SPLIT)[1].strip()) for line in file]
-            return DocumentSkipList(result)
-
-        self.inverted_index = inverted_index
-        assert ALL not in self.inverted_index
-        self.inverted_index[ALL] = get_all_file_ids()
+            return sorted(result)
+
+        assert ALL not in inverted_index
+        if documents is None:
+            documents = get_all_file_ids()
+        self.inverted_index = ChainMap(
+            {ALL: make_postings_list(documents, PostingsList)},
+            inverted_index)
+        if statistics is None:
+            statistics = {
+                token: TermStatistics(len(postings), len(postings))
+                for token, postings in self.inverted_index.items()}
+        self.planner = QueryPlanner(ChainMap(dict(), statistics),
+                                    len(self.inverted_index[ALL]))
+        self.result_cache = QueryResultCache() \
+            if result_cache is None else result_cache
 
     @staticmethod
-    def _intersect(t1: DocumentSkipList, t2: DocumentSkipList
-                   ) -> DocumentSkipList:
+    def _intersect(t1: PostingsList, t2: PostingsList) -> PostingsList:
         """
         AND operation
 
         Algorithm:
-        While the end of one of the document lists is not found:
-            1. while t1[i] == t2[j] -> append to results
-            2. while t1[i] > t2[j] -> i = succ(i)
-            3. while t1[i] < t2[j] -> j = succ(j)
+        For every document of the shorter list gallop in the longer list
+        to the first document which is greater then or equal to it and
+        append the document to results if both values are equal.
+        Complexity: O(m * log(n / m)), m <= n.
 
         :param t1: list of document ids where the first token is present
         :param t2: list of document ids where the second token is present
         :return: list of documents where both tokens are present
         """
-
-        def is_not_end() -> bool:
-            return i < len(t1) and j < len(t2)
-
-        result = DocumentSkipList()
-        i, j = 0, 0
-        while is_not_end():
-            while is_not_end() and t1[i] == t2[j]:
-                result.add(t1[i].id)
-                i += 1
+        if isinstance(t1, BitmapPostingsList):
+            return t1.intersect(t2)
+        if isinstance(t2, BitmapPostingsList):
+            return t2.intersect(t1)
+        if len(t1) > len(t2):
+            t1, t2 = t2, t1
+        result = array(PostingsList.typecode)
+        j = 0
+        for doc_id in t1.doc_ids:
+            j = t2.skip_until_ge(j, doc_id)
+            if j == len(t2):
+                break
+            if t2[j] == doc_id:
+                result.append(doc_id)
                 j += 1
-            if j < len(t2):
-                i = t1.skip_until_ge(i, t2[j])
-            if i < len(t1):
-                j = t2.skip_until_ge(j, t1[i])
-        return result
+        return PostingsList.from_array(result)
 
     @staticmethod
-    def _concatenate(t1: DocumentSkipList, t2: DocumentSkipList
-                     ) -> DocumentSkipList:
+    def _concatenate(t1: PostingsList, t2: PostingsList) -> PostingsList:
         """
         OR operation
 
         Algorithm:
         While the end of one of the document lists is not found:
-            1. while t1[i] == t2[j] -> append to results
-            2. while t1[i] > t2[j] -> i = succ(i)
-            3. append to result list values in t1 which are less then
-                current value in t2
-            4. while t1[i] < t2[j] -> j = succ(j)
-            5. append to result list values in t2 which are less then
-                a current value in t1
+            1. gallop in t1 to the first value >= t2[j], append the
+                skipped range of t1 to the result
+            2. gallop in t2 to the first value >= t1[i], append the
+                skipped range of t2 to the result
+            3. if t1[i] == t2[j] -> append to results once
+        Append the rest of both lists.
+        Ranges are copied with array slices, not item by item.
 
         :param t1: list of document ids where the first token is present
         :param t2: list of document ids where the second token is present
-        :return: list of documents where either one of tokens is present present
+        :return: list of documents where either one of tokens is present
         """
+        if isinstance(t1, BitmapPostingsList):
+            return t1.union(t2)
+        if isinstance(t2, BitmapPostingsList):
+            return t2.union(t1)
+        result = array(PostingsList.typecode)
+        i, j = 0, 0
+        while i < len(t1) and j < len(t2):
+            next_i = t1.skip_until_ge(i, t2[j])
+            result.extend(t1[i:next_i])
+            i = next_i
+            if i == len(t1):
+                break
+            next_j = t2.skip_until_ge(j, t1[i])
+            result.extend(t2[j:next_j])
+            j = next_j
+            if j < len(t2) and t1[i] == t2[j]:
+                result.append(t1[i])
+                i += 1
+                j += 1
+        result.extend(t1[i:])
+        result.extend(t2[j:])
+        return PostingsList.from_array(result)
 
-        def is_not_end() -> bool:
-            return i < len(t1) and j < len(t2)
+    @staticmethod
+    def _difference(t1: PostingsList, t2: PostingsList) -> PostingsList:
+        """
+        Documents of the first list which are not present in the second
+        one. Both lists are sorted, so they are merged in linear time
+        with galloping over runs that are kept or dropped.
 
-        result = DocumentSkipList()
+        :param t1: list of document ids to filter
+        :param t2: list of document ids to remove
+        :return: t1 without documents from t2
+        """
+        if isinstance(t1, BitmapPostingsList):
+            return t1.difference(t2)
+        if isinstance(t2, BitmapPostingsList):
+            return t2.subtract_from(t1)
+        result = array(PostingsList.typecode)
         i, j = 0, 0
-        while is_not_end():
-            while is_not_end() and t1[i] == t2[j]:
-                result.add(t1[i].id)
+        while i < len(t1) and j < len(t2):
+            next_i = t1.skip_until_ge(i, t2[j])
+            result.extend(t1[i:next_i])
+            i = next_i
+            if i == len(t1):
+                break
+            j = t2.skip_until_ge(j, t1[i])
+            if j < len(t2) and t1[i] == t2[j]:
                 i += 1
                 j += 1
-            if j < len(t2):
-                next_i = t1.skip_until_ge(i, t2[j])
-                result.add_list([node.id for node in t1[i:next_i]])
-                i = next_i
-            if i < len(t1):
-                next_j = t2.skip_until_ge(j, t1[i])
-                result.add_list([node.id for node in t2[j:next_j]])
-                j = next_j
-        return result
+        result.extend(t1[i:])
+        return PostingsList.from_array(result)
 
-    def exclude(self, document_list: DocumentSkipList, args
-                ) -> DocumentSkipList:
+    def exclude(self, document_list: PostingsList, args) -> ComplementList:
         """
-        Find documents where the provided token is not met
+        Find documents where the provided token is not met. The result
+        is a lazy complement of the list which is resolved by the
+        operation it is used in.
         :param document_list: list of documents where the token is met
         :param args: spike solution
         :return: list of documents where the token is not present
         """
-        documents_to_exclude = [node.id for node in document_list]
-        result = DocumentSkipList()
-        for doc_id in self.inverted_index[ALL]:
-            if doc_id.id not in documents_to_exclude:
-                result.add(doc_id.id)
-        return result
+        if isinstance(document_list, ComplementList):
+            return document_list.excluded
+        return ComplementList(self.inverted_index[ALL], document_list)
+
+    def _process_complement_operation(self, operator: OPERATION_CODES,
+                                      t1, t2):
+        """
+        Keeps NOT lazy with the help of De Morgan's laws:
+            a AND NOT b = a AND_NOT b
+            NOT a AND NOT b = NOT (a OR b)
+            a OR NOT b = NOT (b AND_NOT a)
+            NOT a OR NOT b = NOT (a AND b)
+        :param operator: AND or OR
+        :param t1: first list of documents, may be a complement
+        :param t2: second list of documents, may be a complement
+        :return: result of operation between the lists of documents
+        """
+        if isinstance(t1, ComplementList) and isinstance(t2, ComplementList):
+            inner_operator = OPERATION_CODES.OR \
+                if operator == OPERATION_CODES.AND else OPERATION_CODES.AND
+            return self.exclude(self.process_operation(
+                inner_operator, t1.excluded, t2.excluded), None)
+        if isinstance(t1, ComplementList):
+            t1, t2 = t2, t1
+        if operator == OPERATION_CODES.AND:
+            return self._difference(t1, t2.excluded)
+        return self.exclude(self._difference(t2.excluded, t1), None)
 
     # idea: improve search in inverted index, current complexity - O(n)
-    def get_ids(self, token) -> Optional[DocumentSkipList]:
+    def get_ids(self, token) -> Optional[PostingsList]:
         """
         :param token: token is represented as a ley in the inverted index
-        :return: list of documents where the provided token is met
+        :return: list of documents where the provided token is met, None
+        if the token is not in the index
         """
         try:
             return self.inverted_index[token]
         except KeyError:
             pass
 
-    def process_operation(self, operator: str, t1: DocumentSkipList,
-                          t2: DocumentSkipList = None) -> DocumentSkipList:
+    def update_token(self, token: str, postings,
+                     statistics: TermStatistics = None) -> None:
+        """
+        Replaces postings list of the token in the index. Cached query
+        results are invalidated.
+        :param token: token to update
+        :param postings: new list of documents where the token is met
+        :param statistics: statistics of the token. If None, document
+        frequency is taken from the postings list
+        """
+        self.inverted_index[token] = postings
+        if statistics is None:
+            statistics = TermStatistics(len(postings), len(postings))
+        self.planner.statistics[token] = statistics
+        self.result_cache.clear()
+
+    def remove_token(self, token: str) -> None:
+        """
+        Removes token from the index: the token is hidden with an empty
+        record in the layer of updates. Cached query results are
+        invalidated.
+        """
+        self.inverted_index[token] = None
+        self.planner.statistics[token] = TermStatistics(0, 0)
+        self.result_cache.clear()
+
+    def process_operation(self, operator: str, t1: PostingsList,
+                          t2: PostingsList = None) -> PostingsList:
         """
         :param operator: operation between two lists or an operation
          done on a single list
@@ -249,13 +408,18 @@ class SearchDictionary:
         :param t2: second list of documents. If None, extraction is done.
         :return: result of operation between the lists of documents
         """
+        if operator in (OPERATION_CODES.AND, OPERATION_CODES.OR) and (
+                isinstance(t1, ComplementList) or
+                isinstance(t2, ComplementList)):
+            return self._process_complement_operation(operator, t1, t2)
         try:
             options = {
                 OPERATION_CODES.AND:
                     self._intersect,
                 OPERATION_CODES.OR:
                     self._concatenate,
-                OPERATION_CODES.NOT: self.exclude
+                OPERATION_CODES.NOT: self.exclude,
+                OPERATION_CODES.AND_NOT: self._difference
             }
             return options[operator](t1, t2)
         except KeyError:
@@ -265,43 +429,251 @@ class SearchDictionary:
             print(operator, t1, t2)
             raise TypeError(e)
 
-    def _search_not_null_query(self, notation: list):
-        def pop_last_result() -> DocumentSkipList:
-            """
-            if an item on the top of the stack is a token, find a list of
-            :return: skip list of document ids
-            """
-            last_token = stack.pop()
-            if isinstance(last_token, str):
-                last_token = self.get_ids(last_token)
-            return last_token
-
-        def process_operation_and_put_result_to_stack():
-            if token == OPERATION_CODES.NOT:
-                last_result = pop_last_result()
-                stack.append(self.process_operation(token, last_result))
-            else:
-                t1, t2 = pop_last_result(), pop_last_result()
-                if t1 and t2:
-                    stack.append(self.process_operation(token, t1, t2))
-                elif t1:
-                    stack.append(t1)
-                elif t2:
-                    stack.append(t2)
-
-        stack = list()
-        for token in notation:
-            if isinstance(token, OPERATION_CODES):
-                process_operation_and_put_result_to_stack()
-            else:
-                stack.append(token)
-        if len(stack) > 1:
-            raise AttributeError(f'"{notation}" is incorrect or there is '
-                                 f'a bug in the algorythm implementation.\n'
-                                 f'Stack is not empty at the end: f{stack}')
-        return pop_last_result().to_list()
-
-    def search(self, notation: list) -> list:
-        if len(notation) == 0 or notation is None:
+    def _intersect_many(self, lists: list):
+        """
+        n-ary AND operation. Lists are intersected in increasing order
+        of their length, so the cost is bounded by the shortest list.
+        Negated lists are applied as AND-NOT after the intersection.
+        Intersection stops as soon as the result becomes empty.
+        :param lists: lists of documents, some of them may be complements
+        :return: list of documents which are present in all lists
+        """
+        positive = sorted((postings for postings in lists
+                           if not isinstance(postings, ComplementList)),
+                          key=len)
+        excluded = [postings.excluded for postings in lists
+                    if isinstance(postings, ComplementList)]
+        if not positive:
+            return self.exclude(self._concatenate_many(excluded), None)
+        result = positive[0]
+        for postings in positive[1:]:
+            if len(result) == 0:
+                return result
+            result = self._intersect(result, postings)
+        for postings in excluded:
+            if len(result) == 0:
+                return result
+            result = self._difference(result, postings)
+        return result
+
+    def _concatenate_many(self, lists: list):
+        """
+        n-ary OR operation. Sorted lists are merged at once through
+        a k-way heap, bitmaps are merged chunk by chunk. Negated lists
+        are processed with De Morgan's law:
+        a OR NOT b OR NOT c = NOT ((b AND c) AND_NOT a)
+        :param lists: lists of documents, some of them may be complements
+        :return: list of documents which are present in any list
+        """
+        positive = [postings for postings in lists
+                    if not isinstance(postings, ComplementList)]
+        excluded = [postings.excluded for postings in lists
+                    if isinstance(postings, ComplementList)]
+        if excluded:
+            return self.exclude(self._difference(
+                self._intersect_many(excluded),
+                self._concatenate_many(positive)), None)
+        result = array(PostingsList.typecode)
+        last_doc_id = None
+        for doc_id in heapq.merge(*(
+                postings for postings in positive
+                if not isinstance(postings, BitmapPostingsList))):
+            if doc_id != last_doc_id:
+                result.append(doc_id)
+                last_doc_id = doc_id
+        result = PostingsList.from_array(result)
+        for postings in positive:
+            if isinstance(postings, BitmapPostingsList):
+                result = postings.union(result)
+        return result
+
+    def evaluate(self, query, evaluated: dict = None):
+        """
+        Evaluates a query tree. Tokens are looked up before subqueries
+        of an AND node, so an empty operand stops the evaluation of the
+        node before the other operands are computed. Every distinct
+        subquery is evaluated once.
+        :param query: query tree or a single token
+        :param evaluated: results of already evaluated subqueries
+        :return: list of documents which satisfy the query
+        """
+        if evaluated is None:
+            evaluated = dict()
+        key = query_key(query)
+        result = evaluated.get(key)
+        if result is None:
+            result = self._evaluate_node(query, evaluated)
+            evaluated[key] = result
+        return result
+
+    def _evaluate_node(self, query, evaluated: dict):
+        if isinstance(query, str):
+            postings = self.get_ids(query)
+            # token which is missing in the dictionary is not met in
+            # any document
+            return PostingsList() if postings is None else postings
+        if query.operator == OPERATION_CODES.NOT:
+            return self.exclude(
+                self.evaluate(query.children[0], evaluated), None)
+        if query.operator == OPERATION_CODES.OR:
+            return self._concatenate_many(
+                [self.evaluate(child, evaluated) for child in query.children])
+        if query.operator == OPERATION_CODES.AND_NOT:
+            result = self.evaluate(query.children[0], evaluated)
+            for child in query.children[1:]:
+                if not isinstance(result, ComplementList) and \
+                        len(result) == 0:
+                    return result
+                result = self.process_operation(
+                    OPERATION_CODES.AND, result,
+                    self.exclude(self.evaluate(child, evaluated), None))
+            return result
+        if query.operator != OPERATION_CODES.AND:
+            raise NotImplementedError(
+                f'Operator "{query.operator}" is not supported')
+        operands = list()
+        for child in sorted(query.children,
+                            key=lambda x: isinstance(x, QueryNode)):
+            operand = self.evaluate(child, evaluated)
+            if not isinstance(operand, ComplementList) and \
+                    len(operand) == 0:
+                return operand
+            operands.append(operand)
+        return self._intersect_many(operands)
+
+    def plan(self, notation):
+        """
+        :param notation: inverted notation of a query or a compiled
+        query tree
+        :return: query tree rewritten by the query planner
+        """
+        if isinstance(notation, list):
+            notation = build_query_tree(notation)
+        return self.planner.plan(notation)
+
+    def explain(self, notation) -> str:
+        """
+        :param notation: inverted notation of a query or a compiled
+        query tree
+        :return: description of the query plan with estimated amounts
+        of documents for every subquery
+        """
+        return self.planner.explain(self.plan(notation))
+
+    def prepare(self, query) -> None:
+        """
+        Called before a query plan which is not in the result cache is
+        evaluated, dictionaries over remote postings fetch them here
+        :param query: query tree rewritten by the planner
+        """
+
+    def evaluate_cached(self, query):
+        """
+        Evaluates a query plan or takes its result from the cache. Plans
+        which differ only in the order of operands share a cache entry.
+        :param query: query tree rewritten by the planner
+        :return: list of documents which satisfy the query
+        """
+        key = query_key(query)
+        result = self.result_cache.get(key)
+        if result is None:
+            self.prepare(query)
+            result = self.evaluate(query)
+            if isinstance(result, ComplementList):
+                result = self._difference(result.universe, result.excluded)
+            self.result_cache.put(key, result)
+        return result
+
+    def _search_not_null_query(self, notation):
+        return self.evaluate_cached(self.plan(notation)).to_list()
+
+    def search_many(self, queries: list, processes: int = None) -> list:
+        """
+        Evaluates a batch of queries. Tokens and subqueries which are
+        met in several queries of the batch are fetched and evaluated
+        once for the whole batch.
+        :param queries: inverted notations of queries or compiled query
+        trees
+        :param processes: if provided, the batch is split into chunks
+        which are evaluated in a pool of processes
+        :return: list of documents for every query
+        """
+        if processes is not None and processes > 1 and len(queries) > 1:
+            chunk_size = -(-len(queries) // processes)
+            chunks = [queries[i:i + chunk_size]
+                      for i in range(0, len(queries), chunk_size)]
+            with Pool(processes, initializer=set_batch_search_dictionary,
+                      initargs=(self,)) as pool:
+                results = pool.map(search_batch_chunk, chunks)
+            return [result for chunk in results for result in chunk]
+
+        def count_subqueries(query):
+            subqueries[query_key(query)] += 1
+            if isinstance(query, QueryNode):
+                for child in query.children:
+                    count_subqueries(child)
+
+        plans = [ALL if query is None or isinstance(query, list) and
+                 len(query) == 0 else self.plan(query) for query in queries]
+        subqueries = Counter()
+        for plan in plans:
+            count_subqueries(plan)
+        shared_results = SharedResults(
+            {key for key, count in subqueries.items() if count > 1})
+        results = list()
+        for plan in plans:
+            key = query_key(plan)
+            result = self.result_cache.get(key)
+            if result is None:
+                self.prepare(plan)
+                result = self.evaluate(plan, shared_results)
+                if isinstance(result, ComplementList):
+                    result = self._difference(
+                        result.universe, result.excluded)
+                self.result_cache.put(key, result)
+            results.append(result.to_list())
+        return results
+
+    def search_page(self, notation, limit: int = DEFAULT_PAGE_SIZE,
+                    cursor: str = None) -> Tuple[list, Optional[str]]:
+        """
+        Finds a page of documents without evaluating the whole query:
+        documents are pulled lazily from the query operands until the
+        page is full.
+        :param notation: inverted notation of a query or a compiled
+        query tree
+        :param limit: maximum amount of documents on the page
+        :param cursor: cursor returned with the previous page
+        :return: <documents of the page, cursor of the next page>. The
+        cursor is None if there are no more documents
+        """
+        if limit < 1:
+            raise ValueError(f'Limit {limit} is incorrect, a page must '
+                             f'contain at least one document')
+        if notation is None or \
+                isinstance(notation, list) and len(notation) == 0:
+            query = ALL
+        else:
+            query = self.plan(notation)
+            self.prepare(query)
+        start = 0 if cursor is None else decode_resume_cursor(cursor)
+        documents = build_cursor(query, self.get_ids, self.inverted_index[ALL])
+        result = take(documents, limit, start)
+        if len(result) < limit or documents.next() is None:
+            return result, None
+        return result, encode_resume_cursor(result[-1])
+
+    def search(self, notation, limit: int = None) -> list:
+        """
+        :param notation: inverted notation of a query or a compiled
+        query tree
+        :param limit: if provided, only the first [limit] documents are
+        found, see search_page
+        :return: list of documents which satisfy the query
+        """
+        if limit is not None:
+            return self.search_page(notation, limit)[0]
+        if notation is None or \
+                isinstance(notation, list) and len(notation) == 0:
             return self.inverted_index[ALL].to_list()
         return self._search_not_null_query(notation)
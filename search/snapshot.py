@@ -0,0 +1,223 @@
+"""
+Binary snapshot of a built search dictionary. A query node saves its
+state once and restarts from the snapshot instead of parsing text
+files and building the structures again. The snapshot is a single
+memory mapped file:
+
+    header: <magic, version, amount of sections>
+    sections table: records <name, offset, size>
+    sections:
+        INDX - terms and postings in the disk-resident index format
+               (see search.disk_index), read in place
+        DOCS - document table: <amount of documents>, sorted document
+               ids, offsets of names in the names strip, names strip
+        TRMS, TRMR - straight and reversed term indexes of a wildcard
+               search dictionary (see SortedTermIndex.to_bytes)
+        MODE - name of the wildcard search mode. The permuterm and the
+               k-gram indexes are not stored, they are rebuilt from the
+               straight term index on load. A wildcard snapshot without
+               this section is loaded in the default mode.
+"""
+import os
+import struct
+from array import array
+from bisect import bisect_left
+
+from common.constants import PATH_TO_LIST_OF_FILES, SPLIT
+from search.disk_index import DiskInvertedIndex, encode_disk_records, \
+    map_file
+from search.postings_cache import PostingsCache, DEFAULT_MAX_BYTES
+from search.skip_list_search import SearchDictionary, ALL
+from search.term_index import SortedTermIndex
+from search.wildcard_search import WildcardSearch
+
+MAGIC = b'SESN'
+VERSION = 2
+HEADER = struct.Struct('<4sII')
+SECTION = struct.Struct('<4sQQ')
+COUNT = struct.Struct('<I')
+INDEX_SECTION = b'INDX'
+DOCUMENTS_SECTION = b'DOCS'
+STRAIGHT_TERMS_SECTION = b'TRMS'
+REVERSED_TERMS_SECTION = b'TRMR'
+WILDCARD_MODE_SECTION = b'MODE'
+
+
+class IncorrectSnapshotFile(ValueError):
+    def __init__(self, path):
+        super().__init__(f'File "{path}" is not a search snapshot of '
+                         f'version {VERSION}')
+
+
+def read_document_names(file_dictionary: str = PATH_TO_LIST_OF_FILES
+                        ) -> dict:
+    """:return: dictionary <document id, file name>"""
+    with open(file_dictionary) as file:
+        return {int(doc_id): name for name, doc_id in
+                (line.rstrip('\n').split(SPLIT) for line in file)}
+
+
+def encode_documents(names: dict) -> bytes:
+    """
+    :param names: dictionary <document id, file name>
+    :return: encoded document table
+    """
+    doc_ids = sorted(names)
+    offsets = array('I', [0])
+    strip = bytearray()
+    for doc_id in doc_ids:
+        strip += names[doc_id].encode()
+        offsets.append(len(strip))
+    return COUNT.pack(len(doc_ids)) + array('I', doc_ids).tobytes() + \
+        offsets.tobytes() + strip
+
+
+class DocumentTable:
+    """Document ids and file names read from the snapshot"""
+
+    def __init__(self, data):
+        size, = COUNT.unpack_from(data, 0)
+        ids_end = COUNT.size + size * 4
+        offsets_end = ids_end + (size + 1) * 4
+        self.doc_ids = array('I')
+        self.doc_ids.frombytes(data[COUNT.size:ids_end])
+        self.offsets = array('I')
+        self.offsets.frombytes(data[ids_end:offsets_end])
+        self.names = bytes(data[offsets_end:])
+
+    def get_name(self, doc_id: int) -> str:
+        i = bisect_left(self.doc_ids, doc_id)
+        if i == len(self.doc_ids) or self.doc_ids[i] != doc_id:
+            raise KeyError(doc_id)
+        return self.names[self.offsets[i]:self.offsets[i + 1]].decode()
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+
+def save_snapshot(search_dictionary: SearchDictionary, path: str,
+                  file_dictionary: str = PATH_TO_LIST_OF_FILES) -> None:
+    """
+    Saves the search dictionary with all its updates. The file is
+    replaced atomically, so a running node can be restarted from the
+    previous snapshot while a new one is written.
+    :param search_dictionary: dictionary to save
+    :param path: path to the snapshot file
+    :param file_dictionary: path to the list of documents
+    """
+    index = search_dictionary.inverted_index
+    statistics = search_dictionary.planner.statistics
+    records = list()
+    for token in sorted((token for token in index if token != ALL),
+                        key=str.encode):
+        postings = index[token]
+        if postings is None:
+            continue
+        token_statistics = statistics.get(token)
+        frequency = len(postings) if token_statistics is None \
+            else token_statistics.collection_frequency
+        records.append((token, frequency, postings.to_list()))
+    names = read_document_names(file_dictionary)
+    sections = [(INDEX_SECTION, b''.join(encode_disk_records(records))),
+                (DOCUMENTS_SECTION, encode_documents({
+                    doc_id: names.get(doc_id, '')
+                    for doc_id in index[ALL]}))]
+    if isinstance(search_dictionary, WildcardSearch):
+        sections += [
+            (STRAIGHT_TERMS_SECTION, search_dictionary.straight_terms
+             .to_bytes()),
+            (REVERSED_TERMS_SECTION, search_dictionary.reversed_terms
+             .to_bytes()),
+            (WILDCARD_MODE_SECTION, search_dictionary.mode.name.encode())]
+    offset = HEADER.size + len(sections) * SECTION.size
+    table = bytearray()
+    for name, data in sections:
+        table += SECTION.pack(name, offset, len(data))
+        offset += len(data)
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+        file.write(table)
+        for _, data in sections:
+            file.write(data)
+    os.replace(temporary_path, path)
+
+
+class SearchSnapshot:
+    """Memory mapped snapshot file split into sections"""
+
+    def __init__(self, path: str):
+        self.data = map_file(path)
+        if len(self.data) < HEADER.size:
+            raise IncorrectSnapshotFile(path)
+        magic, version, size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION or \
+                len(self.data) < HEADER.size + size * SECTION.size:
+            raise IncorrectSnapshotFile(path)
+        view = memoryview(self.data)
+        self.sections = dict()
+        for i in range(size):
+            name, offset, length = SECTION.unpack_from(
+                self.data, HEADER.size + i * SECTION.size)
+            self.sections[name] = view[offset:offset + length]
+        if INDEX_SECTION not in self.sections or \
+                DOCUMENTS_SECTION not in self.sections:
+            raise IncorrectSnapshotFile(path)
+        self.path = path
+
+    def get_index(self, cache_bytes: int = DEFAULT_MAX_BYTES
+                  ) -> DiskInvertedIndex:
+        postings_cache = PostingsCache(cache_bytes) if cache_bytes else None
+        return DiskInvertedIndex.from_buffer(self.sections[INDEX_SECTION],
+                                             postings_cache, self.path)
+
+    def get_documents(self) -> DocumentTable:
+        return DocumentTable(self.sections[DOCUMENTS_SECTION])
+
+    def get_term_indexes(self):
+        """:return: <straight term index, reversed term index> or None"""
+        if STRAIGHT_TERMS_SECTION not in self.sections:
+            return None
+        return (SortedTermIndex.from_bytes(
+                    self.sections[STRAIGHT_TERMS_SECTION]),
+                SortedTermIndex.from_bytes(
+                    self.sections[REVERSED_TERMS_SECTION]))
+
+    def get_wildcard_mode(self) -> WildcardSearch.MODE:
+        """:return: mode of the saved wildcard search dictionary"""
+        if WILDCARD_MODE_SECTION not in self.sections:
+            return WildcardSearch.MODE.BTREE
+        name = bytes(self.sections[WILDCARD_MODE_SECTION]).decode()
+        if name not in WildcardSearch.MODE.__members__:
+            raise IncorrectSnapshotFile(self.path)
+        return WildcardSearch.MODE[name]
+
+
+def load_snapshot(path: str, cache_bytes: int = DEFAULT_MAX_BYTES
+                  ) -> SearchDictionary:
+    """
+    Opens a snapshot saved by save_snapshot. Postings are decoded from
+    the mapped file on demand, term indexes are restored without
+    sorting. A wildcard search dictionary gets its saved mode back, the
+    index of the mode is rebuilt from the straight term index.
+    :param path: path to the snapshot file
+    :param cache_bytes: size limit of decoded postings kept in memory
+    :return: search dictionary of the same type as the saved one, file
+    names of documents are available in its [document_table]
+    """
+    snapshot = SearchSnapshot(path)
+    index = snapshot.get_index(cache_bytes)
+    documents = snapshot.get_documents()
+    term_indexes = snapshot.get_term_indexes()
+    if term_indexes is None:
+        search_dictionary = SearchDictionary(
+            index, statistics=index.statistics,
+            documents=documents.doc_ids.tolist())
+    else:
+        search_dictionary = WildcardSearch(
+            index, statistics=index.statistics,
+            documents=documents.doc_ids.tolist(),
+            term_indexes=term_indexes,
+            mode=snapshot.get_wildcard_mode())
+    search_dictionary.document_table = documents
+    return search_dictionary
@@ -0,0 +1,86 @@
+"""
+Prefix index over a sorted vocabulary. Terms are kept in a single sorted
+list, terms which start with a prefix occupy a contiguous range of it,
+so the range is found with two binary searches and returned as a slice.
+"""
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Optional, Tuple
+
+COUNT = struct.Struct('<I')
+MAX_CHARACTER = chr(sys.maxunicode)
+
+
+def get_prefix_end(prefix: str) -> Optional[str]:
+    """
+    :return: the smallest string which is greater than all strings with
+    the prefix, None if there is no such string
+    """
+    prefix = prefix.rstrip(MAX_CHARACTER)
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class SortedTermIndex:
+    def __init__(self, terms=()):
+        """
+        :param terms: terms of the index in any order
+        """
+        self.terms = sorted(set(terms))
+
+    def put(self, term: str) -> None:
+        i = bisect_left(self.terms, term)
+        if i == len(self.terms) or self.terms[i] != term:
+            self.terms.insert(i, term)
+
+    def get_range(self, prefix: str) -> Tuple[int, int]:
+        """:return: <start, end> of terms with the prefix in the list"""
+        start = bisect_left(self.terms, prefix)
+        prefix_end = get_prefix_end(prefix)
+        end = len(self.terms) if prefix_end is None \
+            else bisect_left(self.terms, prefix_end, start)
+        return start, end
+
+    def get(self, prefix: str) -> list:
+        """:return: sorted list of terms which start with the prefix"""
+        start, end = self.get_range(prefix)
+        return self.terms[start:end]
+
+    def to_bytes(self) -> bytes:
+        """
+        Serializes the index: amount of terms, offsets of terms in the
+        strip followed by the end of the strip, strip of utf-8 encoded
+        terms
+        """
+        offsets = array('I', [0])
+        strip = bytearray()
+        for term in self.terms:
+            strip += term.encode()
+            offsets.append(len(strip))
+        return COUNT.pack(len(self.terms)) + offsets.tobytes() + strip
+
+    @classmethod
+    def from_bytes(cls, data) -> 'SortedTermIndex':
+        """Restores an index serialized by to_bytes without sorting"""
+        size, = COUNT.unpack_from(data, 0)
+        offsets_end = COUNT.size + (size + 1) * 4
+        offsets = array('I')
+        offsets.frombytes(data[COUNT.size:offsets_end])
+        strip = bytes(data[offsets_end:])
+        index = cls()
+        index.terms = [strip[offsets[i]:offsets[i + 1]].decode()
+                       for i in range(size)]
+        return index
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __iter__(self):
+        return iter(self.terms)
+
+    def __contains__(self, term):
+        i = bisect_left(self.terms, term)
+        return i < len(self.terms) and self.terms[i] == term
@@ -0,0 +1,292 @@
+"""
+Search over a dictionary partitioned by term ranges. Every shard owns
+complete postings of the tokens of its range, the coordinator keeps
+only term statistics and fetches postings of query tokens from the
+owning shards, so a short query touches one or two shards.
+
+Shards and the coordinator exchange messages through a transport:
+    request({shard: message}) -> {shard: response}
+LocalTransport calls shards in the process of the coordinator,
+ConnectionTransport sends messages to shard processes through pipes
+or sockets (multiprocessing connections).
+"""
+from array import array
+from bisect import bisect_right
+from collections.abc import Mapping
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Client, Listener
+from threading import local
+
+from common.constants import PATH_TO_DICT, PATH_TO_LIST_OF_FILES
+from dictionary.variable_byte import encode_gaps, decode_gaps
+from search.bitmap_postings import make_postings_list
+from search.postings_cache import PostingsCache, DEFAULT_MAX_BYTES
+from search.query_parser import read_inverted_list
+from search.query_planner import TermStatistics
+from search.query_tree import get_tokens
+from search.skip_list_search import SearchDictionary, PostingsList
+
+# messages of the coordinator: <method, argument>
+POSTINGS = 'postings'
+STATISTICS = 'statistics'
+# size of a document id in a sorted postings array
+POSTING_BYTES = array(PostingsList.typecode).itemsize
+
+
+def partition_terms(path_to_dict: str, shards_number: int) -> list:
+    """
+    Splits sorted tokens into ranges with close amounts of postings
+    :param path_to_dict: path to the text inverted index
+    :param shards_number: amount of shards
+    :return: the first token of every shard except the first one, a
+    token belongs to the shard bisect_right(boundaries, token)
+    """
+    frequencies = sorted((token, len(doc_ids)) for token, _, doc_ids
+                         in read_inverted_list(path_to_dict))
+    total = sum(frequency for _, frequency in frequencies)
+    boundaries = list()
+    postings_number = 0
+    for token, frequency in frequencies:
+        if postings_number >= total * (len(boundaries) + 1) / shards_number \
+                and len(boundaries) < shards_number - 1:
+            boundaries.append(token)
+        postings_number += frequency
+    return boundaries
+
+
+class TermShard:
+    """Postings of the tokens of a single term range"""
+
+    def __init__(self, path_to_dict: str, boundaries: list, shard: int):
+        """
+        :param path_to_dict: path to the text inverted index
+        :param boundaries: boundaries of term ranges, see partition_terms
+        :param shard: number of the shard
+        """
+        self.postings = dict()
+        self.statistics = dict()
+        for token, frequency, doc_ids in read_inverted_list(path_to_dict):
+            if bisect_right(boundaries, token) == shard:
+                self.postings[token] = encode_gaps(doc_ids)
+                self.statistics[token] = TermStatistics(len(doc_ids),
+                                                        frequency)
+
+    def handle(self, message):
+        """
+        :param message: <method, argument> sent by the coordinator
+        :return: response to the coordinator
+        """
+        method, argument = message
+        if method == POSTINGS:
+            return {token: self.postings[token] for token in argument
+                    if token in self.postings}
+        if method == STATISTICS:
+            return self.statistics
+        raise NotImplementedError(f'Method "{method}" is not supported')
+
+
+class LocalTransport:
+    """Shards live in the process of the coordinator"""
+
+    def __init__(self, shards: list):
+        self.shards = shards
+
+    def request(self, messages: dict) -> dict:
+        return {shard: self.shards[shard].handle(message)
+                for shard, message in messages.items()}
+
+    def close(self) -> None:
+        pass
+
+
+class ConnectionTransport:
+    """
+    Shards are served by other processes. Messages are sent to all
+    requested shards before responses are read, so shards process a
+    request in parallel.
+    """
+
+    def __init__(self, connections: list, processes: list = None):
+        """
+        :param connections: multiprocessing connections to the shards
+        :param processes: shard processes started by the coordinator,
+        they are joined on close
+        """
+        self.connections = connections
+        self.processes = list() if processes is None else processes
+
+    def request(self, messages: dict) -> dict:
+        for shard, message in messages.items():
+            self.connections[shard].send(message)
+        return {shard: self.connections[shard].recv() for shard in messages}
+
+    def close(self) -> None:
+        for connection in self.connections:
+            connection.send(None)
+            connection.close()
+        for process in self.processes:
+            process.join()
+
+
+def serve_connection(connection, term_shard: TermShard) -> None:
+    """Answers messages of the coordinator until None is received"""
+    message = connection.recv()
+    while message is not None:
+        connection.send(term_shard.handle(message))
+        message = connection.recv()
+
+
+def run_shard(connection, path_to_dict: str, boundaries: list,
+              shard: int) -> None:
+    serve_connection(connection, TermShard(path_to_dict, boundaries, shard))
+
+
+def start_shard_processes(boundaries: list,
+                          path_to_dict: str = PATH_TO_DICT
+                          ) -> ConnectionTransport:
+    """
+    Starts a process for every shard connected with a pipe
+    :param boundaries: boundaries of term ranges, see partition_terms
+    :param path_to_dict: path to the text inverted index
+    """
+    connections = list()
+    processes = list()
+    for shard in range(len(boundaries) + 1):
+        connection, shard_connection = Pipe()
+        process = Process(target=run_shard, daemon=True, args=(
+            shard_connection, path_to_dict, boundaries, shard))
+        process.start()
+        connections.append(connection)
+        processes.append(process)
+    return ConnectionTransport(connections, processes)
+
+
+def listen_shard(address: tuple, boundaries: list, shard: int,
+                 path_to_dict: str = PATH_TO_DICT,
+                 authkey: bytes = None) -> None:
+    """
+    Serves a shard on a socket, coordinators are served one by one
+    :param address: <host, port> to listen to
+    :param boundaries: boundaries of term ranges, see partition_terms
+    :param shard: number of the shard
+    :param path_to_dict: path to the text inverted index
+    :param authkey: key which coordinators must know to connect
+    """
+    term_shard = TermShard(path_to_dict, boundaries, shard)
+    with Listener(address, authkey=authkey) as listener:
+        while True:
+            with listener.accept() as connection:
+                serve_connection(connection, term_shard)
+
+
+def connect_shards(addresses: list, authkey: bytes = None
+                   ) -> ConnectionTransport:
+    """
+    :param addresses: <host, port> of every shard in the order of shards
+    :param authkey: key of the shards
+    """
+    return ConnectionTransport([Client(address, authkey=authkey)
+                                for address in addresses])
+
+
+class RemoteInvertedIndex(Mapping):
+    """
+    Read-only dictionary <token, postings list> over term-partitioned
+    shards. Term statistics of all shards are read once, fetched
+    postings are kept in a postings cache. Postings prefetched for a
+    query are also kept by the thread which evaluates it until its
+    next prefetch, so postings which the cache does not admit are not
+    fetched twice.
+    """
+
+    def __init__(self, transport, boundaries: list,
+                 cache_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        :param transport: transport to the shards
+        :param boundaries: boundaries of term ranges, see partition_terms
+        :param cache_bytes: size limit of fetched postings kept in memory
+        """
+        self.transport = transport
+        self.boundaries = boundaries
+        self.postings_cache = PostingsCache(cache_bytes)
+        self._prefetched = local()
+        responses = transport.request({
+            shard: (STATISTICS, None) for shard in range(len(boundaries) + 1)})
+        self.statistics = dict()
+        for statistics in responses.values():
+            self.statistics.update(statistics)
+
+    def get_shard(self, token: str) -> int:
+        return bisect_right(self.boundaries, token)
+
+    def fetch(self, tokens) -> dict:
+        """
+        Requests postings of the tokens, one message for every shard
+        :param tokens: tokens of the index
+        :return: dictionary <token, postings list>
+        """
+        messages = dict()
+        for token in tokens:
+            messages.setdefault(self.get_shard(token), list()).append(token)
+        responses = self.transport.request(
+            {shard: (POSTINGS, shard_tokens)
+             for shard, shard_tokens in messages.items()})
+        return {token: make_postings_list(decode_gaps(data), PostingsList)
+                for response in responses.values()
+                for token, data in response.items()}
+
+    def estimate_bytes(self, token: str) -> int:
+        """:return: size of postings of the token as a sorted array"""
+        return self.statistics[token].document_frequency * POSTING_BYTES
+
+    def prefetch(self, tokens) -> None:
+        """
+        Fetches postings of query tokens which are not cached with a
+        single round trip to every owning shard. Fetched postings pass
+        the admission of the cache. Postings which are larger than the
+        cache are fetched when they are used.
+        """
+        tokens = {token for token in tokens if token in self.statistics
+                  and self.estimate_bytes(token) <=
+                  self.postings_cache.max_bytes}
+        self._prefetched.postings = self.postings_cache.get_many(
+            tokens, self.fetch)
+
+    def __getitem__(self, token: str):
+        if token not in self.statistics:
+            raise KeyError(token)
+        postings = getattr(self._prefetched, 'postings', dict()).get(token)
+        if postings is not None:
+            return postings
+        return self.postings_cache.get(
+            token, lambda: self.fetch([token])[token])
+
+    def __contains__(self, token) -> bool:
+        return token in self.statistics
+
+    def __iter__(self):
+        return iter(self.statistics)
+
+    def __len__(self):
+        return len(self.statistics)
+
+
+class TermPartitionedSearch(SearchDictionary):
+    """
+    Search dictionary over term-partitioned shards. Postings of the
+    tokens of a query plan are fetched before the plan is evaluated,
+    tokens which the planner has removed and plans which are answered
+    from the result cache are not requested.
+    """
+
+    def __init__(self, index: RemoteInvertedIndex,
+                 file_dictionary: str = PATH_TO_LIST_OF_FILES):
+        super().__init__(index, file_dictionary,
+                         statistics=index.statistics)
+        self.remote_index = index
+
+    def prepare(self, query) -> None:
+        self.remote_index.prefetch(get_tokens(query))
+
+    def close(self) -> None:
+        self.remote_index.transport.close()
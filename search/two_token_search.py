@@ -1,76 +1,161 @@
-from common import read_file_dictionary
-from search.query_parser import OPERATIONS
+from common.constants import PATH_TO_LIST_OF_FILES
+from search.biword_index import BiwordIndex
+from search.positional_index import PositionalIndex
+from search.query_tree import ALL
 from search.skip_list_search import SearchDictionary
 
 
+class PHRASE_PLANS:
+    BIWORD = 'biword'
+    POSITIONAL = 'positional'
+
+
+def plan_phrase_query(biword_lengths: list, term_lengths: list) -> str:
+    """
+    Chooses where candidates of a phrase query are taken from before
+    they are verified with positions. Verification of a candidate merges
+    positions of every term, building candidates from biwords costs the
+    intersection of their postings lists:
+        biword cost = sum of biword lengths + terms * min biword length
+        positional cost = terms * min term length
+    :param biword_lengths: lengths of postings lists of query biwords
+    :param term_lengths: amounts of documents of query terms
+    :return: PHRASE_PLANS.BIWORD to verify the intersection of biword
+    postings, PHRASE_PLANS.POSITIONAL to verify documents of the rarest
+    term
+    """
+    if not biword_lengths:
+        return PHRASE_PLANS.POSITIONAL
+    terms = len(term_lengths)
+    biword_cost = sum(biword_lengths) + terms * min(biword_lengths)
+    positional_cost = terms * min(term_lengths)
+    return PHRASE_PLANS.BIWORD if biword_cost < positional_cost \
+        else PHRASE_PLANS.POSITIONAL
+
+
 class PhraseSearchDictionary(SearchDictionary):
-    def search(self, query: list) -> list:
+    def __init__(self, biword_index: BiwordIndex,
+                 file_dictionary: str = PATH_TO_LIST_OF_FILES, **kwargs):
+        """
+        :param biword_index: postings lists of biwords
+        :param file_dictionary: path to the list of documents
         """
-        Search in the two word dictionary
+        super().__init__(dict(), file_dictionary, statistics=dict(),
+                         **kwargs)
+        self.biword_index = biword_index
+
+    def search(self, query: list, limit: int = None) -> list:
+        """
+        Search in the two word dictionary. Query tokens are translated
+        to term ids once, then postings lists of neighbour pairs are
+        intersected. Removed words of the query are skipped, as they are
+        skipped by the biword index builder.
         :param query: phrases/words to search
+        :param limit: if provided, only the first [limit] documents are
+        returned
         :return: list of documents
         """
-        last_token = None
+        term_ids = self.biword_index.get_term_ids(
+            [token for token in query if token != ALL])
+        if len(term_ids) < 2 or None in term_ids:
+            return list()
         result = None
-        for token in query:
-            if last_token is not None:
-                current_result = self.get_ids(f'{last_token} {token}')
-                result = current_result if result is None \
-                    else super()._intersect(result, current_result)
-            last_token = token
+        for first_id, second_id in zip(term_ids, term_ids[1:]):
+            postings = self.biword_index.get_postings(first_id, second_id)
+            if postings is None:
+                return list()
+            result = postings if result is None \
+                else self._intersect(result, postings)
+        return result.to_list()[:limit]
+
+
+class HybridPhraseSearchDictionary(PhraseSearchDictionary):
+    """
+    Phrase search which filters documents cheaply and verifies only the
+    survivors with the positional index, so long phrases are matched
+    exactly. Candidates are the intersection of biword postings or the
+    documents of the rarest term, whichever is estimated to be cheaper.
+    """
+
+    def __init__(self, biword_index: BiwordIndex,
+                 positional_index: PositionalIndex,
+                 file_dictionary: str = PATH_TO_LIST_OF_FILES, **kwargs):
+        """
+        :param biword_index: postings lists of biwords
+        :param positional_index: positions of tokens in documents
+        :param file_dictionary: path to the list of documents
+        """
+        super().__init__(biword_index, file_dictionary, **kwargs)
+        self.positional_index = positional_index
+
+    def get_candidates(self, tokens: list) -> list:
+        """
+        :param tokens: terms of the phrase without removed words
+        :return: sorted list of documents which may contain the phrase
+        """
+        if not tokens:
+            # a phrase of removed words only
+            return list()
+        documents = [self.positional_index.postings.get(token, dict())
+                     for token in tokens]
+        term_ids = self.biword_index.get_term_ids(tokens)
+        biwords = [self.biword_index.get_postings(first_id, second_id)
+                   if first_id is not None and second_id is not None
+                   else None
+                   for first_id, second_id in zip(term_ids, term_ids[1:])]
+        if not all(documents) or None in biwords:
+            return list()
+        plan = plan_phrase_query([len(postings) for postings in biwords],
+                                 [len(postings) for postings in documents])
+        if plan == PHRASE_PLANS.POSITIONAL:
+            return sorted(min(documents, key=len))
+        biwords.sort(key=len)
+        result = biwords[0]
+        for postings in biwords[1:]:
+            result = self._intersect(result, postings)
         return result.to_list()
 
+    def search(self, query: list, limit: int = None) -> list:
+        """
+        :param query: tokens of the phrase, removed words are
+        represented with the ALL token
+        :param limit: if provided, only the first [limit] documents are
+        returned
+        :return: sorted list of documents which contain the phrase
+        """
+        candidates = self.get_candidates(
+            [token for token in query if token != ALL])
+        if not candidates:
+            return list()
+        return self.positional_index.search(query, candidates)[:limit]
+
 
 class SearchCoordinatedDictionary(SearchDictionary):
-    @staticmethod
-    def _get_coordinate_index(query: list, result_documents: list) -> dict:
+    def __init__(self, inverted_index: dict,
+                 positional_index: PositionalIndex,
+                 file_dictionary: str = PATH_TO_LIST_OF_FILES):
         """
-        builds query coordinated index
-        :param query: search query, already processed to notation or raw text
-        :return: dictionary of token intersections with the next structure:
-        {
-            token1: {<doc_id>: [pos1, pos2, ..posn], <doc2>: [..]}
-        }
+        :param inverted_index: dictionary <token, postings list>
+        :param positional_index: positions of tokens in documents
+        :param file_dictionary: path to the list of documents
         """
-        tokens = {token: {} for token in query if query not in OPERATIONS.ALL}
-        coordinated_index = {token: [] for token in tokens}
-        for document in result_documents:
-            dictionary = read_file_dictionary(str(document))
-            for token in tokens:
-                coordinated_index[token][document] = dictionary[token]
-        return coordinated_index
+        super().__init__(inverted_index, file_dictionary)
+        self.positional_index = positional_index
 
     def search(self, query: list, max_distance: int = 2) -> list:
         """
-        :param query: search query
-        :param max_distance: maximum amount of characters between two words
-        :return: list of documents with start phrase positions sorted from
-        the most appropriate (the longest match) to the least appropriate
+        :param query: search query in inverted notation
+        :param max_distance: maximum amount of words between two
+        neighbour words of the query
+        :return: list of <doc_id, start position, amount of matched
+        words> of documents which satisfy the query, sorted from the
+        most appropriate (the longest match) to the least appropriate
         """
         result_documents = super().search(query)
-        query = list(filter(lambda x: x not in OPERATIONS.ALL, query))
-        coordinate_index = self._get_coordinate_index(query, result_documents)
-
-        longest_results = list()
-        for doc_id, positions in coordinate_index[query[0]]:
-            local_results = {pos: 0 for pos in positions}
-            for start_position in positions:
-                end_position = start_position + len(query[0])
-                for i in range(1, len(query)):
-                    position = 0
-                    for position in coordinate_index[query[i]][doc_id]:
-                        if position < end_position:
-                            continue
-                    if end_position < position < end_position + max_distance:
-                        local_results[start_position] += 1
-                else:
-                    break
-            longest_position = None, 0
-            for pos, length in local_results.items():
-                if longest_position[0] is None:
-                    longest_position = (pos, length)
-                if length > longest_position[1]:
-                    longest_position = pos, length
-            longest_results.append(
-                (doc_id, longest_position[0], longest_position[1]))
-        return longest_results
+        tokens = [token for token in query
+                  if isinstance(token, str) and token != ALL]
+        if not tokens:
+            return list()
+        results = [(doc_id, *self.positional_index.get_longest_match(
+            tokens, doc_id, max_distance)) for doc_id in result_documents]
+        return sorted(results, key=lambda result: -result[2])
@@ -1,93 +1,136 @@
 from enum import Enum
 
-from sortedcontainers import SortedList
-
-from search import SearchBTree
-from search.skip_list_search import SearchDictionary, DocumentSkipList, \
-    OPERATION_CODES, ALL
+from common.constants import PATH_TO_LIST_OF_FILES
+from search.k_gram import PermutationIndex, KGramIndex, WILDCARD, \
+    compile_wildcard_pattern
+from search.query_planner import EMPTY
+from search.query_tree import QueryNode, build_query_tree, create_node
+from search.skip_list_search import SearchDictionary, OPERATION_CODES, ALL
+from search.term_index import SortedTermIndex
 
 
 class WildcardSearch(SearchDictionary):
-    MODE = Enum('MODE', 'TREE_GRAM BTREE')
+    MODE = Enum('MODE', 'THREE_GRAM BTREE PERMUTERM')
 
-    def __init__(self, inverted_index: dict):
-        super().__init__(inverted_index)
-        self.straight_btree = SearchBTree()
-        self.inverted_btree = SearchBTree()
-        for token in self.inverted_index.keys():
-            self.inverted_btree.put(token[::-1])
-            self.straight_btree.put(token)
+    def __init__(self, inverted_index: dict,
+                 file_dictionary: str = PATH_TO_LIST_OF_FILES,
+                 statistics: dict = None, documents: list = None,
+                 term_indexes: tuple = None, mode: MODE = MODE.BTREE):
+        """
+        :param term_indexes: already built <index of tokens, index of
+        reversed tokens>. If None, the indexes are built from the tokens
+        of the inverted index
+        :param mode: algorithm which finds tokens of query terms with
+        wildcards. The permuterm and the k-gram indexes are built only
+        for their modes.
+        """
+        super().__init__(inverted_index, file_dictionary,
+                         statistics=statistics, documents=documents)
+        self.mode = mode
+        if term_indexes is not None:
+            self.straight_terms, self.reversed_terms = term_indexes
+        else:
+            tokens = [token for token in self.inverted_index.keys()
+                      if token != ALL]
+            self.straight_terms = SortedTermIndex(tokens)
+            self.reversed_terms = SortedTermIndex(token[::-1]
+                                                  for token in tokens)
+        self.permutation_index = PermutationIndex(self.straight_terms) \
+            if mode == self.MODE.PERMUTERM else None
+        self.k_gram_index = KGramIndex(self.straight_terms) \
+            if mode == self.MODE.THREE_GRAM else None
 
-    def _search_in_btrees(self, token: str) -> list:
-        sub_token = token
-        wildcard_pos = -1
-        results = SortedList()
-        while sub_token[wildcard_pos + 1:]:
-            wildcard_pos = sub_token.index('*')
-            docs = self.straight_btree.get(sub_token[:wildcard_pos])
-            results.update(docs)
-            sub_token = sub_token[wildcard_pos + 1:]
-        return list(results)
+    def _search_in_term_indexes(self, token: str) -> list:
+        """
+        Tokens which start with the part of the query before the first
+        wildcard and end with the part after the last wildcard are found
+        in the straight and reversed term indexes. Parts between
+        wildcards are checked with the compiled pattern of the query.
+        :param token: query token with wildcards
+        :return: sorted list of matching tokens
+        """
+        if WILDCARD not in token:
+            return [token] if token in self.straight_terms else list()
+        prefix = token[:token.index(WILDCARD)]
+        suffix = token[token.rindex(WILDCARD) + 1:]
+        candidates = self.straight_terms.get(prefix)
+        if suffix:
+            ends = self.reversed_terms.get(suffix[::-1])
+            if len(ends) < len(candidates):
+                candidates = sorted(end[::-1] for end in ends
+                                    if end.endswith(prefix[::-1]))
+        if token.count(WILDCARD) > 1:
+            pattern = compile_wildcard_pattern(token)
+            return [candidate for candidate in candidates
+                    if pattern.fullmatch(candidate)]
+        return [candidate for candidate in candidates
+                if len(candidate) >= len(prefix) + len(suffix) and
+                candidate.endswith(suffix)]
 
-    def _k_gram_search(self, token: str, k: int = 3):
-        pass
+    def _search_in_permutation_index(self, token: str) -> list:
+        return self.permutation_index.search(token)
 
-    def _search_with_wildcards(self, token: str, algorithm: MODE = MODE.BTREE
+    def _k_gram_search(self, token: str) -> list:
+        return self.k_gram_index.search(token)
+
+    def _search_with_wildcards(self, token: str, algorithm: MODE = None
                                ) -> list:
+        """
+        :param token: query token with wildcards
+        :param algorithm: algorithm to use, the mode of the dictionary by
+        default
+        :return: sorted list of matching tokens
+        """
         search = {
-            self.MODE.BTREE: self._search_in_btrees,
+            self.MODE.BTREE: self._search_in_term_indexes,
+            self.MODE.PERMUTERM: self._search_in_permutation_index,
             self.MODE.THREE_GRAM: self._k_gram_search
         }
-        return search[algorithm](token)
+        return search[self.mode if algorithm is None else algorithm](token)
 
-    def search(self, notation: list) -> list:
+    def expand(self, query):
         """
-        Search in the straight and inverted b-trees of search in the tokens
-        :param notation: query to search where some token contain a wildcard
-        :return: a list of documents which match the query
+        Replaces query terms with wildcards with OR of the matching
+        tokens, a term without matching tokens is replaced with an empty
+        query
+        :param query: query tree or a single token
+        :return: query tree without wildcards
         """
+        if isinstance(query, QueryNode):
+            return create_node(query.operator,
+                               [self.expand(child)
+                                for child in query.children])
+        if query == ALL or WILDCARD not in query:
+            return query
+        tokens = self._search_with_wildcards(query)
+        if not tokens:
+            return EMPTY
+        return tokens[0] if len(tokens) == 1 \
+            else create_node(OPERATION_CODES.OR, tokens)
 
-        def pop_last_result() -> DocumentSkipList:
-            """
-            if an item on the top of the stack is a token, find a list of
-            :return: skip list of document ids
-            """
-            last_token = stack.pop()
-            if isinstance(last_token, str):
-                last_token = self.get_ids(last_token)
-            return last_token
-
-        def process_operation_and_put_result_to_stack():
-            if token == OPERATION_CODES.NOT:
-                last_result = pop_last_result()
-                stack.append(self.process_operation(token, last_result))
-            else:
-                t1, t2 = pop_last_result(), pop_last_result()
-                if t1 and t2:
-                    stack.append(self.process_operation(token, t1, t2))
-                elif t1:
-                    stack.append(t1)
-                elif t2:
-                    stack.append(t2)
+    def search_documents(self, notation: list, limit: int = None) -> list:
+        """
+        :param notation: query to search where some tokens contain a
+        wildcard
+        :param limit: if provided, only the first [limit] documents are
+        found, see search_page
+        :return: a list of documents which match the query, also for a
+        query of a single token
+        """
+        if notation is None or len(notation) == 0:
+            return super().search(None, limit)
+        return super().search(self.expand(build_query_tree(notation)),
+                              limit)
 
-        if len(notation) == 0 or notation is None:
-            return self.inverted_index[ALL].to_list()
-        if len(notation) == 1 and notation[0] not in OPERATION_CODES:
+    def search(self, notation: list) -> list:
+        """
+        Search in the straight and reversed term indexes of the tokens
+        :param notation: query to search where some token contain a
+        wildcard. A query of a single token returns the matching tokens,
+        use search_documents to find its documents.
+        :return: a list of documents which match the query
+        """
+        if notation is not None and len(notation) == 1 and \
+                not isinstance(notation[0], OPERATION_CODES):
             return self._search_with_wildcards(notation[0])
-        stack = list()
-        for token in notation:
-            if isinstance(token, OPERATION_CODES):
-                process_operation_and_put_result_to_stack()
-            else:
-                if '*' in token:
-                    tokens = self._search_with_wildcards(token)
-                    query = tokens + [OPERATION_CODES.AND
-                                      for _ in range(len(tokens) - 1)]
-                    stack.append(self.search(query))
-                else:
-                    stack.append(token)
-        if len(stack) > 1:
-            raise AttributeError(f'"{notation}" is incorrect or there is '
-                                 f'a bug in the algorithm implementation.\n'
-                                 f'Stack is not empty at the end: f{stack}')
-        return pop_last_result().to_list()
+        return self.search_documents(notation)
@@ -2,9 +2,13 @@ import os
 
 import pytest
 
+from common import read_positions_in_file
 from common.constants import PATH_TO_RESULT_DIR
+from dictionary.positional_postings import write_positional_postings, \
+    PositionalPostingsFile, IncorrectPositionsFile
 from dictionary.strip_dictionary import StripDictionary, StripBlockDictionary, \
     FrontPackDictionary
+from dictionary.variable_byte import encode_gaps, decode_gaps
 
 
 @pytest.mark.parametrize('method_obj', [StripDictionary, StripBlockDictionary,
@@ -17,3 +21,70 @@ def test_strip_dictionary(method_obj):
     assert dict_object.get_token(-1) == 'canon'
     assert dict_object.get_documents(2) == ['0', '1', '4', '7', '8']
     assert dict_object.get_frequency(2) == 39
+
+
+@pytest.mark.parametrize('numbers', [[], [0], [1, 127, 128, 300, 16384],
+                                     [5, 70000, 2 ** 31]])
+def test_variable_byte_gaps(numbers):
+    assert decode_gaps(encode_gaps(numbers)) == numbers
+
+
+@pytest.mark.parametrize('numbers', [[-1], [5, 2, 9]])
+def test_variable_byte_gaps_incorrect(numbers):
+    with pytest.raises(ValueError):
+        encode_gaps(numbers)
+
+
+def test_reduce_out_of_order_chunks(tmp_path):
+    from dictionary import simple_dictionary
+    # the second chunk of the document is tokenized before the first one
+    simple_dictionary.token_queue.put(
+        (0, [(2, 11, 'yon'), (3, 15, 'fellow')]))
+    simple_dictionary.token_queue.put(
+        (0, [(0, 0, 'yon'), (1, 4, 'yonder')]))
+    for _ in range(simple_dictionary.CHUNK_WORKERS_NUM):
+        simple_dictionary.token_job_done.put(0)
+    try:
+        simple_dictionary.reduce_tokens_to_lexicon()
+        path = str(tmp_path / 'positions')
+        write_positional_postings(simple_dictionary.lexicon, path)
+    finally:
+        simple_dictionary.inverted_index.clear()
+        simple_dictionary.lexicon.clear()
+        while not simple_dictionary.token_job_done.empty():
+            simple_dictionary.token_job_done.get()
+    with PositionalPostingsFile(path) as file:
+        assert file.get_positions('yon', 0).tolist() == [0, 2]
+        assert file.get_positions('fellow', 0).tolist() == [3]
+
+
+def test_positional_postings_file(tmp_path):
+    path = str(tmp_path / 'positions')
+    write_positional_postings({
+        3: {'yon': [0, 7, 300], 'yonder': [1]},
+        1: {'yon': [2], 'fellow': [0, 128]}
+    }, path)
+    with PositionalPostingsFile(path) as file:
+        assert list(file) == ['fellow', 'yon', 'yonder']
+        assert file.get_documents('yon') == [1, 3]
+        assert file.get_positions('yon', 3).tolist() == [0, 7, 300]
+        assert file.get_positions('yon', 2).tolist() == []
+        assert file.get_positions('missing', 1).tolist() == []
+        assert {doc_id: positions.tolist() for doc_id, positions
+                in file.get_postings('fellow').items()} == {1: [0, 128]}
+        documents = file['yon']
+        assert len(documents) == 2 and list(documents) == [1, 3]
+        assert 3 in documents and 2 not in documents
+        assert documents[3].tolist() == [0, 7, 300]
+        assert file.get('missing') is None
+        assert {token: positions.tolist() for token, positions
+                in file.get_document(3).items()} == \
+            {'yon': [0, 7, 300], 'yonder': [1]}
+    assert read_positions_in_file('1', 'fellow', path) == [0, 128]
+    # positions of chunks which are tokenized out of order
+    write_positional_postings({0: {'yon': [5, 2, 9]}}, path)
+    with PositionalPostingsFile(path) as file:
+        assert file.get_positions('yon', 0).tolist() == [2, 5, 9]
+    (tmp_path / 'broken').write_bytes(b'SEDI')
+    with pytest.raises(IncorrectPositionsFile):
+        PositionalPostingsFile(str(tmp_path / 'broken'))
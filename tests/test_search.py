@@ -1,7 +1,45 @@
+import asyncio
+import json
+import os
+import pickle
+import subprocess
+import sys
+from threading import Event
+
 import pytest
 
+from common import get_shard_paths
+from common.constants import SPLIT, DIVIDER
+from common.exceptions import IncorrectQuery
+from dictionary.positional_postings import write_positional_postings
 from search import load_inverted_skip_index, build_notation, \
-    SearchBTree, SearchDictionary, WildcardSearch, load_inverted_list
+    SearchBTree, SearchDictionary, WildcardSearch, load_inverted_list, \
+    PostingsList, SearchCoordinatedDictionary, PhraseSearchDictionary, \
+    HybridPhraseSearchDictionary
+from search.biword_index import build_biword_index, load_biword_index
+from search.bitmap_postings import BitmapPostingsList, make_postings_list
+from search.disk_index import write_disk_index, load_disk_index
+from search.k_gram import KGramIndex
+from search.postings_cache import PostingsCache
+from search.positional_index import load_positional_index, \
+    load_document_offsets, DocumentOffsets
+from search.query_cache import QueryResultCache
+from search.query_parser import parse_query
+from search.query_planner import EMPTY
+from search.sharded_search import load_sharded_search
+from search.term_partitioned_search import TermPartitionedSearch, \
+    RemoteInvertedIndex, TermShard, LocalTransport, partition_terms, \
+    start_shard_processes
+from search.server import QueryServer, Endpoint, parse_wildcard_query
+from search.snapshot import save_snapshot, load_snapshot
+from search.term_index import SortedTermIndex
+from search.shared_index import SharedIndexPublisher, \
+    attach_shared_index
+from search.query_tree import QueryNode, build_query_tree, query_key
+from search.skip_list_search import OPERATION_CODES, ComplementList
+from search.two_token_search import PHRASE_PLANS, plan_phrase_query
+
+ALL_DOCUMENTS = [0, 1, 2, 4, 5, 6, 7, 8, 10, 11]
 
 
 @pytest.fixture
@@ -14,6 +52,47 @@ def search_skip_list_dictionary() -> SearchDictionary:
     yield load_inverted_skip_index()
 
 
+SMALL_INVERTED_INDEX = {
+    'yon': [0, 5, 10, 11],
+    'yonder': [2, 5, 8, 10, 11],
+    'fellow': [1, 2, 5, 6, 7]
+}
+
+# <biword, documents> records of the biword index
+BIWORD_RECORDS = [
+    ('yon fellow', [0, 1, 5]),
+    ('fellow yonder', [0, 2, 5, 7]),
+    ('yonder yon', [2])
+]
+
+
+@pytest.fixture
+def files_list(tmp_path) -> str:
+    files = tmp_path / 'files'
+    files.write_text(''.join(f'file{doc_id}.txt{SPLIT}{doc_id}\n'
+                             for doc_id in ALL_DOCUMENTS))
+    yield str(files)
+
+
+@pytest.fixture
+def small_search_dictionary(files_list) -> SearchDictionary:
+    inverted_index = {token: PostingsList(doc_ids)
+                      for token, doc_ids in SMALL_INVERTED_INDEX.items()}
+    yield SearchDictionary(inverted_index, files_list)
+
+
+@pytest.fixture
+def disk_search_dictionary(tmp_path, files_list) -> SearchDictionary:
+    path_to_dict = tmp_path / 'dict'
+    path_to_dict.write_text(''.join(
+        f'{token}{DIVIDER}{len(doc_ids) * 3}{SPLIT}'
+        f'{",".join(map(str, doc_ids))}\n'
+        for token, doc_ids in SMALL_INVERTED_INDEX.items()))
+    terms_path, postings_path = tmp_path / 'terms', tmp_path / 'postings'
+    write_disk_index(str(path_to_dict), str(terms_path), str(postings_path))
+    yield load_disk_index(str(terms_path), str(postings_path), files_list)
+
+
 @pytest.fixture
 def btree(inverted_index) -> SearchBTree:
     btree = SearchBTree()
@@ -45,6 +124,752 @@ def test_search(search_skip_list_dictionary: SearchDictionary,
         f'Expected: {expected_documents}\nActual:{actual_documents}'
 
 
+@pytest.mark.parametrize('t1, t2', [
+    ([], []),
+    ([1, 2, 3], []),
+    ([0, 2, 5, 8, 10, 11], [5, 10, 11]),
+    (list(range(0, 1000, 3)), list(range(0, 1000, 7))),
+    ([7], list(range(100))),
+    (list(range(0, 50)), list(range(50, 100))),
+    (list(range(65530, 65545)), [3, 65535, 65536, 200000])
+])
+@pytest.mark.parametrize('type1, type2', [
+    (PostingsList, PostingsList),
+    (PostingsList, BitmapPostingsList),
+    (BitmapPostingsList, PostingsList),
+    (BitmapPostingsList, BitmapPostingsList)
+])
+def test_postings_list_operations(t1, t2, type1, type2):
+    p1, p2 = type1(t1), type2(t2)
+    assert SearchDictionary._intersect(p1, p2).to_list() == \
+        sorted(set(t1) & set(t2))
+    assert SearchDictionary._concatenate(p1, p2).to_list() == \
+        sorted(set(t1) | set(t2))
+    assert SearchDictionary._difference(p1, p2).to_list() == \
+        sorted(set(t1) - set(t2))
+
+
+@pytest.mark.parametrize('excluded, expected_documents', [
+    ([1, 4], [0, 2]),
+    ([1, 3, 9], [0, 2, 4]),
+    ([], [0, 1, 2, 4])
+])
+def test_complement_list(excluded, expected_documents):
+    # ids 3 and 9 are missing in the list of files of a stale index
+    complement = ComplementList(PostingsList([0, 1, 2, 4]),
+                                PostingsList(excluded))
+    assert complement.to_list() == expected_documents
+    assert len(complement) == len(expected_documents)
+
+
+@pytest.mark.parametrize('doc_ids, expected_type', [
+    ([], PostingsList),
+    ([1, 2, 3, 5, 8], BitmapPostingsList),
+    ([1, 1000, 20000], PostingsList),
+    (list(range(0, 100000, 20)), BitmapPostingsList),
+    (list(range(60000, 60100)), PostingsList),
+    (list(range(65536, 65636)), BitmapPostingsList)
+])
+def test_make_postings_list(doc_ids, expected_type):
+    postings = make_postings_list(doc_ids, PostingsList)
+    assert isinstance(postings, expected_type)
+    assert postings.to_list() == doc_ids
+
+
+@pytest.mark.parametrize('doc_id, expected', [
+    (0, 3), (3, 3), (4, 65535), (65536, 200000), (200000, 200000),
+    (200001, None)
+])
+def test_bitmap_next_ge(doc_id, expected):
+    postings = BitmapPostingsList([3, 65535, 200000])
+    assert postings.next_ge(doc_id) == expected
+
+
+@pytest.mark.parametrize('notation, expected_documents', [
+    (['yon', 'yonder', OPERATION_CODES.NOT, OPERATION_CODES.AND], [0]),
+    (['yon', OPERATION_CODES.NOT], [1, 2, 4, 6, 7, 8]),
+    (['yon', OPERATION_CODES.NOT, 'yonder', OPERATION_CODES.NOT,
+      OPERATION_CODES.AND], [1, 4, 6, 7]),
+    (['yon', 'yonder', OPERATION_CODES.NOT, OPERATION_CODES.OR],
+     [0, 1, 4, 5, 6, 7, 10, 11]),
+    (['yonder', 'yon', OPERATION_CODES.NOT, OPERATION_CODES.NOT,
+      OPERATION_CODES.AND], [5, 10, 11]),
+    (['yonder', 'yonder', OPERATION_CODES.NOT, OPERATION_CODES.AND], [])
+])
+def test_search_with_exclusion(small_search_dictionary, notation,
+                               expected_documents):
+    assert small_search_dictionary.search(notation) == expected_documents
+
+
+def test_build_query_tree_collapses_chains():
+    notation = ['a', 'b', 'c', 'd', OPERATION_CODES.OR, OPERATION_CODES.AND,
+                OPERATION_CODES.AND, 'e', OPERATION_CODES.OR]
+    assert build_query_tree(notation) == QueryNode(OPERATION_CODES.OR, [
+        QueryNode(OPERATION_CODES.AND, [
+            'a', 'b', QueryNode(OPERATION_CODES.OR, ['c', 'd'])]),
+        'e'])
+
+
+@pytest.mark.parametrize('notation, expected_documents', [
+    (['yon', 'yonder', 'fellow', OPERATION_CODES.AND, OPERATION_CODES.AND],
+     [5]),
+    (['yon', 'yonder', 'fellow', OPERATION_CODES.OR, OPERATION_CODES.OR],
+     [0, 1, 2, 5, 6, 7, 8, 10, 11]),
+    (['yon', 'missing', 'fellow', OPERATION_CODES.AND, OPERATION_CODES.AND],
+     []),
+    (['yon', 'missing', OPERATION_CODES.OR], [0, 5, 10, 11]),
+    (['fellow', 'yon', OPERATION_CODES.NOT, 'yonder', OPERATION_CODES.NOT,
+      OPERATION_CODES.OR, OPERATION_CODES.AND], [1, 2, 6, 7])
+])
+def test_search_n_ary_operations(small_search_dictionary, notation,
+                                 expected_documents):
+    assert small_search_dictionary.search(notation) == expected_documents
+
+
+@pytest.mark.parametrize('notation, expected_plan', [
+    (['yon', 'missing', OPERATION_CODES.AND], EMPTY),
+    (['yon', 'missing', OPERATION_CODES.OR], 'yon'),
+    (['missing', OPERATION_CODES.NOT], '*'),
+    (['yon', OPERATION_CODES.NOT, OPERATION_CODES.NOT], 'yon'),
+    (['yon', 'yon', OPERATION_CODES.AND], 'yon'),
+    (['yonder', 'fellow', 'yon', OPERATION_CODES.AND, OPERATION_CODES.AND],
+     QueryNode(OPERATION_CODES.AND, ['yon', 'yonder', 'fellow'])),
+    (['fellow', 'yon', OPERATION_CODES.NOT, OPERATION_CODES.AND],
+     QueryNode(OPERATION_CODES.AND_NOT, ['fellow', 'yon'])),
+    (['yon', OPERATION_CODES.NOT, 'fellow', OPERATION_CODES.NOT,
+      OPERATION_CODES.AND],
+     QueryNode(OPERATION_CODES.NOT, [
+         QueryNode(OPERATION_CODES.OR, ['yon', 'fellow'])]))
+])
+def test_query_planner(small_search_dictionary, notation, expected_plan):
+    plan = small_search_dictionary.plan(notation)
+    assert query_key(plan) == query_key(expected_plan)
+
+
+def test_query_planner_explain(small_search_dictionary):
+    explanation = small_search_dictionary.explain(
+        ['fellow', 'yon', OPERATION_CODES.NOT, OPERATION_CODES.AND])
+    assert explanation.split('\n') == ['AND_NOT ~3.0',
+                                        '  fellow (df=5, cf=5) ~5.0',
+                                        '  yon (df=4, cf=4) ~4.0']
+
+
+def test_query_result_cache(small_search_dictionary):
+    cache = small_search_dictionary.result_cache
+    assert small_search_dictionary.search(
+        ['yon', 'yonder', OPERATION_CODES.AND]) == [5, 10, 11]
+    assert small_search_dictionary.search(
+        ['yonder', 'yon', OPERATION_CODES.AND]) == [5, 10, 11]
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+    small_search_dictionary.update_token('yon', PostingsList([5]))
+    assert len(cache) == 0
+    assert small_search_dictionary.search(
+        ['yon', 'yonder', OPERATION_CODES.AND]) == [5]
+
+
+def test_query_result_cache_eviction():
+    cache = QueryResultCache(max_entries=2, max_bytes=12)
+    cache.put('a', PostingsList([1]))
+    cache.put('b', PostingsList([2]))
+    cache.get('a')
+    cache.put('c', PostingsList([3]))
+    assert cache.get('b') is None
+    cache.put('d', PostingsList([4, 5]))
+    assert list(cache.entries) == ['c', 'd']
+    assert cache.evictions == 2
+    cache.put('e', PostingsList(range(4)))
+    assert cache.get('e') is None
+
+
+@pytest.mark.parametrize('notation', [
+    ['yon', 'yonder', 'fellow', OPERATION_CODES.OR, OPERATION_CODES.OR],
+    ['yonder', 'yon', OPERATION_CODES.NOT, OPERATION_CODES.AND],
+    ['fellow', OPERATION_CODES.NOT],
+    []
+])
+def test_search_page(small_search_dictionary, notation):
+    expected_documents = small_search_dictionary.search(notation)
+    documents, cursor = small_search_dictionary.search_page(notation, 2)
+    while cursor is not None:
+        assert len(documents) % 2 == 0
+        page, cursor = small_search_dictionary.search_page(
+            notation, 2, cursor)
+        documents.extend(page)
+    assert documents == expected_documents
+    assert small_search_dictionary.search(notation, limit=3) == \
+        expected_documents[:3]
+
+
+@pytest.mark.parametrize('limit', [0, -1])
+def test_search_page_incorrect_limit(small_search_dictionary, limit):
+    notation = ['yon', 'yonder', OPERATION_CODES.OR]
+    with pytest.raises(ValueError):
+        small_search_dictionary.search_page(notation, limit)
+    with pytest.raises(ValueError):
+        small_search_dictionary.search(notation, limit=limit)
+
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_search_many(small_search_dictionary, processes):
+    queries = [
+        ['yon', 'yonder', OPERATION_CODES.AND],
+        ['fellow', 'yon', 'yonder', OPERATION_CODES.AND, OPERATION_CODES.OR],
+        ['yonder', 'yon', OPERATION_CODES.AND, 'fellow', OPERATION_CODES.NOT,
+         OPERATION_CODES.AND],
+        []
+    ]
+    expected_results = [small_search_dictionary.search(query)
+                        for query in queries]
+    small_search_dictionary.result_cache.clear()
+    assert small_search_dictionary.search_many(queries, processes) == \
+        expected_results
+
+
+@pytest.mark.parametrize('notation', [
+    ['yon', 'yonder', OPERATION_CODES.AND],
+    ['yon', 'missing', OPERATION_CODES.OR],
+    ['fellow', 'yon', OPERATION_CODES.NOT, OPERATION_CODES.AND]
+])
+def test_disk_index(small_search_dictionary, disk_search_dictionary,
+                    notation):
+    assert disk_search_dictionary.search(notation) == \
+        small_search_dictionary.search(notation)
+    assert disk_search_dictionary.planner.statistics['yon'] \
+        .collection_frequency == 12
+
+
+def test_postings_cache():
+    postings = {token: PostingsList(doc_ids)
+                for token, doc_ids in SMALL_INVERTED_INDEX.items()}
+    cache = PostingsCache(max_bytes=40)
+    cache.warm(['yon', 'missing'], postings.get)
+    assert 'yon' in cache and len(cache) == 1
+    for _ in range(3):
+        assert cache.get('yonder', lambda: postings['yonder']) is \
+            postings['yonder']
+    assert cache.get_statistics()['hits'] == 2
+    # a token met once does not evict the more frequent ones
+    cache.get('fellow', lambda: postings['fellow'])
+    assert 'fellow' not in cache and cache.rejections == 1
+    assert cache.size <= cache.max_bytes
+    # tokens of a batch pass the admission of get, so a token met once
+    # does not evict the hot ones
+    postings['yokel'] = PostingsList([3, 4, 9, 12, 13])
+    found = cache.get_many(['yonder', 'yokel', 'missing'],
+                           lambda tokens: {token: postings[token]
+                                           for token in tokens
+                                           if token in postings})
+    assert found == {'yonder': postings['yonder'],
+                     'yokel': postings['yokel']}
+    assert 'yonder' in cache and 'yokel' not in cache
+    assert cache.rejections == 2
+
+
+def test_disk_index_hot_terms(tmp_path, disk_search_dictionary, files_list):
+    terms_path, postings_path = tmp_path / 'terms', tmp_path / 'postings'
+    search_dictionary = load_disk_index(str(terms_path), str(postings_path),
+                                        files_list, hot_terms=['yon'])
+    index = search_dictionary.inverted_index.maps[-1]
+    assert 'yon' in index.postings_cache
+    assert search_dictionary.search(['yon']) == \
+        disk_search_dictionary.search(['yon'])
+    assert index.postings_cache.hits == 1
+
+
+def test_shared_index(tmp_path, disk_search_dictionary, files_list):
+    queries = [['yon', 'yonder', OPERATION_CODES.AND],
+               ['fellow', 'yon', OPERATION_CODES.NOT, OPERATION_CODES.AND]]
+    expected_results = [disk_search_dictionary.search(query)
+                        for query in queries]
+    with SharedIndexPublisher(str(tmp_path / 'dict')) as publisher:
+        search_dictionary = attach_shared_index(publisher.name, files_list)
+        # a pickled dictionary attaches to the same block of memory
+        attached = pickle.loads(pickle.dumps(search_dictionary))
+        assert attached.inverted_index.maps[-1].shared_memory.name == \
+            publisher.name
+        assert [attached.search(query) for query in queries] == \
+            expected_results
+        assert search_dictionary.search_many(queries, processes=2) == \
+            expected_results
+        for dictionary in (search_dictionary, attached):
+            dictionary.inverted_index.maps[-1].close()
+
+
+def test_shared_index_independent_processes(tmp_path,
+                                            disk_search_dictionary,
+                                            files_list):
+    expected_result = disk_search_dictionary.search(['yon'])
+    script = ('import sys\n'
+              'from search.shared_index import attach_shared_index\n'
+              'dictionary = attach_shared_index(sys.argv[1], sys.argv[2])\n'
+              'print(dictionary.search(["yon"]))\n'
+              'dictionary.inverted_index.maps[-1].close()\n')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    publisher = SharedIndexPublisher(str(tmp_path / 'dict'))
+    try:
+        # workers which are not started by multiprocessing have their
+        # own resource trackers
+        for _ in range(2):
+            process = subprocess.run(
+                [sys.executable, '-c', script, publisher.name, files_list],
+                cwd=root, capture_output=True, text=True, timeout=60)
+            assert process.returncode == 0, process.stderr
+            assert process.stdout.strip() == str(expected_result)
+    finally:
+        publisher.close()
+
+
+def test_snapshot(tmp_path, small_search_dictionary, files_list):
+    small_search_dictionary.update_token('yokel', PostingsList([4, 7]))
+    small_search_dictionary.remove_token('fellow')
+    path = str(tmp_path / 'snapshot')
+    save_snapshot(small_search_dictionary, path, files_list)
+    loaded = load_snapshot(path)
+    for notation in (['yon', 'yokel', OPERATION_CODES.OR], ['fellow'],
+                     ['yonder', OPERATION_CODES.NOT]):
+        assert loaded.search(notation) == \
+            small_search_dictionary.search(notation)
+    assert loaded.document_table.get_name(7) == 'file7.txt'
+
+
+def test_wildcard_snapshot(tmp_path, files_list):
+    inverted_index = {token: PostingsList(doc_ids)
+                      for token, doc_ids in SMALL_INVERTED_INDEX.items()}
+    wildcard_search = WildcardSearch(inverted_index, files_list)
+    path = str(tmp_path / 'snapshot')
+    save_snapshot(wildcard_search, path, files_list)
+    loaded = load_snapshot(path)
+    assert isinstance(loaded, WildcardSearch)
+    assert loaded.straight_terms.get('yon') == ['yon', 'yonder']
+    assert loaded.reversed_terms.terms == \
+        wildcard_search.reversed_terms.terms
+
+
+@pytest.mark.parametrize('mode', list(WildcardSearch.MODE))
+def test_wildcard_snapshot_mode(tmp_path, files_list, mode):
+    inverted_index = {token: PostingsList(doc_ids)
+                      for token, doc_ids in SMALL_INVERTED_INDEX.items()}
+    wildcard_search = WildcardSearch(inverted_index, files_list, mode=mode)
+    path = str(tmp_path / 'snapshot')
+    save_snapshot(wildcard_search, path, files_list)
+    loaded = load_snapshot(path)
+    assert loaded.mode == mode
+    assert (loaded.permutation_index is None) == \
+        (mode != WildcardSearch.MODE.PERMUTERM)
+    assert (loaded.k_gram_index is None) == \
+        (mode != WildcardSearch.MODE.THREE_GRAM)
+    for notation in (['y*n*r'], ['*e*o*'], ['yo*on'],
+                     ['*low', 'y*r', OPERATION_CODES.OR]):
+        assert loaded.search(notation) == wildcard_search.search(notation)
+
+
+@pytest.mark.parametrize('prefix, expected_result', [
+    ('yon', ['yon', 'yonder']),
+    ('yonder', ['yonder']),
+    ('f', ['fellow']),
+    ('', ['fellow', 'yon', 'yonder']),
+    ('z', [])
+])
+def test_sorted_term_index(prefix, expected_result):
+    term_index = SortedTermIndex(['yonder', 'fellow', 'yon', 'yon'])
+    assert term_index.get(prefix) == expected_result
+    restored = SortedTermIndex.from_bytes(term_index.to_bytes())
+    assert restored.get(prefix) == expected_result
+
+
+@pytest.mark.parametrize('mode', list(WildcardSearch.MODE))
+@pytest.mark.parametrize('pattern, expected_result', [
+    ('yon*', ['yon', 'yonder']),
+    ('y*r', ['yonder']),
+    ('*w', ['fellow']),
+    ('yo*on', []),
+    ('*', ['fellow', 'yon', 'yonder']),
+    ('y*n*r', ['yonder']),
+    ('*e*o*', ['fellow']),
+    ('*o*e*', ['yonder']),
+    ('*l*o*', ['fellow']),
+    ('yon', ['yon'])
+])
+def test_small_wildcard_search(files_list, mode, pattern, expected_result):
+    inverted_index = {token: PostingsList(doc_ids)
+                      for token, doc_ids in SMALL_INVERTED_INDEX.items()}
+    wildcard_search = WildcardSearch(inverted_index, files_list, mode=mode)
+    assert wildcard_search.search([pattern]) == expected_result
+
+
+@pytest.mark.parametrize('pattern, expected_grams', [
+    ('yon', {'$yo', 'yon', 'on$'}),
+    ('*ation*', {'ati', 'tio', 'ion'}),
+    ('y*r', set()),
+    ('ye*ow', {'$ye', 'ow$'})
+])
+def test_k_gram_index(pattern, expected_grams):
+    k_gram_index = KGramIndex(['nation', 'station', 'stationary', 'yon'])
+    assert k_gram_index.get_query_grams(pattern) == expected_grams
+
+
+@pytest.mark.parametrize('pattern, expected_terms', [
+    ('*ation*', ['nation', 'station', 'stationary']),
+    ('st*on', ['station']),
+    ('*on', ['nation', 'station', 'yon']),
+    ('a*', []),
+    ('y*', ['yon']),
+    ('yon', ['yon'])
+])
+def test_k_gram_search(pattern, expected_terms):
+    k_gram_index = KGramIndex(['nation', 'station', 'stationary', 'yon'])
+    assert k_gram_index.search(pattern) == expected_terms
+
+
+@pytest.mark.parametrize('notation, expected_result', [
+    (['yon*', 'fel*', OPERATION_CODES.AND], [2, 5]),
+    (['*low', 'y*r', OPERATION_CODES.OR], [1, 2, 5, 6, 7, 8, 10, 11]),
+    (['x*', 'yon', OPERATION_CODES.AND], []),
+    (['x*', 'yon', OPERATION_CODES.OR], [0, 5, 10, 11]),
+    (['*n*e*', OPERATION_CODES.NOT], [0, 1, 4, 6, 7])
+])
+def test_wildcard_search_documents(files_list, notation, expected_result):
+    inverted_index = {token: PostingsList(doc_ids)
+                      for token, doc_ids in SMALL_INVERTED_INDEX.items()}
+    wildcard_search = WildcardSearch(inverted_index, files_list)
+    assert wildcard_search.search(notation) == expected_result
+    assert wildcard_search.search_documents(notation) == expected_result
+
+
+def test_sharded_search(tmp_path, small_search_dictionary):
+    shards_number = 3
+    for shard in range(shards_number):
+        path_to_dict, path_to_files = get_shard_paths(shard, str(tmp_path))
+        with open(path_to_dict, 'w') as file:
+            for token, doc_ids in SMALL_INVERTED_INDEX.items():
+                doc_ids = [doc_id for doc_id in doc_ids
+                           if doc_id % shards_number == shard]
+                if doc_ids:
+                    file.write(f'{token}{DIVIDER}{len(doc_ids)}{SPLIT}'
+                               f'{",".join(map(str, doc_ids))}\n')
+        with open(path_to_files, 'w') as file:
+            file.writelines(f'file{doc_id}.txt{SPLIT}{doc_id}\n'
+                            for doc_id in ALL_DOCUMENTS
+                            if doc_id % shards_number == shard)
+    with load_sharded_search(shards_number, str(tmp_path)) as sharded_search:
+        for notation in (['yon', 'yonder', OPERATION_CODES.OR],
+                         ['fellow', 'yon', OPERATION_CODES.NOT,
+                          OPERATION_CODES.AND],
+                         ['yonder', OPERATION_CODES.NOT]):
+            assert sharded_search.search(notation) == \
+                small_search_dictionary.search(notation)
+        assert sharded_search.search(['yonder'], limit=2) == [2, 5]
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_term_partitioned_search(tmp_path, disk_search_dictionary,
+                                 small_search_dictionary, files_list,
+                                 processes):
+    path_to_dict = str(tmp_path / 'dict')
+    boundaries = partition_terms(path_to_dict, 2)
+    assert boundaries == ['yonder']
+    if processes:
+        transport = start_shard_processes(boundaries, path_to_dict)
+    else:
+        transport = LocalTransport([TermShard(path_to_dict, boundaries, shard)
+                                    for shard in range(len(boundaries) + 1)])
+    remote_index = RemoteInvertedIndex(transport, boundaries)
+    fetches = list()
+    fetch = remote_index.fetch
+    remote_index.fetch = lambda tokens: fetches.append(sorted(tokens)) or \
+        fetch(tokens)
+    search_dictionary = TermPartitionedSearch(remote_index, files_list)
+    for notation in (['yon', 'yonder', OPERATION_CODES.AND],
+                     ['fellow', 'missing', OPERATION_CODES.OR],
+                     ['fellow', 'yon', OPERATION_CODES.NOT,
+                      OPERATION_CODES.AND]):
+        assert search_dictionary.search(notation) == \
+            small_search_dictionary.search(notation)
+    # postings are fetched for the plan before evaluation, once
+    assert fetches == [['yon', 'yonder'], ['fellow']]
+    postings_cache = remote_index.postings_cache
+    # plans answered from the result cache do not fetch postings
+    postings_cache.clear()
+    search_dictionary.search(['yon', 'yonder', OPERATION_CODES.AND])
+    assert len(postings_cache) == 0
+    # postings larger than the cache are not prefetched
+    small_index = RemoteInvertedIndex(transport, boundaries, cache_bytes=16)
+    small_index.prefetch(['yon', 'yonder', 'fellow'])
+    assert small_index._prefetched.postings.keys() == {'yon'}
+    assert small_index['yonder'].to_list() == SMALL_INVERTED_INDEX['yonder']
+    search_dictionary.close()
+
+
+def request_server(server: QueryServer, target: str) -> tuple:
+    async def request():
+        tcp_server = await server.start(port=0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        async with tcp_server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(f'GET {target} HTTP/1.1\r\n\r\n'.encode())
+            response = await reader.read()
+            writer.close()
+        head, body = response.split(b'\r\n\r\n', 1)
+        return int(head.split()[1]), json.loads(body)
+
+    return asyncio.run(request())
+
+
+@pytest.mark.parametrize('target, expected_status, expected_body', [
+    ('/search?q=yon+-yonder', 200, {'documents': [0]}),
+    ('/search?q=yon+OR+fellow&limit=2', 200, {'documents': [0, 1]}),
+    ('/search?q=yon+OR', 400, None),
+    ('/search', 400, None),
+    ('/missing?q=yon', 404, None)
+])
+def test_query_server(small_search_dictionary, target, expected_status,
+                      expected_body):
+    server = QueryServer({'search': Endpoint(small_search_dictionary,
+                                             parse_query)}, workers=2)
+    status, body = request_server(server, target)
+    assert status == expected_status
+    if expected_body is not None:
+        assert body == expected_body
+    statistics = request_server(server, '/stats')[1]
+    assert statistics['endpoints']['search']['count'] == \
+        (1 if target.startswith('/search?') else 0)
+    server.close()
+
+
+@pytest.mark.parametrize('limit', ['0', '-1', 'x'])
+def test_query_server_incorrect_limit(small_search_dictionary, limit):
+    server = QueryServer({'search': Endpoint(small_search_dictionary,
+                                             parse_query)}, workers=1)
+    status, _ = request_server(server, f'/search?q=yon&limit={limit}')
+    assert status == 400
+    assert server.histograms['search'].count == 0
+    server.close()
+
+
+@pytest.mark.parametrize('target, expected_documents', [
+    ('/wildcard?q=yon*', [0, 2, 5, 8, 10, 11]),
+    ('/wildcard?q=yon', [0, 5, 10, 11]),
+    ('/wildcard?q=x*', []),
+    ('/wildcard?q=*low+y*r', [2, 5])
+])
+def test_query_server_wildcard(files_list, target, expected_documents):
+    inverted_index = {token: PostingsList(doc_ids)
+                      for token, doc_ids in SMALL_INVERTED_INDEX.items()}
+    server = QueryServer({'wildcard': Endpoint(
+        WildcardSearch(inverted_index, files_list), parse_wildcard_query,
+        'search_documents')}, workers=1)
+    assert request_server(server, target) == \
+        (200, {'documents': expected_documents})
+    server.close()
+
+
+@pytest.mark.parametrize('max_in_flight, timeout, expected_status', [
+    (0, 1, 503),
+    (1, 0, 504)
+])
+def test_query_server_overload(small_search_dictionary, max_in_flight,
+                               timeout, expected_status):
+    server = QueryServer({'search': Endpoint(small_search_dictionary,
+                                             parse_query)},
+                         max_in_flight=max_in_flight, timeout=timeout)
+    status, _ = asyncio.run(server.search('search', 'yon'))
+    assert status == expected_status
+    server.close()
+
+
+class BlockedDictionary:
+    """Dictionary which answers a query when the event is set"""
+
+    def __init__(self):
+        self.event = Event()
+
+    def search(self, notation, limit=None) -> list:
+        self.event.wait()
+        return list()
+
+
+def test_query_server_in_flight_after_timeout():
+    dictionary = BlockedDictionary()
+    server = QueryServer({'search': Endpoint(dictionary, parse_query)},
+                         workers=1, max_in_flight=1, timeout=0.01)
+
+    async def search_twice():
+        first, _ = await server.search('search', 'yon')
+        second, _ = await server.search('search', 'yon')
+        return first, second
+
+    # the query out of time keeps its place until the worker finishes
+    try:
+        assert asyncio.run(search_twice()) == (504, 503)
+        assert server.in_flight == 1
+    finally:
+        dictionary.event.set()
+        server.close()
+    assert server.in_flight == 0
+
+
+@pytest.fixture(params=[False, True], ids=['mapped', 'in_memory'])
+def positional_index(request, tmp_path):
+    documents = {
+        0: 'yon fellow yonder',
+        2: 'fellow yonder yon',
+        5: 'yonder fellow yon yon'
+    }
+    lexicon = dict()
+    for doc_id, text in documents.items():
+        for position, word in enumerate(text.split()):
+            lexicon.setdefault(doc_id, dict()) \
+                .setdefault(word, list()).append(position)
+    write_positional_postings(lexicon, str(tmp_path / 'positions'))
+    yield load_positional_index(str(tmp_path / 'positions'),
+                                in_memory=request.param)
+
+
+@pytest.mark.parametrize('query, expected_result', [
+    (['fellow', 'yonder'], [0, 2]),
+    (['yonder', 'yon'], [2]),
+    (['yon', 'yon'], [5]),
+    (['fellow', 'yonder', 'yon'], [2]),
+    (['yonder', '/1', 'fellow'], [0, 2, 5]),
+    (['yon', '/1', 'yonder'], [2]),
+    (['yon', '/2', 'yonder'], [0, 2, 5]),
+    (['yon', '*', 'yonder'], [0]),
+    (['fellow', '*', 'yon'], [2, 5]),
+    (['*', 'yonder', '*'], [0, 2, 5]),
+    (['missing', 'yon'], [])
+])
+def test_positional_search(positional_index, query, expected_result):
+    assert positional_index.search(query) == expected_result
+
+
+def test_load_document_offsets(tmp_path):
+    path = str(tmp_path / 'offsets')
+    write_positional_postings({
+        0: {'yon': [0], 'fellow': [4]},
+        2: {'fellow': [0], 'yonder': [7]}
+    }, path)
+    assert {token: offsets.tolist() for token, offsets
+            in load_document_offsets(2, path).items()} == \
+        {'fellow': [0], 'yonder': [7]}
+    assert load_document_offsets(1, path) == dict()
+    assert load_document_offsets(0, str(tmp_path / 'missing')) == dict()
+    document_offsets = DocumentOffsets(path)
+    for doc_id in (0, 1, 2):
+        assert document_offsets.get(doc_id) == \
+            load_document_offsets(doc_id, path)
+    document_offsets.close()
+    assert DocumentOffsets(str(tmp_path / 'missing')).get(0) == dict()
+
+
+def test_positional_index_pickle(tmp_path):
+    path = str(tmp_path / 'positions')
+    write_positional_postings({0: {'yon': [0], 'fellow': [1]}}, path)
+    index = pickle.loads(pickle.dumps(load_positional_index(path)))
+    assert index.search(['yon', 'fellow']) == [0]
+
+
+def test_search_coordinated_dictionary(positional_index, files_list):
+    inverted_index = {token: PostingsList(doc_ids)
+                      for token, doc_ids in SMALL_INVERTED_INDEX.items()}
+    search_dictionary = SearchCoordinatedDictionary(
+        inverted_index, positional_index, files_list)
+    assert search_dictionary.search(
+        ['fellow', 'yonder', OPERATION_CODES.AND], max_distance=1) == \
+        [(2, 0, 2), (5, 1, 1)]
+
+
+@pytest.mark.parametrize('query, expected_result', [
+    (['yon', 'fellow'], [0, 1, 5]),
+    (['yon', 'fellow', 'yonder'], [0, 5]),
+    (['yon', '*', 'fellow'], [0, 1, 5]),
+    (['fellow', 'yon'], []),
+    (['yon', 'missing'], []),
+    (['yon'], [])
+])
+def test_phrase_search_dictionary(files_list, query, expected_result):
+    biword_index = build_biword_index(BIWORD_RECORDS)
+    search_dictionary = PhraseSearchDictionary(biword_index, files_list)
+    assert search_dictionary.search(query) == expected_result
+
+
+def test_biword_index():
+    biword_index = build_biword_index(BIWORD_RECORDS)
+    assert biword_index.terms == ['fellow', 'yon', 'yonder']
+    assert len(biword_index) == 3
+    assert biword_index.get('fellow yonder').to_list() == [0, 2, 5, 7]
+    assert biword_index.get('yonder fellow') is None
+    assert biword_index.get('missing yon') is None
+
+
+def test_load_biword_index(tmp_path):
+    # text inverted index of biwords in the format of the index builder
+    path = tmp_path / 'biwords'
+    path.write_text(''.join(
+        f'{biword}{DIVIDER}{len(doc_ids)}{SPLIT}'
+        f'{",".join(map(str, doc_ids))}\n'
+        for biword, doc_ids in BIWORD_RECORDS))
+    loaded = load_biword_index(str(path))
+    built = build_biword_index(BIWORD_RECORDS)
+    assert loaded.terms == built.terms
+    assert loaded.keys == built.keys
+    assert [postings.to_list() for postings in loaded.postings] == \
+        [postings.to_list() for postings in built.postings]
+
+
+@pytest.mark.parametrize('biword_lengths, term_lengths, expected_plan', [
+    ([2, 3], [10, 12, 40], PHRASE_PLANS.BIWORD),
+    ([30, 35], [2, 50, 60], PHRASE_PLANS.POSITIONAL),
+    ([], [4], PHRASE_PLANS.POSITIONAL)
+])
+def test_plan_phrase_query(biword_lengths, term_lengths, expected_plan):
+    assert plan_phrase_query(biword_lengths, term_lengths) == expected_plan
+
+
+@pytest.mark.parametrize('query, expected_result', [
+    (['fellow', 'yonder', 'yon'], [2]),
+    (['yon', 'fellow', 'yonder'], [0]),
+    (['yonder', 'fellow', 'yon', 'yon'], [5]),
+    (['yonder', 'yon'], [2]),
+    (['yon'], [0, 2, 5]),
+    (['yon', 'missing'], []),
+    (['*', '*'], [])
+])
+def test_hybrid_phrase_search(positional_index, files_list, query,
+                              expected_result):
+    # biwords of the documents of the positional index
+    biword_index = build_biword_index([
+        ('yon fellow', [0]),
+        ('fellow yonder', [0, 2]),
+        ('yonder yon', [2]),
+        ('yonder fellow', [5]),
+        ('fellow yon', [5]),
+        ('yon yon', [5])
+    ])
+    search_dictionary = HybridPhraseSearchDictionary(
+        biword_index, positional_index, files_list)
+    assert search_dictionary.search(query) == expected_result
+
+
+@pytest.mark.parametrize('query, expected_notation', [
+    ('a b OR c', ['a', 'b', OPERATION_CODES.AND, 'c', OPERATION_CODES.OR]),
+    ('a (b OR c)', ['a', 'b', 'c', OPERATION_CODES.OR, OPERATION_CODES.AND]),
+    ('yon -yonder', ['yon', 'yonder', OPERATION_CODES.NOT,
+                     OPERATION_CODES.AND]),
+    ('-(a | b) AND c', ['a', 'b', OPERATION_CODES.OR, OPERATION_CODES.NOT,
+                        'c', OPERATION_CODES.AND]),
+    ('-', ['-'])
+])
+def test_parse_query(query, expected_notation):
+    assert parse_query(query) == expected_notation
+
+
+@pytest.mark.parametrize('query', ['AND a', 'a OR', 'a (b', 'a )', '()',
+                                   'a OR AND b'])
+def test_parse_incorrect_query(query):
+    with pytest.raises(IncorrectQuery):
+        parse_query(query)
+
+
 @pytest.mark.parametrize('pattern, expected_result', [
     ('yok', ['yokd', 'yoke', 'yokel', 'yokedevil', 'yokeelm', 'yokefellow']),
     ('yokefellow', ['yokefellow'])
@@ -56,6 +881,18 @@ def test_btree_build_and_search(btree, pattern, expected_result):
     assert sorted(expected_result) == sorted(results)
 
 
+def test_btree_prefix_search():
+    words = sorted(f'{first}{second}{third}' for first in 'ab'
+                   for second in 'abc' for third in ['', 'a', 'ab'])
+    btree = SearchBTree(order=4)
+    for word in reversed(words):
+        btree.put(word)
+    assert btree.get('') == words
+    assert btree.get('ab') == ['ab', 'aba', 'abab']
+    btree.put('abb')
+    assert btree.get('ab') == ['ab', 'aba', 'abab', 'abb']
+
+
 @pytest.mark.parametrize('pattern, expected_result', [
     ('yok*', ['yokd', 'yoke', 'yokel', 'yokedevil', 'yokeelm', 'yokefellow']),
     ('y*l', ['yokel', 'yokedevil'])